@@ -2,6 +2,8 @@
 ASGI config for EduTech project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn EduTech.asgi:application``) to
+use the async chat endpoints under /api/chatbot/async/.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
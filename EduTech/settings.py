@@ -42,13 +42,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "website.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "website.middleware.StaticAssetMiddleware",
+    "website.middleware.ApiCompressionMiddleware",
+    "website.middleware.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "website.middleware.TokenAuthMiddleware",
 ]
 
 ROOT_URLCONF = "EduTech.urls"
@@ -74,13 +79,65 @@ WSGI_APPLICATION = "EduTech.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite is tuned per connection for many concurrent chat requests:
+# - WAL lets readers run while a write is in progress.
+# - synchronous=NORMAL is still crash-safe under WAL.
+# - IMMEDIATE transactions take the write lock up front, so busy writers
+#   wait out SQLITE_BUSY_TIMEOUT instead of failing with "database is locked".
+# Connections are kept open for CONN_MAX_AGE seconds.
+# Run `manage.py bench_sqlite` to compare against the stock settings.
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # bytes
+
+SQLITE_CACHE_SIZE = 64 * 1024  # KiB per connection
+
+SQLITE_BUSY_TIMEOUT = 20  # seconds
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": -SQLITE_CACHE_SIZE,
+    "temp_store": "MEMORY",
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": SQLITE_BUSY_TIMEOUT,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": ";".join(
+                f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+            ),
+        },
     }
 }
 
+# Read replicas (website/routers.py): reads go to a replica picked once per
+# request, writes and transactions to "default". DATABASE_REPLICAS lists
+# SQLite files, comma-separated, as replica1, replica2, ...; locally they
+# are copies of db.sqlite3 refreshed with `manage.py sync_replicas`. A
+# client that wrote reads from the primary for DATABASE_STICKY_SECONDS so
+# it sees its writes.
+DATABASE_REPLICAS = []
+
+for index, path in enumerate(filter(None, os.environ.get("DATABASE_REPLICAS", "").split(",")), start=1):
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / path.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{index}")
+
+DATABASE_ROUTERS = ["website.routers.PrimaryReplicaRouter"]
+
+DATABASE_STICKY_SECONDS = 15
+
+DATABASE_STICKY_COOKIE = "db_primary"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -113,12 +170,209 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The API cache (website/api_cache.py) keeps its version numbers here, so
+# deployments running more than one process need a shared backend such as
+# django.core.cache.backends.redis.RedisCache.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "edutech",
+    }
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = '/static/'
 
+# ``manage.py collectstatic`` writes content-hashed copies of every static
+# file here, plus .gz (and, with the optional brotli package, .br)
+# siblings; StaticAssetMiddleware serves them (see website/assets.py).
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "website.assets.CompressedManifestStaticFilesStorage",
+    },
+}
+
+
+# Ollama (local LLM backend for the AI chat)
+# https://github.com/ollama/ollama/blob/main/docs/api.md
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+
+OLLAMA_MODEL = "gemma3:4b"
+
+OLLAMA_OPTIONS = {
+    "num_gpu": 1,
+    "num_predict": 200,
+}
+
+OLLAMA_TIMEOUT = 60
+
+# Connection pool shared by all chat requests in a process. The async
+# endpoints can hold up to OLLAMA_MAX_CONNECTIONS generations in flight.
+OLLAMA_CONNECT_TIMEOUT = 5
+
+OLLAMA_MAX_CONNECTIONS = 200
+
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = 20
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# LLM response cache: answers keyed on the normalized prompt, model and
+# options. A small in-process LRU sits in front of a table in the database.
+LLM_CACHE_ENABLED = True
+
+LLM_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+
+LLM_CACHE_MAX_ENTRIES = 10000
+
+LLM_CACHE_MEMORY_ENTRIES = 512
+
+# A table hit writes hits/last_used_at back at most this often per row
+LLM_CACHE_TOUCH_INTERVAL = 10 * 60  # seconds
+
+# Expired and overflow rows are pruned at most this often per process
+LLM_CACHE_PRUNE_INTERVAL = 60  # seconds
+
+
+# LLM scheduler: limits concurrent generations sent to Ollama. Extra
+# requests queue (short prompts first) for up to LLM_QUEUE_TIMEOUT seconds;
+# once LLM_MAX_QUEUE are waiting, new ones get HTTP 429 with Retry-After.
+LLM_MAX_CONCURRENT = 4
+
+LLM_MAX_QUEUE = 64
+
+LLM_QUEUE_TIMEOUT = 30  # seconds
+
+LLM_SHORT_PROMPT_CHARS = 200
+
+# Operational endpoints (/api/llm/scheduler/, /api/cache/stats/, /metrics)
+# answer staff users logged in to the admin, or requests with
+# ``Authorization: Bearer <OPS_TOKEN>`` (for scrapers). Empty: staff only.
+OPS_TOKEN = os.environ.get("OPS_TOKEN", "")
+
+
+# Conversation context: each reply's Ollama context is stored on the
+# Conversation and sent back with the next turn. Contexts longer than
+# LLM_CONTEXT_MAX_TOKENS (or from another model) are dropped, and the
+# prompt is rebuilt from the most recent messages that fit in
+# LLM_HISTORY_TOKEN_BUDGET (estimated at ~4 characters per token).
+LLM_CONTEXT_MAX_TOKENS = 8192
+
+LLM_HISTORY_TOKEN_BUDGET = 1024
+
+LLM_HISTORY_MAX_MESSAGES = 20
+
+
+# Request metrics: per-view latency, query and LLM histograms served in
+# Prometheus format at /metrics (staff or OPS_TOKEN only, see above), and
+# a Server-Timing header on each response that browser dev tools show as
+# a breakdown of DB and LLM time.
+METRICS_ENABLED = True
+
+SERVER_TIMING_ENABLED = True
+
+
+# Write-behind queue (see website/tasks.py): chat turns and dashboard
+# counter updates are queued in the tasks table and written in batches of
+# TASK_QUEUE_BATCH_SIZE by ``manage.py run_tasks``, so chat responses don't
+# wait on SQLite's write lock. With TASK_QUEUE_THREAD each web process also
+# drains the queue in a background thread; turn it off (TASK_QUEUE_THREAD=0
+# in the environment) when running the worker command. TASK_QUEUE_ENABLED =
+# False writes everything inline.
+TASK_QUEUE_ENABLED = True
+
+TASK_QUEUE_THREAD = os.environ.get("TASK_QUEUE_THREAD", "1") != "0"
+
+# The worker then bumps API cache versions in its own process, so the web
+# processes only see them through a shared cache; fall back to files on
+# this machine unless CACHES already names a shared backend
+if not TASK_QUEUE_THREAD and CACHES["default"]["BACKEND"].endswith(".LocMemCache"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache",
+    }
+
+TASK_QUEUE_BATCH_SIZE = 100
+
+TASK_QUEUE_POLL_INTERVAL = 0.5  # seconds
+
+TASK_QUEUE_MAX_ATTEMPTS = 5
+
+
+# Compression of /api/ responses (see website/compression.py). Bodies under
+# API_COMPRESSION_MIN_BYTES go out as they are; streaming responses (SSE,
+# exports) are never buffered. While the 1-minute load average per CPU is
+# above API_COMPRESSION_BUSY_LOAD the fast levels are used instead.
+# Brotli needs the optional brotli package; gzip is always available.
+API_COMPRESSION_ENABLED = True
+
+API_COMPRESSION_PREFIXES = ('/api/',)
+
+API_COMPRESSION_MIN_BYTES = 1024
+
+API_COMPRESSION_LEVELS = {'br': 5, 'gzip': 6}
+
+API_COMPRESSION_FAST_LEVELS = {'br': 1, 'gzip': 1}
+
+API_COMPRESSION_BUSY_LOAD = 0.75
+
+
+# Page sizes for the cursor-paginated list APIs (messages, conversations)
+API_PAGE_SIZE = 50
+
+API_MAX_PAGE_SIZE = 200
+
+
+# Versioned cache for the read-only JSON APIs. Entries are invalidated by
+# signals on write; the timeout only reclaims memory.
+API_CACHE_ENABLED = True
+
+API_CACHE_TIMEOUT = 24 * 60 * 60  # seconds
+
+
+# Login tokens (website/auth_tokens.py): signed with SECRET_KEY, valid for
+# AUTH_TOKEN_MAX_AGE seconds. Resolved users are kept in a per-process LRU.
+AUTH_TOKEN_MAX_AGE = 7 * 24 * 60 * 60
+
+AUTH_USER_CACHE_SIZE = 1024
+
+AUTH_USER_CACHE_TTL = 60  # seconds
+
+# Password hashing pool (website/hashing.py): login/signup hashes run on at
+# most PASSWORD_HASH_WORKERS threads so a login storm can't take every CPU.
+# Up to PASSWORD_HASH_QUEUE more wait; beyond that requests get HTTP 429.
+# Use `manage.py bench_hashers` to size these and the hasher iterations.
+PASSWORD_HASH_WORKERS = 2
+
+PASSWORD_HASH_QUEUE = 32
+
+PASSWORD_HASH_TIMEOUT = 10  # seconds
+
+# Conversation archive (website/archive.py): messages of conversations idle
+# for ARCHIVE_IDLE_DAYS (or deleted for ARCHIVE_INACTIVE_DAYS) are packed
+# into one zlib blob by `manage.py archive_conversations`, and restored
+# automatically when the conversation is opened again.
+ARCHIVE_IDLE_DAYS = 90
+
+ARCHIVE_INACTIVE_DAYS = 7
+
+ARCHIVE_DICTIONARY_SIZE = 32 * 1024  # zlib's window; larger is ignored
+
+# Chat history export (website/export.py): rows are read from the database
+# EXPORT_CHUNK_SIZE at a time, so memory use doesn't grow with the export.
+EXPORT_CHUNK_SIZE = 2000
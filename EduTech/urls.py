@@ -6,11 +6,20 @@ from website.views import (
     signup_api,
     login_api,
     dashboard_stats_api,
+    dashboard_bootstrap_api,
     recent_sessions_api,
     recommendations_api,
     chatbot_api,
+    chatbot_stream_api,
+    chatbot_async_api,
+    chatbot_stream_async_api,
+    llm_scheduler_api,
+    api_cache_stats_api,
     conversations_api,
-    messages_api
+    messages_api,
+    messages_search_api,
+    export_api,
+    metrics_api
 )
 
 urlpatterns = [
@@ -23,9 +32,18 @@ urlpatterns = [
     path("api/signup/", views.signup_api, name="signup_api"),
     path("api/login/", views.login_api, name="login_api"),
     path('api/dashboard/stats/', dashboard_stats_api),
+    path('api/dashboard/bootstrap/', dashboard_bootstrap_api, name='dashboard_bootstrap_api'),
     path('api/sessions/recent/', recent_sessions_api),
     path('api/recommendations/', recommendations_api),
     path('api/chatbot/', chatbot_api),
+    path('api/chatbot/stream/', chatbot_stream_api, name='chatbot_stream_api'),
+    path('api/chatbot/async/', chatbot_async_api, name='chatbot_async_api'),
+    path('api/chatbot/async/stream/', chatbot_stream_async_api, name='chatbot_stream_async_api'),
+    path('api/llm/scheduler/', llm_scheduler_api, name='llm_scheduler_api'),
+    path('api/cache/stats/', api_cache_stats_api, name='api_cache_stats_api'),
     path('api/conversations/', conversations_api, name='conversations_api'),
     path('api/messages/', messages_api, name='messages_api'),
+    path('api/messages/search/', messages_search_api, name='messages_search_api'),
+    path('api/export/', export_api, name='export_api'),
+    path('metrics', metrics_api, name='metrics'),
 ]
\ No newline at end of file
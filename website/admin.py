@@ -22,5 +22,6 @@ class RecommendationAdmin(admin.ModelAdmin):
 @admin.register(Session)
 class SessionAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'subject', 'started_at')
+    list_select_related = ('user',)
     list_filter = ('subject', 'started_at')
     search_fields = ('title', 'user__name')
@@ -0,0 +1,109 @@
+"""
+Write-aware caching for the read-only JSON APIs.
+
+Each cached payload depends on one or more namespaces ("sessions",
+"recommendations", "users", "conversations:<user id>",
+"messages:<conversation id>"). Every namespace has a version number kept
+in Django's cache, and the versions are part of the payload's cache key.
+Model signals bump the versions after a write commits (see signals.py),
+so the next read misses and rebuilds the payload. Nothing is ever served
+from before the last committed write, and entries never need a TTL
+picked to match how often data changes; API_CACHE_TIMEOUT only frees
+memory.
+
+Versions live in the configured cache backend, so every process serving
+the site must share one (Redis, Memcached, database cache), not the
+per-process LocMemCache default.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import routers
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _version_key(namespace):
+    return f"apiver:{namespace}"
+
+
+def _fresh_version():
+    # Time based rather than 1, so a version that was evicted from the cache
+    # can't come back as a number some older entry was stored under
+    return time.time_ns()
+
+
+def versions(namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(namespace):
+    """Invalidate everything cached under ``namespace`` once the write commits."""
+    def _bump():
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), timeout=None)
+
+    transaction.on_commit(_bump)
+
+
+def _count(name, outcome):
+    with _stats_lock:
+        entry = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+        entry[outcome] += 1
+
+
+def cached(name, namespaces, params, build):
+    """
+    Return ``build()``'s payload, served from the cache while none of
+    ``namespaces`` has changed. ``params`` must cover every input that
+    shapes the payload (query string values, user id, today's date ...).
+    """
+    if not settings.API_CACHE_ENABLED:
+        return build()
+
+    # Versions are read before the database so a write landing in between
+    # can only leave the entry under a version that is already outdated
+    stamp = ".".join(str(version) for version in versions(namespaces))
+    digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    key = f"api:{name}:{digest}:{stamp}"
+
+    payload = cache.get(key)
+    if payload is not None:
+        _count(name, 'hits')
+        return payload
+
+    _count(name, 'misses')
+    # Built from the primary: a lagging replica must not be cached under the
+    # new version
+    with routers.use_primary():
+        payload = build()
+    cache.set(key, payload, settings.API_CACHE_TIMEOUT)
+    return payload
+
+
+def stats():
+    with _stats_lock:
+        result = {}
+        for name, entry in sorted(_stats.items()):
+            total = entry['hits'] + entry['misses']
+            result[name] = {
+                **entry,
+                'hit_ratio': round(entry['hits'] / total, 3) if total else 0.0,
+            }
+        return result
@@ -0,0 +1,202 @@
+"""
+Cold storage for idle conversations.
+
+archive() moves every message of a conversation into one
+ConversationArchive row: the messages are serialized as compact JSON and
+zlib-compressed, optionally primed with a shared dictionary trained on
+past messages, since LLM answers repeat the same phrasing and markdown
+a lot. The message rows and the stored Ollama context are then deleted.
+
+Reading an archived conversation (messages_api) decodes the blob in
+memory with messages() and pages through it like the live rows, so
+browsing old history never writes. Only a new chat turn calls restore(),
+which puts the messages back with their original ids, so cursors stay
+valid and the conversation behaves as if it had never been archived. It
+gets archived again once it goes idle.
+
+Archived messages stay searchable. Their entries are added back to the
+search index once their rows are gone (the index only stores terms, not
+text), and ArchivedMessage records which archive holds each id, so
+search can decode the matched conversations for snippets.
+
+Deleting rows doesn't shrink db.sqlite3 by itself; the freed pages are
+reused by new rows, or returned to the OS with VACUUM (see
+``archive_report --vacuum``).
+"""
+import json
+import re
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import api_cache, search
+from .models import ArchiveDictionary, ArchivedMessage, Conversation, ConversationArchive, Message
+
+PHRASE_WORDS = 4
+
+
+def compress(raw, zdict=None):
+    compressor = zlib.compressobj(9, zdict=zdict) if zdict else zlib.compressobj(9)
+    return compressor.compress(raw) + compressor.flush()
+
+
+def decompress(blob, zdict=None):
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return decompressor.decompress(bytes(blob)) + decompressor.flush()
+
+
+def train_dictionary(samples, size=None):
+    """
+    Build a zlib preset dictionary from sample message texts: the phrases
+    that repeat most across messages, weighted by the bytes they would
+    save. zlib finds matches closer to the end of the dictionary more
+    cheaply, so the best phrases go last.
+    """
+    size = size or settings.ARCHIVE_DICTIONARY_SIZE
+    counts = Counter()
+    for text in samples:
+        words = re.findall(r'\S+\s*', text)
+        phrases = {
+            "".join(words[i:i + PHRASE_WORDS]) for i in range(len(words) - PHRASE_WORDS + 1)
+        }
+        counts.update(phrases)
+
+    chosen, total = [], 0
+    for phrase, count in sorted(counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if count < 2:
+            break
+        encoded = phrase.encode()
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    chosen.reverse()
+    return b"".join(chosen)
+
+
+def latest_dictionary():
+    return ArchiveDictionary.objects.order_by('-id').first()
+
+
+def decode(data, zdict=None):
+    """An archive blob's messages as ``[id, role, content, created_at]`` lists."""
+    return json.loads(decompress(data, zdict))
+
+
+def read(entry):
+    """An archive's messages as ``[id, role, content, created_at]`` lists."""
+    return decode(entry.data, entry.dictionary.data if entry.dictionary else None)
+
+
+def messages(conversation):
+    """
+    An archived conversation's messages as dicts (id, role, content,
+    created_at), oldest first, without restoring them; None if it is no
+    longer archived.
+    """
+    entry = ConversationArchive.objects.select_related('dictionary').filter(conversation=conversation).first()
+    if entry is None:
+        return None
+    return [
+        {'id': pk, 'role': role, 'content': content, 'created_at': datetime.fromisoformat(created_at)}
+        for pk, role, content, created_at in read(entry)
+    ]
+
+
+def messages_by_id(conversation_ids):
+    """``{message id: (role, content, created_at)}`` for the archived conversations given."""
+    found = {}
+    entries = ConversationArchive.objects.select_related('dictionary').filter(conversation_id__in=conversation_ids)
+    for entry in entries:
+        for pk, role, content, created_at in read(entry):
+            found[pk] = (role, content, datetime.fromisoformat(created_at))
+    return found
+
+
+def candidates(now=None):
+    """Conversations idle long enough to archive."""
+    now = now or timezone.now()
+    idle = now - timedelta(days=settings.ARCHIVE_IDLE_DAYS)
+    deleted = now - timedelta(days=settings.ARCHIVE_INACTIVE_DAYS)
+    return Conversation.objects.filter(is_archived=False).filter(
+        Q(updated_at__lt=idle) | Q(is_active=False, updated_at__lt=deleted)
+    )
+
+
+def archive(conversation, dictionary=None):
+    """
+    Pack ``conversation``'s messages into a ConversationArchive. Returns
+    the archive, or None if the conversation had no messages.
+    """
+    with transaction.atomic():
+        rows = list(
+            Message.objects.filter(conversation=conversation).order_by('created_at', 'id').values_list(
+                'id', 'role', 'content', 'created_at'
+            )
+        )
+        if not rows:
+            return None
+
+        raw = json.dumps(
+            [[pk, role, content, created_at.isoformat()] for pk, role, content, created_at in rows],
+            ensure_ascii=False,
+            separators=(',', ':')
+        ).encode()
+        entry = ConversationArchive.objects.create(
+            conversation=conversation,
+            dictionary=dictionary,
+            data=compress(raw, dictionary.data if dictionary else None),
+            message_count=len(rows),
+            raw_bytes=sum(len(content.encode()) for _, _, content, _ in rows),
+        )
+        Message.objects.filter(id__in=[row[0] for row in rows]).delete()
+        # The delete trigger dropped them from the search index; put them back
+        ArchivedMessage.objects.bulk_create(ArchivedMessage(id=row[0], archive=entry) for row in rows)
+        search.index_archived(conversation.user_id, [(pk, content) for pk, _, content, _ in rows])
+        # update() rather than save() so updated_at (and the list order) is untouched
+        Conversation.objects.filter(pk=conversation.pk).update(
+            is_archived=True, llm_context=None, llm_context_model=''
+        )
+    api_cache.bump(f'messages:{conversation.id}')
+    return entry
+
+
+def restore(conversation):
+    """Put an archived conversation's messages back. Returns True if it was archived."""
+    if not conversation.is_archived:
+        return False
+    with transaction.atomic():
+        entry = ConversationArchive.objects.select_related('dictionary').filter(
+            conversation=conversation
+        ).first()
+        # Another request restored it first
+        if entry is None or not ConversationArchive.objects.filter(pk=entry.pk).delete()[0]:
+            conversation.is_archived = False
+            return False
+
+        rows = read(entry)
+        # The insert trigger indexes them again as live messages
+        search.unindex_archived(conversation.user_id, [(pk, content) for pk, _, content, _ in rows])
+        Message.objects.bulk_create(
+            Message(
+                id=pk,
+                conversation=conversation,
+                role=role,
+                content=content,
+                created_at=datetime.fromisoformat(created_at)
+            )
+            for pk, role, content, created_at in rows
+        )
+        Conversation.objects.filter(pk=conversation.pk).update(is_archived=False)
+    conversation.is_archived = False
+    api_cache.bump(f'messages:{conversation.id}')
+    return True
+
+
+arestore = sync_to_async(restore)
@@ -0,0 +1,199 @@
+"""
+Content-hashed, precompressed static files.
+
+``manage.py collectstatic`` is the build step. With
+CompressedManifestStaticFilesStorage (STORAGES["staticfiles"]) it copies
+every file to STATIC_ROOT under a content-hashed name
+(``website/chatbot.3f2a9c1d04be.js``), which ``{% static %}`` then
+returns. It also writes ``.gz`` and, when the optional ``brotli`` package
+is installed, ``.br`` siblings next to each text file, compressed once
+at maximum level.
+
+StaticAssetMiddleware serves STATIC_URL from STATIC_ROOT. It picks the
+smallest sibling the client's Accept-Encoding allows. Names the loaded
+manifest maps to a content-hashed copy get a one-year ``immutable``
+Cache-Control, so repeat visits don't even revalidate. Anything else
+(original names, or everything when the manifest is missing) must
+revalidate against its ETag.
+
+Only files under static/ go through this. The CSS and JS written inline
+in the page templates ship inside the HTML and are never fingerprinted.
+"""
+import gzip
+import logging
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz siblings are written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico'}
+
+# Smaller than this, the headers outweigh what compression saves
+MIN_COMPRESS_BYTES = 256
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# The 12 hex digits ManifestStaticFilesStorage puts before the extension
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}(\.[^./]+)?$')
+
+logger = logging.getLogger(__name__)
+
+
+def _gzip(data):
+    # mtime=0 keeps the output identical between builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+ENCODERS = [('br', '.br', _brotli if brotli else None), ('gzip', '.gz', _gzip)]
+
+
+def compress(path):
+    """Write the .br/.gz siblings of ``path`` that are worth keeping; returns their paths."""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return []
+
+    written = []
+    for _, suffix, encoder in ENCODERS:
+        if encoder is None:
+            continue
+        compressed = encoder(data)
+        # Not worth a Content-Encoding unless it saves at least 5%
+        if len(compressed) >= len(data) * 0.95:
+            continue
+        with open(path + suffix, 'wb') as f:
+            f.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses what it collects."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Both the hashed copies and the originals, which stay reachable
+        for name in sorted(set(paths) | set(self.hashed_files.values())):
+            for written in compress(self.path(name)):
+                yield name, os.path.relpath(written, self.location), True
+
+    manifest_warned = False
+
+    def stored_name(self, name):
+        # Before collectstatic has run (tests, a fresh checkout) there is no
+        # manifest; use the plain names rather than failing every page
+        if not self.hashed_files:
+            if not self.manifest_warned:
+                self.manifest_warned = True
+                logger.warning(
+                    "No static files manifest in %s; serving unhashed names. Run collectstatic.",
+                    self.location
+                )
+            return name
+        return super().stored_name(name)
+
+
+def accepted_encodings(header):
+    """Codings the client accepts (``q=0`` excluded), from an Accept-Encoding value."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+_immutable = (None, frozenset())
+
+
+def immutable_names():
+    """The content-hashed names from the loaded manifest."""
+    global _immutable
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    # Rebuilt only when the storage (and so its manifest) is replaced
+    if _immutable[0] is not hashed_files:
+        _immutable = (hashed_files, frozenset(
+            hashed for original, hashed in hashed_files.items()
+            if hashed != original and HASHED_NAME.search(hashed)
+        ))
+    return _immutable[1]
+
+
+def etag_matches(etag, header):
+    """Whether an If-None-Match value lists ``etag`` (weak comparison, as RFC 9110 asks)."""
+    tags = parse_etags(header)
+    return '*' in tags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in tags}
+
+
+def serve(request, name):
+    """
+    Response for static file ``name`` (relative to STATIC_ROOT), or None if
+    STATIC_ROOT has no such file.
+    """
+    if not settings.STATIC_ROOT or name.endswith(('.gz', '.br')):
+        return None
+    try:
+        path = safe_join(settings.STATIC_ROOT, name)
+    except SuspiciousFileOperation:
+        return None
+    if not os.path.isfile(path):
+        return None
+
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    encoding = None
+    for coding, suffix, _ in ENCODERS:
+        if coding in accepted and os.path.isfile(path + suffix):
+            encoding, path = coding, path + suffix
+            break
+
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    immutable = name in immutable_names()
+    # The original's type, not application/gzip for a .gz sibling
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if etag_matches(etag, request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = str(stat.st_size)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        # FileResponse names the file; this is a page asset, not a download
+        del response['Content-Disposition']
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    response['ETag'] = etag
+    response['Last-Modified'] = formatdate(stat.st_mtime, usegmt=True)
+    response['Cache-Control'] = IMMUTABLE if immutable else REVALIDATE
+    return response
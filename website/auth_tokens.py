@@ -0,0 +1,77 @@
+"""
+Stateless login tokens.
+
+login_api hands out a token signed with SECRET_KEY that carries the user
+id and its issue time, so checking one needs no database table. The
+TokenAuthMiddleware resolves it to a User through a small in-process
+LRU with a TTL, so the hot chat endpoints usually skip the users query
+entirely. Cached rows are dropped when the user is saved or deleted in
+this process, and all of them after a bulk import; other processes pick the change up within
+AUTH_USER_CACHE_TTL seconds.
+"""
+from django.conf import settings
+from django.core import signing
+
+from .lru import TTLCache
+from .models import User
+
+SALT = 'website.auth_tokens'
+
+_users = None
+
+
+def _user_cache():
+    global _users
+    if _users is None:
+        _users = TTLCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+    return _users
+
+
+def issue(user):
+    return signing.dumps({'uid': user.id}, salt=SALT)
+
+
+def user_id_for(token):
+    """The user id in a valid, unexpired token, else None."""
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=settings.AUTH_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return payload.get('uid')
+
+
+def get_user(user_id):
+    cache = _user_cache()
+    user = cache.get(user_id)
+    if user is None:
+        user = User.objects.filter(id=user_id).first()
+        if user is not None:
+            cache.set(user_id, user)
+    return user
+
+
+async def aget_user(user_id):
+    cache = _user_cache()
+    user = cache.get(user_id)
+    if user is None:
+        user = await User.objects.filter(id=user_id).afirst()
+        if user is not None:
+            cache.set(user_id, user)
+    return user
+
+
+def forget_user(user_id):
+    _user_cache().delete(user_id)
+
+
+def forget_all():
+    """For writes that skip the save signals, like bulk_import's."""
+    _user_cache().clear()
+
+
+def token_from_request(request):
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        return token.strip()
+    return None
@@ -0,0 +1,444 @@
+"""
+Query budgets and latency for every view in views.py.
+
+seed() builds a synthetic dataset at a given scale, SCENARIOS describes one
+request per view (a few views have cold/warm cache variants), and run()
+sends each scenario through Django's test client several times. For each
+one it records the largest number of queries seen and the p50/p95 latency,
+and checks the count against the scenario's budget. Ollama is replaced by
+stub_ollama(), so the timings only cover our own code.
+
+Used by website/tests.py, which fails on any budget overrun, and by
+``manage.py bench_api``, which runs at a larger scale in a throwaway test
+database and writes the results as JSON so runs can be compared.
+
+serialization_throughput() is a microbenchmark of the list APIs'
+serialization alone: rows per second for one long conversation, through
+the old model-instance path and through serialization.py
+(``manage.py bench_serialization``).
+"""
+import json
+import platform
+import sqlite3
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+import django
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import auth_tokens, counters, llm, llm_cache, serialization, tasks
+from .models import Conversation, Message, Recommendation, Session, User
+
+DEFAULT_SCALE = {
+    'users': 20,
+    'conversations': 3,  # per user
+    'messages': 20,  # per conversation
+    'sessions': 50,
+}
+
+PASSWORD = 'benchmark-password'
+
+# Applied with override_settings by the tests and bench_api. Hashing cost
+# is measured separately by bench_hashers, and queued writes are applied
+# between calls by run_scenario rather than by a background thread
+BENCHMARK_SETTINGS = {
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'TASK_QUEUE_THREAD': False,
+    'OPS_TOKEN': 'benchmark-ops-token',
+}
+
+OPS_HEADERS = {'Authorization': f"Bearer {BENCHMARK_SETTINGS['OPS_TOKEN']}"}
+
+STUB_CHUNKS = [
+    {'response': 'Recursion is '},
+    {'response': 'a function calling itself.'},
+    {'response': '', 'done': True, 'context': [1, 2, 3, 4]},
+]
+
+TOPICS = ['eigenvalues', 'recursion', 'derivatives', 'probability', 'vectors', 'integrals']
+
+
+def _stub_stream(user_message, context=None, history=None):
+    yield from (dict(chunk) for chunk in STUB_CHUNKS)
+
+
+async def _astub_stream(user_message, context=None, history=None):
+    for chunk in STUB_CHUNKS:
+        yield dict(chunk)
+
+
+@contextmanager
+def stub_ollama():
+    """Answer every generation instantly with STUB_CHUNKS."""
+    with mock.patch.object(llm, 'stream_generate', _stub_stream), \
+            mock.patch.object(llm, 'astream_generate', _astub_stream):
+        yield
+
+
+def seed(users, conversations, messages, sessions, label='student'):
+    """
+    Create the dataset with bulk inserts and return the fixtures the
+    scenarios use: the first user (with a login token), one of their
+    conversations and its messages. Seeding again with another ``label``
+    adds more users alongside the first batch.
+    """
+    # Callers run with BENCHMARK_SETTINGS' fast hasher
+    password_hash = make_password(PASSWORD)
+    now = timezone.now()
+
+    User.objects.bulk_create(
+        User(name=f'{label.title()} {i}', email=f'{label}{i}@bench.test', password_hash=password_hash)
+        for i in range(users)
+    )
+    user_rows = list(User.objects.filter(email__startswith=label, email__endswith='@bench.test').order_by('id'))
+
+    Conversation.objects.bulk_create(
+        Conversation(user=user, title=f'{TOPICS[n % len(TOPICS)]} chat')
+        for user in user_rows for n in range(conversations)
+    )
+    conversation_rows = list(Conversation.objects.filter(user__in=user_rows).order_by('id'))
+
+    Message.objects.bulk_create(
+        Message(
+            conversation=conversation,
+            role='assistant' if n % 2 else 'user',
+            content=f'Message {n} about {TOPICS[n % len(TOPICS)]}: ' + 'Lorem ipsum dolor sit amet. ' * 8,
+            created_at=now - timedelta(minutes=messages - n)
+        )
+        for conversation in conversation_rows for n in range(messages)
+    )
+    Session.objects.bulk_create(
+        Session(
+            user=user_rows[n % len(user_rows)],
+            title=f'Session {n}',
+            subject=TOPICS[n % len(TOPICS)],
+            started_at=now - timedelta(hours=n)
+        )
+        for n in range(sessions)
+    )
+    Recommendation.objects.bulk_create(
+        Recommendation(user=user_rows[0], title=f'Practice {topic}', icon='book') for topic in TOPICS
+    )
+    # bulk_create skips the signals that maintain the counters
+    counters.rebuild()
+
+    user = user_rows[0]
+    conversation = Conversation.objects.filter(user=user).order_by('id').first()
+    return {
+        'user': user,
+        'token': auth_tokens.issue(user),
+        'conversation': conversation,
+        'message_ids': list(
+            Message.objects.filter(conversation=conversation).order_by('created_at').values_list('id', flat=True)
+        ),
+    }
+
+
+def reset_caches():
+    """Start a request from cold: no API cache, LLM cache or cached users."""
+    cache.clear()
+    llm_cache.clear()
+    auth_tokens._user_cache().clear()
+
+
+class Scenario:
+    """
+    One request against a view. ``data`` and ``query`` may be callables
+    taking ``(fixtures, iteration)``; ``prepare(fixtures)`` runs untimed
+    before every call. ``budget`` is the most queries one call may make.
+    """
+
+    def __init__(self, name, method, path, budget, data=None, query=None, prepare=None,
+                 token=False, is_async=False, headers=None, status=200):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.budget = budget
+        self.data = data
+        self.query = query
+        self.prepare = prepare
+        self.token = token
+        self.is_async = is_async
+        self.headers = headers or {}
+        self.status = status
+
+    def _value(self, value, fixtures, iteration):
+        return value(fixtures, iteration) if callable(value) else value
+
+    def call(self, fixtures, iteration):
+        client = AsyncClient() if self.is_async else Client()
+        headers = dict(self._value(self.headers, fixtures, iteration))
+        if self.token:
+            headers['Authorization'] = f"Bearer {fixtures['token']}"
+        kwargs = {'headers': headers}
+
+        request = getattr(client, self.method.lower())
+        if self.method == 'GET':
+            args = (self.path, self._value(self.query, fixtures, iteration) or {})
+        else:
+            args = (self.path, json.dumps(self._value(self.data, fixtures, iteration) or {}))
+            kwargs['content_type'] = 'application/json'
+
+        if self.is_async:
+            response = async_to_sync(request)(*args, **kwargs)
+            if response.streaming:
+                async def consume():
+                    return b''.join([chunk async for chunk in response.streaming_content])
+                body = async_to_sync(consume)()
+            else:
+                body = response.content
+        else:
+            response = request(*args, **kwargs)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+
+def _email(fixtures, iteration=None):
+    return fixtures['user'].email
+
+
+def _conversation_id(fixtures, iteration=None):
+    return fixtures['conversation'].id
+
+
+def _new_conversation(fixtures):
+    fixtures['scratch'] = Conversation.objects.create(user=fixtures['user'], title='Scratch')
+
+
+SCENARIOS = [
+    # Pages (templates only)
+    Scenario('index', 'GET', '/', 0),
+    Scenario('auth', 'GET', '/auth/', 0),
+    Scenario('dashboard', 'GET', '/dashboard/', 0),
+    Scenario('chatbot_page', 'GET', '/chatbot/', 0),
+
+    # Accounts. Signup queues the student count and bumps the users version
+    Scenario(
+        'signup_api', 'POST', '/api/signup/', 6,
+        data=lambda f, i: {'email': f'new{i}-{time.monotonic_ns()}@bench.test', 'password': PASSWORD, 'name': 'New'}
+    ),
+    Scenario('login_api', 'POST', '/api/login/', 1, data=lambda f, i: {'email': _email(f), 'password': PASSWORD}),
+
+    # Dashboard
+    Scenario('dashboard_stats_api (cold)', 'GET', '/api/dashboard/stats/', 1, prepare=lambda f: reset_caches()),
+    Scenario('dashboard_stats_api (warm)', 'GET', '/api/dashboard/stats/', 0),
+    Scenario('recent_sessions_api (cold)', 'GET', '/api/sessions/recent/', 1, prepare=lambda f: reset_caches()),
+    Scenario('recent_sessions_api (warm)', 'GET', '/api/sessions/recent/', 0),
+    Scenario('recommendations_api (cold)', 'GET', '/api/recommendations/', 1, prepare=lambda f: reset_caches()),
+    Scenario('recommendations_api (warm)', 'GET', '/api/recommendations/', 0),
+    Scenario('dashboard_bootstrap_api (cold)', 'GET', '/api/dashboard/bootstrap/', 3, prepare=lambda f: reset_caches()),
+    Scenario(
+        'dashboard_bootstrap_api (304)', 'GET', '/api/dashboard/bootstrap/', 1,
+        headers=lambda f, i: {'If-None-Match': f.get('dashboard_etag', '')}, status=304,
+        prepare=lambda f: f.update(dashboard_etag=Client().get('/api/dashboard/bootstrap/')['ETag'])
+    ),
+
+    # Chat (Ollama stubbed). A new prompt stores the answer and prunes the
+    # llm_response_cache table; a conversation turn loads the conversation,
+    # reads its turns still in the queue and queues the new one
+    Scenario(
+        'chatbot_api (new prompt)', 'POST', '/api/chatbot/', 11,
+        data=lambda f, i: {'message': f'explain topic {i} {time.monotonic_ns()}'}
+    ),
+    Scenario(
+        'chatbot_api (cached answer)', 'POST', '/api/chatbot/', 0,
+        data={'message': 'explain recursion'}
+    ),
+    Scenario(
+        'chatbot_api (conversation turn)', 'POST', '/api/chatbot/', 3, token=True,
+        data=lambda f, i: {'message': f'and then {i}?', 'conversation_id': _conversation_id(f)}
+    ),
+    Scenario(
+        'chatbot_stream_api (conversation turn)', 'POST', '/api/chatbot/stream/', 3, token=True,
+        data=lambda f, i: {'message': f'and next {i}?', 'conversation_id': _conversation_id(f)}
+    ),
+    Scenario(
+        'chatbot_async_api (conversation turn)', 'POST', '/api/chatbot/async/', 3, token=True, is_async=True,
+        data=lambda f, i: {'message': f'async {i}?', 'conversation_id': _conversation_id(f)}
+    ),
+    Scenario(
+        'chatbot_stream_async_api (conversation turn)', 'POST', '/api/chatbot/async/stream/', 3,
+        token=True, is_async=True,
+        data=lambda f, i: {'message': f'async stream {i}?', 'conversation_id': _conversation_id(f)}
+    ),
+    Scenario('llm_scheduler_api', 'GET', '/api/llm/scheduler/', 0, headers=OPS_HEADERS),
+    Scenario('api_cache_stats_api', 'GET', '/api/cache/stats/', 0, headers=OPS_HEADERS),
+    Scenario('metrics_api', 'GET', '/metrics', 0, headers=OPS_HEADERS),
+
+    # History
+    Scenario(
+        'conversations_api GET (cold)', 'GET', '/api/conversations/', 2,
+        query=lambda f, i: {'email': _email(f)}, prepare=lambda f: reset_caches()
+    ),
+    Scenario('conversations_api GET (warm, token)', 'GET', '/api/conversations/', 0, token=True),
+    Scenario('conversations_api POST', 'POST', '/api/conversations/', 2, data=lambda f, i: {'email': _email(f)}),
+    Scenario(
+        'conversations_api DELETE', 'DELETE', '/api/conversations/', 3, prepare=_new_conversation,
+        data=lambda f, i: {'email': _email(f), 'conversation_id': f['scratch'].id}
+    ),
+    Scenario(
+        'messages_api (cold)', 'GET', '/api/messages/', 3, prepare=lambda f: reset_caches(),
+        query=lambda f, i: {'email': _email(f), 'conversation_id': _conversation_id(f)}
+    ),
+    Scenario(
+        'messages_api (warm, token)', 'GET', '/api/messages/', 1, token=True,
+        query=lambda f, i: {'conversation_id': _conversation_id(f)}
+    ),
+    Scenario(
+        'messages_search_api', 'GET', '/api/messages/search/', 2, token=True,
+        query=lambda f, i: {'q': TOPICS[i % len(TOPICS)]}
+    ),
+    Scenario(
+        'export_api', 'GET', '/api/export/', 3, token=True,
+        query=lambda f, i: {'format': 'ndjson'}
+    ),
+]
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def run_scenario(scenario, fixtures, iterations=5):
+    """Call ``scenario`` once to warm up, then ``iterations`` more times measured."""
+    query_counts, latencies = [], []
+    for iteration in range(-1, iterations):
+        if scenario.prepare:
+            scenario.prepare(fixtures)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response, body = scenario.call(fixtures, iteration)
+            elapsed = (time.perf_counter() - started) * 1000
+        if iteration >= 0:
+            query_counts.append(len(queries.captured_queries))
+            latencies.append(elapsed)
+        # What the task worker would do between requests (not measured)
+        tasks.run_pending()
+        if response.status_code != scenario.status:
+            raise AssertionError(f"{scenario.name}: HTTP {response.status_code}, expected {scenario.status}")
+        if response.status_code == 200 and response.get('Content-Type', '').startswith('application/json'):
+            payload = json.loads(body)
+            if payload.get('success') is False:
+                raise AssertionError(f"{scenario.name}: {payload.get('message')}")
+
+    return {
+        'name': scenario.name,
+        'method': scenario.method,
+        'path': scenario.path,
+        'iterations': iterations,
+        'queries': max(query_counts),
+        'budget': scenario.budget,
+        'within_budget': max(query_counts) <= scenario.budget,
+        'status': scenario.status,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(_percentile(latencies, 0.95), 3),
+    }
+
+
+def run(fixtures, iterations=5, scenarios=None):
+    results = []
+    with stub_ollama():
+        for scenario in scenarios or SCENARIOS:
+            results.append(run_scenario(scenario, fixtures, iterations))
+    return results
+
+
+def report(results, scale):
+    """The JSON document bench_api writes."""
+    return {
+        'created_at': timezone.now().isoformat(),
+        'scale': scale,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'database': connection.vendor,
+        },
+        'results': results,
+    }
+
+
+MESSAGE_COLUMNS = ('id', 'role', 'content', 'created_at')
+
+
+def _serialize_models(queryset):
+    """How messages_api serialized before serialization.py."""
+    data = []
+    for msg in queryset:
+        data.append({
+            'id': msg.id,
+            'role': msg.role,
+            'content': msg.content,
+            'created_at': msg.created_at.isoformat()
+        })
+    return json.dumps({'success': True, 'data': data}, cls=DjangoJSONEncoder).encode()
+
+
+def _serialize_rows_stdlib(queryset):
+    return serialization._stdlib_dumps({'success': True, 'data': serialization.rows(queryset, MESSAGE_COLUMNS)})
+
+
+def _serialize_rows(queryset):
+    return serialization.dumps({'success': True, 'data': serialization.rows(queryset, MESSAGE_COLUMNS)})
+
+
+SERIALIZERS = [
+    ('model instances + json', _serialize_models),
+    ('values_list + json', _serialize_rows_stdlib),
+    (f'values_list + {serialization.BACKEND}', _serialize_rows),
+]
+
+
+def serialization_throughput(messages=10000, repeat=5):
+    """
+    Serialize a ``messages``-message conversation (query included) with
+    each of SERIALIZERS, best of ``repeat`` runs. Returns one result per
+    path with rows/sec and the encoded size.
+    """
+    user = User.objects.create(
+        name='Serialization Bench', email='serialization@bench.test', password_hash=make_password(PASSWORD)
+    )
+    conversation = Conversation.objects.create(user=user, title='Long chat')
+    now = timezone.now()
+    Message.objects.bulk_create(
+        (
+            Message(
+                conversation=conversation,
+                role='assistant' if n % 2 else 'user',
+                content=f'Message {n} about {TOPICS[n % len(TOPICS)]}: ' + 'Lorem ipsum dolor sit amet. ' * 8,
+                created_at=now - timedelta(seconds=messages - n)
+            )
+            for n in range(messages)
+        ),
+        batch_size=1000
+    )
+    queryset = Message.objects.filter(conversation=conversation).order_by('created_at', 'id')
+
+    results = []
+    for name, serialize in SERIALIZERS:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            # A fresh clone each run, or the result cache would be timed
+            body = serialize(queryset.all())
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results.append({
+            'name': name,
+            'rows': messages,
+            'best_ms': round(best * 1000, 2),
+            'rows_per_second': round(messages / best),
+            'bytes': len(body),
+        })
+    return results
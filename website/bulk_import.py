@@ -0,0 +1,337 @@
+"""
+Bulk loading of users, sessions and subjects (``manage.py import_data``).
+
+Rows are read lazily from CSV or NDJSON (optionally gzipped) and written
+with ``bulk_create`` in batches, each batch in its own transaction, so
+a 100k-row file is a few dozen INSERTs instead of 100k signup calls.
+
+Users are matched on ``email`` and subjects on ``slug``; ``on_conflict``
+decides what happens to rows that already exist: ``skip`` them,
+``update`` them in place, or stop with ``error``. Rows repeated inside
+the file count as conflicts too.
+
+Passwords come in one of three ways:
+- ``prehashed``: Django-format hashes in a ``password_hash`` column.
+- ``hash``: plaintext in a ``password`` column, hashed on a thread pool
+  with the chosen hasher.
+- ``unusable``: no login password at all.
+``auto`` picks per row based on which column is filled. Skipped users are
+never hashed.
+
+bulk_create doesn't send signals, so the dashboard counters are rebuilt,
+the API cache and dashboard ETag versions bumped and the login token
+user cache cleared once at the end.
+"""
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import transaction
+
+from . import api_cache, auth_tokens, counters
+from .export import parse_bound
+from .models import Session, Subject, User
+
+ON_CONFLICT = ('skip', 'update', 'error')
+PASSWORD_MODES = ('auto', 'prehashed', 'hash', 'unusable')
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+class Conflict(Exception):
+    """A row matched an existing one and ``on_conflict`` is ``error``."""
+
+
+def read_rows(path, fmt=None):
+    """Yield dicts from a CSV or NDJSON file; ``-`` reads stdin and ``.gz`` is decompressed."""
+    if fmt is None:
+        fmt = 'csv' if path.removesuffix('.gz').endswith('.csv') else 'ndjson'
+    if path == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    elif path.endswith('.gz'):
+        stream = gzip.open(path, 'rt', encoding='utf-8', newline='')
+    else:
+        stream = open(path, encoding='utf-8', newline='')
+
+    with stream:
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _batches(rows, size):
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Stats:
+    def __init__(self, kind):
+        self.kind = kind
+        self.read = 0
+        self.written = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.errors = []
+        self.started = time.monotonic()
+
+    def invalid_row(self, number, message):
+        self.invalid += 1
+        if len(self.errors) < 20:
+            self.errors.append(f"row {number}: {message}")
+
+    @property
+    def rate(self):
+        return self.read / max(time.monotonic() - self.started, 1e-9)
+
+    def __str__(self):
+        return (
+            f"{self.kind}: {self.read} read, {self.written} written, {self.skipped} skipped, "
+            f"{self.invalid} invalid ({self.rate:,.0f} rows/s)"
+        )
+
+
+def _text(row, field, required=True, default=''):
+    value = (row.get(field) or '').strip()
+    if not value and required:
+        raise InvalidRow(f"{field} is required")
+    return value or default
+
+
+def _datetime(row, field):
+    value = (row.get(field) or '').strip()
+    try:
+        return parse_bound(value)
+    except ValueError as e:
+        raise InvalidRow(str(e))
+
+
+class Passwords:
+    def __init__(self, mode='auto', hasher='default', pool=None):
+        self.mode = mode
+        self.hasher = hasher
+        self.pool = pool
+
+    def source(self, row):
+        """Which way this row's password is provided, validating it."""
+        mode = self.mode
+        if mode == 'auto':
+            if row.get('password_hash'):
+                mode = 'prehashed'
+            elif row.get('password'):
+                mode = 'hash'
+            else:
+                raise InvalidRow("password or password_hash is required")
+        if mode == 'prehashed':
+            try:
+                identify_hasher(row.get('password_hash') or '')
+            except ValueError:
+                raise InvalidRow("password_hash is not a recognised Django hash")
+        elif mode == 'hash' and not row.get('password'):
+            raise InvalidRow("password is required")
+        return mode
+
+    def encode(self, rows, modes):
+        """Password hashes for ``rows``; plaintext ones are hashed in parallel."""
+        plain = [row['password'] for row, mode in zip(rows, modes) if mode == 'hash']
+        if self.pool is not None and len(plain) > 1:
+            hashed = iter(list(self.pool.map(self._hash, plain)))
+        else:
+            hashed = iter([self._hash(password) for password in plain])
+
+        result = []
+        for row, mode in zip(rows, modes):
+            if mode == 'prehashed':
+                result.append(row['password_hash'])
+            elif mode == 'hash':
+                result.append(next(hashed))
+            else:
+                result.append(make_password(None))
+        return result
+
+    def _hash(self, password):
+        return make_password(password, hasher=self.hasher)
+
+
+def _existing(model, field, keys):
+    return set(model.objects.filter(**{f'{field}__in': keys}).values_list(field, flat=True))
+
+
+def _unique_rows(batch, key, on_conflict, stats):
+    """Drop rows repeating a key earlier in the same batch ('update' keeps the last)."""
+    rows = {}
+    for number, row, value in batch:
+        if value in rows and on_conflict != 'update':
+            if on_conflict == 'error':
+                raise Conflict(f"row {number}: duplicate {key} {value!r} in the input")
+            stats.skipped += 1
+            continue
+        if value in rows:
+            stats.skipped += 1
+        rows[value] = (number, row)
+    return rows
+
+
+def _write_unique(model, key, update_fields, objects, on_conflict):
+    """
+    Insert ``objects`` (or upsert them for 'update') in the caller's
+    transaction; returns how many were written.
+    """
+    if on_conflict == 'update':
+        model.objects.bulk_create(
+            objects, update_conflicts=True, unique_fields=[key], update_fields=update_fields
+        )
+        return len(objects)
+    # Rows inserted since the batch's existence check are skipped, not
+    # counted: the IMMEDIATE transaction keeps any more from arriving on
+    # SQLite, and ignore_conflicts covers the race elsewhere
+    taken = _existing(model, key, [getattr(obj, key) for obj in objects])
+    if taken and on_conflict == 'error':
+        raise Conflict(f"{len(taken)} {key}(s) were added during the import, e.g. {min(taken)}")
+    objects = [obj for obj in objects if getattr(obj, key) not in taken]
+    model.objects.bulk_create(objects, ignore_conflicts=True)
+    return len(objects)
+
+
+def import_users(rows, batch_size=2000, on_conflict='skip', password_mode='auto',
+                 hasher='default', hash_workers=None, dry_run=False, progress=None):
+    stats = Stats('users')
+    with ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix='import-hash') as pool:
+        passwords = Passwords(password_mode, hasher, pool)
+        for batch in _batches(enumerate(rows, 1), batch_size):
+            parsed = []
+            for number, row in batch:
+                stats.read += 1
+                try:
+                    email = _text(row, 'email')
+                    parsed.append((number, row, email))
+                except InvalidRow as e:
+                    stats.invalid_row(number, e)
+
+            unique = _unique_rows(parsed, 'email', on_conflict, stats)
+            existing = _existing(User, 'email', list(unique)) if on_conflict != 'update' else set()
+            if existing and on_conflict == 'error':
+                raise Conflict(f"{len(existing)} email(s) already registered, e.g. {min(existing)}")
+
+            candidates, modes = [], []
+            for email, (number, row) in unique.items():
+                if email in existing:
+                    stats.skipped += 1
+                    continue
+                try:
+                    mode = passwords.source(row)
+                    name = _text(row, 'name', required=False, default='New User')
+                    created_at = _datetime(row, 'created_at')
+                except InvalidRow as e:
+                    stats.invalid_row(number, e)
+                    continue
+                modes.append(mode)
+                candidates.append((email, row, name, created_at))
+
+            hashes = passwords.encode([row for _, row, _, _ in candidates], modes)
+            users = [
+                User(name=name, email=email, password_hash=password_hash,
+                     **({'created_at': created_at} if created_at else {}))
+                for (email, _, name, created_at), password_hash in zip(candidates, hashes)
+            ]
+            written = len(users)
+            if users and not dry_run:
+                with transaction.atomic():
+                    written = _write_unique(User, 'email', ['name', 'password_hash'], users, on_conflict)
+            stats.written += written
+            stats.skipped += len(users) - written
+            if progress:
+                progress(stats)
+
+    if stats.written and not dry_run:
+        counters.rebuild()
+        api_cache.bump('users')
+        counters.bump('users')
+        auth_tokens.forget_all()
+    return stats
+
+
+def import_subjects(rows, batch_size=2000, on_conflict='skip', dry_run=False, progress=None):
+    stats = Stats('subjects')
+    for batch in _batches(enumerate(rows, 1), batch_size):
+        parsed = []
+        for number, row in batch:
+            stats.read += 1
+            try:
+                parsed.append((number, row, _text(row, 'slug')))
+            except InvalidRow as e:
+                stats.invalid_row(number, e)
+
+        unique = _unique_rows(parsed, 'slug', on_conflict, stats)
+        existing = _existing(Subject, 'slug', list(unique)) if on_conflict != 'update' else set()
+        if existing and on_conflict == 'error':
+            raise Conflict(f"{len(existing)} subject slug(s) already exist, e.g. {min(existing)}")
+
+        subjects = []
+        for slug, (number, row) in unique.items():
+            if slug in existing:
+                stats.skipped += 1
+                continue
+            try:
+                subjects.append(Subject(slug=slug, title=_text(row, 'title')))
+            except InvalidRow as e:
+                stats.invalid_row(number, e)
+
+        written = len(subjects)
+        if subjects and not dry_run:
+            with transaction.atomic():
+                written = _write_unique(Subject, 'slug', ['title'], subjects, on_conflict)
+        stats.written += written
+        stats.skipped += len(subjects) - written
+        if progress:
+            progress(stats)
+    return stats
+
+
+def import_sessions(rows, batch_size=2000, dry_run=False, progress=None):
+    """Sessions have no natural key, so every valid row is inserted; users are found by email."""
+    stats = Stats('sessions')
+    for batch in _batches(enumerate(rows, 1), batch_size):
+        emails = {(row.get('email') or '').strip() for _, row in batch} - {''}
+        user_ids = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+
+        sessions = []
+        for number, row in batch:
+            stats.read += 1
+            try:
+                email = _text(row, 'email')
+                if email not in user_ids:
+                    raise InvalidRow(f"no user with email {email}")
+                started_at = _datetime(row, 'started_at')
+                sessions.append(Session(
+                    user_id=user_ids[email],
+                    title=_text(row, 'title'),
+                    subject=_text(row, 'subject'),
+                    **({'started_at': started_at} if started_at else {})
+                ))
+            except InvalidRow as e:
+                stats.invalid_row(number, e)
+
+        if sessions and not dry_run:
+            with transaction.atomic():
+                Session.objects.bulk_create(sessions)
+        stats.written += len(sessions)
+        if progress:
+            progress(stats)
+
+    if stats.written and not dry_run:
+        counters.rebuild()
+        api_cache.bump('sessions')
+        counters.bump('sessions')
+    return stats
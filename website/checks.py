@@ -0,0 +1,29 @@
+"""
+System checks for settings that only fail at runtime, across processes.
+"""
+from django.conf import settings
+from django.core import checks
+
+# Backends whose entries no other process can see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches)
+def check_task_worker_cache(app_configs, **kwargs):
+    """
+    Without TASK_QUEUE_THREAD the queue runs in ``manage.py run_tasks``,
+    whose API cache bumps (see tasks.py) must reach the web processes.
+    """
+    queued_elsewhere = settings.TASK_QUEUE_ENABLED and not settings.TASK_QUEUE_THREAD
+    if not (queued_elsewhere and settings.API_CACHE_ENABLED):
+        return []
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Error(
+        "The task worker runs in its own process, but the default cache is local to each process.",
+        hint="Use a shared backend in CACHES (file-based, database or Redis) or set API_CACHE_ENABLED = False.",
+        id='website.E001',
+    )]
@@ -0,0 +1,81 @@
+"""
+Compression of JSON API responses.
+
+ApiCompressionMiddleware compresses buffered responses under
+API_COMPRESSION_PREFIXES when they are at least API_COMPRESSION_MIN_BYTES.
+It uses brotli when the client accepts it and the optional ``brotli``
+package is installed, and gzip otherwise. Message and conversation
+lists are repetitive text and shrink 5-10x, which matters most on slow
+student connections. Streaming responses (the SSE chat endpoints, exports)
+are passed through untouched, so tokens are never held back in a
+compressor's buffer.
+
+The level follows how busy the machine is. While the 1-minute load
+average per CPU is under API_COMPRESSION_BUSY_LOAD, the levels in
+API_COMPRESSION_LEVELS are used (brotli 5 and gzip 6 get most of the
+size win for a few ms on a 100 KB body). Above it,
+API_COMPRESSION_FAST_LEVELS are used, so compression doesn't take CPU
+the LLM and hashing pools need.
+"""
+import gzip
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .assets import accepted_encodings, brotli
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+_load_lock = threading.Lock()
+_load = {'checked': 0.0, 'busy': False}
+
+
+def busy():
+    """True while the load average per CPU is above API_COMPRESSION_BUSY_LOAD (checked once a second)."""
+    now = time.monotonic()
+    with _load_lock:
+        if now - _load['checked'] >= 1.0:
+            try:
+                per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+            except OSError:  # not available on this platform
+                per_cpu = 0.0
+            _load['busy'] = per_cpu > settings.API_COMPRESSION_BUSY_LOAD
+            _load['checked'] = now
+        return _load['busy']
+
+
+def level(encoding):
+    levels = settings.API_COMPRESSION_FAST_LEVELS if busy() else settings.API_COMPRESSION_LEVELS
+    return levels[encoding]
+
+
+def choose_encoding(accept_encoding):
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level('br'))
+    return gzip.compress(data, compresslevel=level('gzip'), mtime=0)
+
+
+def should_compress(request, response):
+    if not settings.API_COMPRESSION_ENABLED:
+        return False
+    if not request.path.startswith(tuple(settings.API_COMPRESSION_PREFIXES)):
+        return False
+    # Streaming bodies go out as produced; buffering would stall SSE tokens
+    if response.streaming or response.has_header('Content-Encoding'):
+        return False
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    if len(response.content) < settings.API_COMPRESSION_MIN_BYTES:
+        return False
+    return response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
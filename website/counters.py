@@ -0,0 +1,89 @@
+"""
+Materialized dashboard counters.
+
+Instead of running COUNT(*) over users and sessions on every dashboard
+load, DashboardCounter rows hold the running totals and are adjusted by
+signal handlers as User and Session rows are created, moved or deleted
+(through the write-behind queue in tasks.py, so they lag by a batch):
+
+    students              total number of users
+    sessions:<YYYY-MM-DD> sessions started on that (local) day
+    version:<name>        bumped on every write to users, sessions or
+                          recommendations; cheap freshness stamps for ETags
+
+Writes that skip signals (bulk_create, queryset.update/delete, raw SQL)
+are not tracked; run ``manage.py rebuild_counters`` after those.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DashboardCounter, Session, Task, User
+
+STUDENTS = 'students'
+
+
+def sessions_key(day):
+    return f"sessions:{day.isoformat()}"
+
+
+def version_key(name):
+    return f"version:{name}"
+
+
+def bump(name):
+    add(version_key(name), 1)
+
+
+def session_day(started_at):
+    return timezone.localdate(started_at)
+
+
+def add(key, delta):
+    """Atomically adjust one counter, creating it on first use."""
+    if not delta:
+        return
+    with transaction.atomic():
+        updated = DashboardCounter.objects.filter(key=key).update(value=F('value') + delta)
+        if not updated:
+            counter, _ = DashboardCounter.objects.get_or_create(key=key)
+            DashboardCounter.objects.filter(pk=counter.pk).update(value=F('value') + delta)
+
+
+def add_later(key, delta):
+    """Queue a counter adjustment for the task worker, which sums them per batch."""
+    if delta:
+        from . import tasks
+        tasks.enqueue('counter', key=key, delta=delta)
+
+
+def read(*keys):
+    """Current values for ``keys`` in one query; missing counters read as 0."""
+    values = dict(DashboardCounter.objects.filter(key__in=keys).values_list('key', 'value'))
+    return [values.get(key, 0) for key in keys]
+
+
+def expected():
+    """Counter values computed from scratch with COUNT queries."""
+    totals = {STUDENTS: User.objects.count()}
+    per_day = Session.objects.annotate(
+        day=TruncDate('started_at', tzinfo=timezone.get_current_timezone())
+    ).values('day').annotate(total=Count('id')).order_by()
+    for row in per_day:
+        totals[sessions_key(row['day'])] = row['total']
+    return totals
+
+
+def rebuild():
+    """Replace every counter with freshly computed values (versions are kept)."""
+    with transaction.atomic():
+        # Counted inside the transaction so the counts come from the primary
+        totals = expected()
+        # Queued adjustments are already part of the fresh counts
+        Task.objects.filter(name='counter').delete()
+        DashboardCounter.objects.exclude(key__startswith='version:').delete()
+        DashboardCounter.objects.bulk_create(
+            DashboardCounter(key=key, value=value) for key, value in totals.items()
+        )
+    return totals
@@ -0,0 +1,154 @@
+"""
+Streaming export of chat history as NDJSON or CSV.
+
+One row per message, with its conversation and user alongside. Rows come
+from the database EXPORT_CHUNK_SIZE at a time through ``.iterator()``
+and are encoded and (optionally) gzip-compressed as they go, so memory
+use stays flat however large the export is. Messages of archived
+conversations (see archive.py) are decoded one conversation at a time
+after the live messages. Conversations the user deleted are left out,
+as they are everywhere else. Under ASGI the view hands the stream over
+through streaming.body(), so it is still sent as it is read.
+
+Used by /api/export/ (the caller's own history) and the
+``export_history`` management command (any user, or everyone).
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import archive
+from .models import ConversationArchive, Message
+
+FIELDS = [
+    'message_id', 'conversation_id', 'conversation_title', 'user_id', 'user_email',
+    'role', 'content', 'created_at',
+]
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+# Encoded output is handed on in pieces of about this size
+BUFFER_SIZE = 64 * 1024
+
+
+def parse_bound(value, end=False):
+    """
+    An ISO date or datetime as an aware datetime, or None if empty. A bare
+    date means the start of that day, or its end when ``end`` is True.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _in_range(created_at, since, until):
+    return (since is None or created_at >= since) and (until is None or created_at <= until)
+
+
+def message_rows(user=None, since=None, until=None):
+    """Yield one dict per message, live messages first, then archived ones."""
+    messages = Message.objects.filter(conversation__is_active=True)
+    archives = ConversationArchive.objects.filter(conversation__is_active=True)
+    if user is not None:
+        messages = messages.filter(conversation__user=user)
+        archives = archives.filter(conversation__user=user)
+    if since is not None:
+        messages = messages.filter(created_at__gte=since)
+    if until is not None:
+        messages = messages.filter(created_at__lte=until)
+
+    live = messages.order_by('conversation_id', 'created_at', 'id').values_list(
+        'id', 'conversation_id', 'conversation__title', 'conversation__user_id',
+        'conversation__user__email', 'role', 'content', 'created_at'
+    )
+    for row in live.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield dict(zip(FIELDS, row))
+
+    # Only the ids here; each blob is loaded (and dropped) one at a time
+    archived = archives.order_by('conversation_id').values_list('id', flat=True)
+    for archive_id in archived.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        entry = ConversationArchive.objects.select_related(
+            'dictionary', 'conversation__user'
+        ).filter(id=archive_id).first()
+        if entry is None:
+            continue
+        conversation = entry.conversation
+        for pk, role, content, created_at in archive.read(entry):
+            created_at = datetime.fromisoformat(created_at)
+            if _in_range(created_at, since, until):
+                yield dict(zip(FIELDS, (
+                    pk, conversation.id, conversation.title, conversation.user_id,
+                    conversation.user.email, role, content, created_at
+                )))
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        row['created_at'] = row['created_at'].isoformat()
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() returns the text, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        row['created_at'] = row['created_at'].isoformat()
+        yield writer.writerow([row[field] for field in FIELDS])
+
+
+def _buffered(lines):
+    """Join small encoded lines into pieces of about BUFFER_SIZE bytes."""
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode()
+        pending.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b''.join(pending)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(rows, fmt='ndjson', gzip=False):
+    """Encode ``rows`` as ``fmt``, yielding bytes."""
+    lines = _csv_lines(rows) if fmt == 'csv' else _ndjson_lines(rows)
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if gzip else chunks
+
+
+def filename(fmt, gzip=False, label='chat-history'):
+    name = f"{label}-{timezone.now():%Y%m%d}.{FORMATS[fmt][1]}"
+    return name + '.gz' if gzip else name
@@ -0,0 +1,103 @@
+"""
+Bounded worker pool for password hashing.
+
+PBKDF2 with Django's default iteration count costs tens of milliseconds
+of CPU per call. Run on the request thread, a burst of logins at the start
+of term occupies every worker and stalls chat traffic with it. Instead
+login_api and signup_api hand the work to a small thread pool of
+PASSWORD_HASH_WORKERS threads. hashlib (like the argon2 and bcrypt
+bindings) releases the GIL while hashing, so threads use real cores
+without the startup and Django setup cost of a process pool.
+
+At most PASSWORD_HASH_QUEUE calls may wait for a thread; past that
+callers get scheduler.QueueFull straight away, and a call that isn't
+finished within PASSWORD_HASH_TIMEOUT seconds raises
+scheduler.QueueTimeout, so the views answer 429/503 with Retry-After
+exactly like the LLM scheduler does.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+from .scheduler import QueueFull, QueueTimeout
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {'completed': 0, 'failed': 0, 'rejected': 0, 'timed_out': 0, 'in_flight': 0}
+
+
+def _pool():
+    global _executor, _slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(
+                    settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE
+                )
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    thread_name_prefix='password-hash'
+                )
+    return _executor, _slots
+
+
+def _count(name, delta=1):
+    with _stats_lock:
+        _stats[name] += delta
+
+
+def _finished(future):
+    _slots.release()
+    _count('in_flight', -1)
+    # A hasher that raised did no useful work; keep it out of the throughput
+    _count('failed' if future.cancelled() or future.exception() is not None else 'completed')
+
+
+def _run(fn, *args):
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        _count('rejected')
+        raise QueueFull("Too many sign-ins at once, please try again shortly", 1)
+    _count('in_flight')
+    future = executor.submit(fn, *args)
+    future.add_done_callback(_finished)
+    try:
+        return future.result(timeout=settings.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        # The hash keeps its slot until it actually finishes
+        _count('timed_out')
+        raise QueueTimeout("Sign-in is busy, please try again shortly", 5)
+
+
+def _verify(password, encoded):
+    upgraded = []
+    valid = check_password(password, encoded, setter=upgraded.append)
+    return valid, (make_password(upgraded[0]) if upgraded else None)
+
+
+def hash_password(password):
+    """make_password() on the hashing pool."""
+    return _run(make_password, password)
+
+
+def verify_password(password, encoded):
+    """
+    check_password() on the hashing pool. Returns ``(valid, new_hash)``
+    where ``new_hash`` is set when the stored hash uses an outdated hasher
+    or iteration count and should be saved in its place.
+    """
+    return _run(_verify, password, encoded)
+
+
+def stats():
+    with _stats_lock:
+        return {
+            **_stats,
+            'workers': settings.PASSWORD_HASH_WORKERS,
+            'max_queue': settings.PASSWORD_HASH_QUEUE,
+        }
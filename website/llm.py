@@ -0,0 +1,208 @@
+"""Client helpers for the local Ollama server that powers the AI chat."""
+import asyncio
+import json
+import threading
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+_session = None
+_session_lock = threading.Lock()
+
+# Event loop -> (its AsyncClient, the task that closes it with the loop)
+_async_clients = {}
+_async_clients_lock = threading.Lock()
+
+ROLE_LABELS = {"user": "Student", "assistant": "Tutor", "system": "System"}
+
+
+def build_prompt(user_message, history=None):
+    """
+    Prompt for one chat turn. ``history`` is a list of (role, content)
+    pairs, oldest first, replayed when there is no stored context.
+    """
+    prompt = f"Explain clearly:\n{user_message}"
+    if history:
+        transcript = "\n".join(
+            f"{ROLE_LABELS.get(role, role)}: {content}" for role, content in history
+        )
+        prompt = f"Conversation so far:\n{transcript}\n\n{prompt}"
+    return prompt
+
+
+def build_payload(user_message, stream=False, context=None, history=None):
+    """
+    Build the /api/generate request body for a chat turn.
+
+    ``context`` is the token array Ollama returned for the previous turn;
+    sending it back means only the new prompt has to be prefilled.
+    """
+    payload = {
+        "model": settings.OLLAMA_MODEL,
+        "prompt": build_prompt(user_message, history),
+        "stream": stream,
+        "options": dict(settings.OLLAMA_OPTIONS),
+    }
+    if context:
+        payload["context"] = context
+    return payload
+
+
+def generate_url():
+    return f"{settings.OLLAMA_URL}/api/generate"
+
+
+def get_session():
+    """Process-wide requests session so sync views reuse keep-alive connections."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def get_async_client():
+    """
+    Pooled httpx client for the async views, one per event loop.
+
+    An AsyncClient's connections belong to the loop that opened them, so
+    each loop gets its own client (e.g. every async_to_sync() call in tests
+    runs a new loop). The client is closed on its loop when the loop shuts
+    down, see _close_with_loop().
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(
+                settings.OLLAMA_TIMEOUT,
+                connect=settings.OLLAMA_CONNECT_TIMEOUT
+            )
+        )
+        entry = (client, loop.create_task(_close_with_loop(client)))
+        with _async_clients_lock:
+            for closed in [other for other in _async_clients if other.is_closed()]:
+                del _async_clients[closed]
+            _async_clients[loop] = entry
+    return entry[0]
+
+
+async def _close_with_loop(client):
+    """
+    Wait until cancelled, then close ``client``. asyncio.run() (used by
+    ASGI servers and async_to_sync) cancels pending tasks before closing
+    the loop, so the keep-alive connections are closed on the loop they
+    belong to rather than left to the garbage collector.
+    """
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
+
+
+def _sync_timeout():
+    return (settings.OLLAMA_CONNECT_TIMEOUT, settings.OLLAMA_TIMEOUT)
+
+
+def _parse_chunk(line):
+    chunk = json.loads(line)
+    if chunk.get("error"):
+        raise RuntimeError(chunk["error"])
+    return chunk
+
+
+def generate(user_message, context=None, history=None):
+    """Run a blocking generation and return Ollama's JSON result."""
+    call = metrics.LLMCall()
+    try:
+        response = get_session().post(
+            generate_url(),
+            json=build_payload(user_message, context=context, history=history),
+            timeout=_sync_timeout()
+        )
+        result = response.json()
+        call.observe(result)
+        return result
+    finally:
+        call.finish()
+
+
+def stream_generate(user_message, context=None, history=None):
+    """
+    Run a streaming generation, yielding each NDJSON chunk from Ollama
+    as a dict as soon as it arrives. The last chunk has "done": True
+    and carries the new "context".
+    """
+    call = metrics.LLMCall()
+    try:
+        with get_session().post(
+            generate_url(),
+            json=build_payload(user_message, stream=True, context=context, history=history),
+            timeout=_sync_timeout(),
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = _parse_chunk(line)
+                call.observe(chunk)
+                yield chunk
+                if chunk.get("done"):
+                    break
+    finally:
+        call.finish()
+
+
+async def agenerate(user_message, context=None, history=None):
+    """Async version of generate() using the pooled httpx client."""
+    call = metrics.LLMCall()
+    try:
+        response = await get_async_client().post(
+            generate_url(),
+            json=build_payload(user_message, context=context, history=history)
+        )
+        result = response.json()
+        call.observe(result)
+        return result
+    finally:
+        call.finish()
+
+
+async def astream_generate(user_message, context=None, history=None):
+    """Async version of stream_generate() using the pooled httpx client."""
+    client = get_async_client()
+    call = metrics.LLMCall()
+    try:
+        async with client.stream(
+            "POST",
+            generate_url(),
+            json=build_payload(user_message, stream=True, context=context, history=history)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = _parse_chunk(line)
+                call.observe(chunk)
+                yield chunk
+                if chunk.get("done"):
+                    break
+    finally:
+        call.finish()
@@ -0,0 +1,162 @@
+"""
+Two-tier cache for chatbot answers.
+
+Entries are keyed on the normalized prompt, the model name and the model
+options, so "Explain  recursion?" and "explain recursion" share an answer
+but changing num_predict does not. Lookups go through a small in-process
+LRU first and fall back to the CachedResponse table, which is bounded by
+LLM_CACHE_TTL and LLM_CACHE_MAX_ENTRIES.
+
+Reads stay off SQLite's writer lock. A table hit only writes hits and
+last_used_at back once the row's last_used_at is LLM_CACHE_TOUCH_INTERVAL
+old; hits in between are counted in memory and flushed with the next
+touch or prune. Pruning runs at most once every LLM_CACHE_PRUNE_INTERVAL
+seconds per process, so the table can briefly hold more than
+LLM_CACHE_MAX_ENTRIES rows.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import llm
+from .lru import TTLCache
+from .models import CachedResponse
+
+_memory = None
+
+_maintenance_lock = threading.Lock()
+_maintenance = {'pruned_at': None, 'hits': {}}
+
+
+def _memory_tier():
+    global _memory
+    if _memory is None:
+        _memory = TTLCache(settings.LLM_CACHE_MEMORY_ENTRIES, settings.LLM_CACHE_TTL)
+    return _memory
+
+
+def normalize(user_message):
+    """Casefold, collapse whitespace and drop trailing punctuation."""
+    text = " ".join(user_message.casefold().split())
+    return text.rstrip(" ?!.")
+
+
+def make_key(user_message, model=None, options=None):
+    model = model or settings.OLLAMA_MODEL
+    options = settings.OLLAMA_OPTIONS if options is None else options
+    raw = json.dumps(
+        [model, llm.build_prompt(normalize(user_message)), options],
+        sort_keys=True
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def lookup(user_message):
+    """Return the cached answer for a prompt, or None on a miss."""
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+
+    key = make_key(user_message)
+    response = _memory_tier().get(key)
+    if response is not None:
+        return response
+
+    entry = CachedResponse.objects.filter(key=key).values_list(
+        'id', 'response', 'created_at', 'last_used_at'
+    ).first()
+    if entry is None:
+        return None
+
+    entry_id, response, created_at, last_used_at = entry
+    age = (timezone.now() - created_at).total_seconds()
+    if age > settings.LLM_CACHE_TTL:
+        CachedResponse.objects.filter(id=entry_id).delete()
+        return None
+
+    _note_hit(entry_id, last_used_at)
+    _memory_tier().set(key, response, settings.LLM_CACHE_TTL - age)
+    return response
+
+
+def store(user_message, response):
+    """Store a finished answer in both tiers."""
+    if not settings.LLM_CACHE_ENABLED or not response:
+        return
+
+    key = make_key(user_message)
+    _memory_tier().set(key, response)
+    CachedResponse.objects.update_or_create(
+        key=key,
+        defaults={
+            'model': settings.OLLAMA_MODEL,
+            'prompt': normalize(user_message),
+            'response': response,
+            'created_at': timezone.now(),
+            'last_used_at': timezone.now(),
+        }
+    )
+    _maybe_prune()
+
+
+def _note_hit(entry_id, last_used_at):
+    now = timezone.now()
+    with _maintenance_lock:
+        pending = _maintenance['hits']
+        if (now - last_used_at).total_seconds() < settings.LLM_CACHE_TOUCH_INTERVAL:
+            pending[entry_id] = pending.get(entry_id, 0) + 1
+            return
+        hits = pending.pop(entry_id, 0) + 1
+    CachedResponse.objects.filter(id=entry_id).update(hits=F('hits') + hits, last_used_at=now)
+
+
+def _flush_hits():
+    with _maintenance_lock:
+        pending, _maintenance['hits'] = _maintenance['hits'], {}
+    by_count = {}
+    for entry_id, hits in pending.items():
+        by_count.setdefault(hits, []).append(entry_id)
+    for hits, entry_ids in by_count.items():
+        CachedResponse.objects.filter(id__in=entry_ids).update(hits=F('hits') + hits)
+
+
+def _maybe_prune():
+    now = time.monotonic()
+    with _maintenance_lock:
+        pruned_at = _maintenance['pruned_at']
+        if pruned_at is not None and now - pruned_at < settings.LLM_CACHE_PRUNE_INTERVAL:
+            return
+        _maintenance['pruned_at'] = now
+    prune()
+
+
+def prune():
+    """Drop expired rows, then the least recently used ones over the size limit."""
+    _flush_hits()
+    cutoff = timezone.now() - timedelta(seconds=settings.LLM_CACHE_TTL)
+    CachedResponse.objects.filter(created_at__lt=cutoff).delete()
+
+    overflow = CachedResponse.objects.count() - settings.LLM_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale_ids = CachedResponse.objects.order_by('last_used_at').values_list(
+            'id', flat=True
+        )[:overflow]
+        CachedResponse.objects.filter(id__in=list(stale_ids)).delete()
+
+
+def clear():
+    _memory_tier().clear()
+    with _maintenance_lock:
+        _maintenance['pruned_at'] = None
+        _maintenance['hits'] = {}
+    CachedResponse.objects.all().delete()
+
+
+alookup = sync_to_async(lookup)
+astore = sync_to_async(store)
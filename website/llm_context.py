@@ -0,0 +1,122 @@
+"""
+Per-conversation Ollama context.
+
+/api/generate returns a ``context`` token array with every finished reply.
+Storing it on the Conversation and sending it back with the next turn
+lets the model continue from there, so only the new message is prefilled
+instead of the whole conversation. The array is kept as little-endian
+uint32s, zlib-compressed, which is a few bytes per token.
+
+When there is no usable context (first turn after a cached answer, a
+model change, or a context that grew past LLM_CONTEXT_MAX_TOKENS) the
+turn falls back to replaying the most recent messages that fit in
+LLM_HISTORY_TOKEN_BUDGET.
+
+Turns are saved behind the response (see tasks.py), so a quick follow-up
+can arrive before the previous turn is written. for_turn() therefore
+also reads the conversation's chat turns still waiting in the queue:
+the newest one's context wins over the stored one, and their messages
+count as the most recent history.
+"""
+import sys
+import zlib
+from array import array
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Message, Task
+
+CHARS_PER_TOKEN = 4
+
+
+def encode(context):
+    tokens = array('I', context)
+    if sys.byteorder == 'big':
+        tokens.byteswap()
+    return zlib.compress(tokens.tobytes())
+
+
+def decode(blob):
+    tokens = array('I')
+    tokens.frombytes(zlib.decompress(bytes(blob)))
+    if sys.byteorder == 'big':
+        tokens.byteswap()
+    return tokens.tolist()
+
+
+def stored_context(conversation):
+    """The conversation's saved context, or None if missing or stale."""
+    if not conversation.llm_context:
+        return None
+    if conversation.llm_context_model != settings.OLLAMA_MODEL:
+        return None
+    context = decode(conversation.llm_context)
+    if len(context) > settings.LLM_CONTEXT_MAX_TOKENS:
+        return None
+    return context
+
+
+def pending_turns(conversation):
+    """Payloads of ``conversation``'s chat turns still in the task queue, oldest first."""
+    if not settings.TASK_QUEUE_ENABLED:
+        return []
+    return list(
+        Task.objects.filter(name='chat_turn', failed=False, payload__conversation_id=conversation.id)
+        .order_by('id').values_list('payload', flat=True)
+    )
+
+
+def recent_history(conversation, pending=()):
+    """Newest messages (queued ``pending`` turns included) that fit the token budget, oldest first."""
+    budget = settings.LLM_HISTORY_TOKEN_BUDGET * CHARS_PER_TOKEN
+    queued = []
+    for payload in reversed(pending):
+        if payload.get('bot_response') is not None:
+            queued.append(('assistant', payload['bot_response']))
+        queued.append(('user', payload['user_message']))
+    rows = queued[:settings.LLM_HISTORY_MAX_MESSAGES] + list(
+        Message.objects.filter(conversation=conversation).order_by(
+            '-created_at'
+        ).values_list('role', 'content')[:max(0, settings.LLM_HISTORY_MAX_MESSAGES - len(queued))]
+    )
+
+    history = []
+    for role, content in rows:
+        budget -= len(content)
+        if budget < 0:
+            break
+        history.append((role, content))
+    history.reverse()
+    return history
+
+
+def for_turn(conversation):
+    """
+    Returns ``(context, history)`` for the next turn; at most one is set.
+    Must be called before the new user message is saved.
+    """
+    if conversation is None:
+        return None, None
+    pending = pending_turns(conversation)
+    if pending:
+        # Newer than anything stored on the conversation
+        context = pending[-1].get('context')
+        if context and len(context) <= settings.LLM_CONTEXT_MAX_TOKENS:
+            return context, None
+        return None, recent_history(conversation, pending) or None
+    context = stored_context(conversation)
+    if context is not None:
+        return context, None
+    return None, recent_history(conversation) or None
+
+
+def remember(conversation, context):
+    """Keep the context from a finished reply for the next turn."""
+    if not context:
+        return
+    conversation.llm_context = encode(context)
+    conversation.llm_context_model = settings.OLLAMA_MODEL
+
+
+afor_turn = sync_to_async(for_turn)
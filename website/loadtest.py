@@ -0,0 +1,264 @@
+"""
+End-to-end load generator for the chat APIs.
+
+Each virtual student runs sessions back to back until the test ends: log
+in, list their conversations, start a new one or reopen one and load its
+messages, then chat a few turns with think time in between. Everything
+goes over HTTP to a running server, so the numbers include the web
+server, the database and the LLM (use mock_ollama for a repeatable one).
+
+Every request is recorded under its step name. report() turns the samples
+into throughput, latency percentiles and error counts per step. A request
+counts as an error if it fails at the HTTP level or answers
+``"success": false``; a 429 or 503 from the LLM scheduler is counted as
+"rejected" instead, since that is the server shedding load on purpose.
+"""
+import json
+import random
+import statistics
+import threading
+import time
+
+import requests
+
+PROMPTS = [
+    "explain recursion",
+    "what is an eigenvalue",
+    "how do I find the derivative of x^2 sin x",
+    "explain the central limit theorem",
+    "what is the difference between a list and a tuple in python",
+    "how does photosynthesis work",
+    "explain big O notation",
+    "what is a vector space",
+]
+
+FOLLOW_UPS = [
+    "can you give an example?",
+    "why does that work?",
+    "explain it more simply",
+    "what is a common mistake here?",
+]
+
+# Statuses the scheduler uses to shed load (see views._busy_response)
+REJECTED_STATUSES = {429, 503}
+
+
+class LoadConfig:
+    def __init__(self, base_url, students=10, duration=60.0, turns=3, think_time=1.0,
+                 repeat_ratio=0.2, resume_ratio=0.5, password="loadtest-password",
+                 stream=False, timeout=120.0, seed=None):
+        self.base_url = base_url.rstrip("/")
+        self.students = students
+        self.duration = duration
+        self.turns = turns
+        self.think_time = think_time
+        self.repeat_ratio = repeat_ratio
+        self.resume_ratio = resume_ratio
+        self.password = password
+        self.stream = stream
+        self.timeout = timeout
+        self.seed = seed
+
+    def email(self, n):
+        return f"loadtest{n}@example.com"
+
+
+class Recorder:
+    """Thread-safe collection of (step, seconds, outcome) samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+        self.sessions = 0
+        self.started = None
+        self.finished = None
+
+    def add(self, step, seconds, outcome, detail=None):
+        with self._lock:
+            self.samples.append((step, seconds, outcome, detail))
+
+    def session_done(self):
+        with self._lock:
+            self.sessions += 1
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Student:
+    def __init__(self, number, config, recorder):
+        self.config = config
+        self.recorder = recorder
+        self.email = config.email(number)
+        self.http = requests.Session()
+        self.random = random.Random(None if config.seed is None else config.seed + number)
+        self.token = None
+
+    def _call(self, step, method, path, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        started = time.perf_counter()
+        try:
+            response = self.http.request(
+                method, self.config.base_url + path, headers=headers,
+                timeout=self.config.timeout, **kwargs
+            )
+            if response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                payload = self._read_stream(response)
+            else:
+                payload = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self.recorder.add(step, time.perf_counter() - started, "error", type(e).__name__)
+            raise StepFailed(step)
+
+        elapsed = time.perf_counter() - started
+        if response.status_code in REJECTED_STATUSES:
+            self.recorder.add(step, elapsed, "rejected", str(response.status_code))
+            raise StepFailed(step)
+        if response.status_code != 200 or payload.get("success") is False:
+            self.recorder.add(step, elapsed, "error", payload.get("message") or str(response.status_code))
+            raise StepFailed(step)
+        self.recorder.add(step, elapsed, "ok")
+        return payload
+
+    def _read_stream(self, response):
+        """Collect an SSE reply from chatbot_stream_api into one payload."""
+        event, payload, tokens = None, {}, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:])
+                if event == "error":
+                    return {"success": False, "message": data.get("message")}
+                if event == "done":
+                    payload = data
+                else:
+                    tokens.append(data.get("token", ""))
+                event = None
+        return {"success": True, "bot_response": "".join(tokens), **payload}
+
+    def sign_up(self):
+        """Create the account if it does not exist yet (not timed)."""
+        self.http.post(
+            self.config.base_url + "/api/signup/",
+            json={"email": self.email, "password": self.config.password, "name": "Load Test"},
+            timeout=self.config.timeout,
+        )
+
+    def _think(self):
+        if self.config.think_time > 0:
+            time.sleep(self.random.expovariate(1 / self.config.think_time))
+
+    def _prompt(self):
+        prompt = self.random.choice(PROMPTS)
+        if self.random.random() >= self.config.repeat_ratio:
+            # Mostly unique prompts, so the answer cache doesn't hide the LLM
+            prompt = f"{prompt} (case {self.random.randrange(10 ** 9)})"
+        return prompt
+
+    def session(self):
+        self.token = None
+        login = self._call("login", "POST", "/api/login/", json={
+            "email": self.email, "password": self.config.password
+        })
+        self.token = login.get("token")
+
+        conversations = self._call("list_conversations", "GET", "/api/conversations/")["data"]
+        if conversations and self.random.random() < self.config.resume_ratio:
+            conversation_id = self.random.choice(conversations)["id"]
+            self._call("open_conversation", "GET", "/api/messages/", params={"conversation_id": conversation_id})
+        else:
+            created = self._call("new_conversation", "POST", "/api/conversations/", json={"title": "Load test"})
+            conversation_id = created["conversation_id"]
+
+        chat_path = "/api/chatbot/stream/" if self.config.stream else "/api/chatbot/"
+        for turn in range(self.config.turns):
+            self._think()
+            message = self._prompt() if turn == 0 else self.random.choice(FOLLOW_UPS)
+            self._call("chat", "POST", chat_path, json={
+                "message": message, "conversation_id": conversation_id
+            })
+        self.recorder.session_done()
+
+    def run(self, deadline):
+        while time.monotonic() < deadline:
+            try:
+                self.session()
+            except StepFailed:
+                # Back off a little and start a fresh session
+                time.sleep(min(1.0, self.config.think_time))
+
+
+def run(config):
+    """Run the load test and return the Recorder."""
+    recorder = Recorder()
+    students = [Student(n, config, recorder) for n in range(config.students)]
+    for student in students:
+        student.sign_up()
+
+    recorder.started = time.monotonic()
+    deadline = recorder.started + config.duration
+    threads = [threading.Thread(target=student.run, args=(deadline,)) for student in students]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.finished = time.monotonic()
+    return recorder
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def report(recorder, config):
+    """Summarize the samples as a JSON-serializable dict."""
+    elapsed = (recorder.finished or time.monotonic()) - recorder.started
+    steps = {}
+    for step, seconds, outcome, detail in recorder.samples:
+        entry = steps.setdefault(step, {'latencies': [], 'ok': 0, 'error': 0, 'rejected': 0, 'reasons': {}})
+        entry[outcome] += 1
+        if outcome == 'ok':
+            entry['latencies'].append(seconds * 1000)
+        elif detail:
+            entry['reasons'][detail] = entry['reasons'].get(detail, 0) + 1
+
+    summary = {}
+    for step, entry in steps.items():
+        ordered = sorted(entry.pop('latencies'))
+        total = entry['ok'] + entry['error'] + entry['rejected']
+        summary[step] = {
+            **entry,
+            'requests': total,
+            'rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(statistics.median(ordered), 1) if ordered else 0.0,
+            'p95_ms': round(_percentile(ordered, 0.95), 1),
+            'p99_ms': round(_percentile(ordered, 0.99), 1),
+            'max_ms': round(ordered[-1], 1) if ordered else 0.0,
+        }
+
+    requests_total = len(recorder.samples)
+    return {
+        'config': {
+            'base_url': config.base_url,
+            'students': config.students,
+            'duration': config.duration,
+            'turns': config.turns,
+            'think_time': config.think_time,
+            'repeat_ratio': config.repeat_ratio,
+            'stream': config.stream,
+        },
+        'elapsed': round(elapsed, 2),
+        'sessions': recorder.sessions,
+        'sessions_per_second': round(recorder.sessions / elapsed, 3) if elapsed else 0.0,
+        'requests': requests_total,
+        'requests_per_second': round(requests_total / elapsed, 2) if elapsed else 0.0,
+        'errors': sum(entry['error'] for entry in summary.values()),
+        'rejected': sum(entry['rejected'] for entry in summary.values()),
+        'steps': summary,
+    }
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+
+from website import archive
+from website.models import ArchiveDictionary, Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Compress the messages of conversations idle for ARCHIVE_IDLE_DAYS "
+        "(or deleted for ARCHIVE_INACTIVE_DAYS) into one archive row each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only count the conversations that would be archived.",
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help="Archive at most this many conversations.",
+        )
+        parser.add_argument(
+            '--train-dictionary',
+            action='store_true',
+            help="Train a new shared compression dictionary from recent messages first.",
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=2000,
+            help="Messages to train the dictionary on (default 2000).",
+        )
+
+    def _train(self, samples):
+        texts = list(
+            Message.objects.filter(role='assistant').order_by('-id').values_list('content', flat=True)[:samples]
+        )
+        data = archive.train_dictionary(texts)
+        if not data:
+            self.stdout.write("Not enough repeated text to train a dictionary.")
+            return None
+        dictionary = ArchiveDictionary.objects.create(data=data, sample_count=len(texts))
+        self.stdout.write(f"Trained dictionary {dictionary.id}: {len(data)} bytes from {len(texts)} messages")
+        return dictionary
+
+    def handle(self, *args, **options):
+        conversations = archive.candidates().order_by('updated_at')
+        if options['limit']:
+            conversations = conversations[:options['limit']]
+
+        if options['dry_run']:
+            self.stdout.write(f"{conversations.count()} conversation(s) would be archived.")
+            return
+
+        if options['train_dictionary']:
+            dictionary = self._train(options['samples']) or archive.latest_dictionary()
+        else:
+            dictionary = archive.latest_dictionary()
+
+        archived = messages = raw_bytes = stored_bytes = 0
+        for conversation in conversations.iterator():
+            entry = archive.archive(conversation, dictionary)
+            if entry is None:
+                continue
+            archived += 1
+            messages += entry.message_count
+            raw_bytes += entry.raw_bytes
+            stored_bytes += len(entry.data)
+
+        if not archived:
+            self.stdout.write("Nothing to archive.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} conversation(s), {messages} message(s): "
+            f"{raw_bytes} bytes of text stored in {stored_bytes} bytes "
+            f"({stored_bytes / raw_bytes:.1%})."
+        ))
+        self.stdout.write("Run `manage.py archive_report` to see the space reclaimed.")
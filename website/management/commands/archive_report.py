@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from website.models import ConversationArchive, Message
+
+
+def _size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num_bytes) < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{num_bytes} B"
+        num_bytes /= 1024
+
+
+class Command(BaseCommand):
+    help = "Report how much space the conversation archive has reclaimed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help="Run VACUUM afterwards to return free pages to the OS (SQLite; locks the database).",
+        )
+
+    def _pages(self):
+        with connection.cursor() as cursor:
+            page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+            page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        return page_size * page_count, page_size * free_pages
+
+    def handle(self, *args, **options):
+        archives = ConversationArchive.objects.aggregate(
+            conversations=Count('id'),
+            messages=Sum('message_count'),
+            raw_bytes=Sum('raw_bytes'),
+            stored_bytes=Sum(Length('data')),
+        )
+        live = Message.objects.aggregate(messages=Count('id'), text_bytes=Sum(Length('content')))
+
+        raw_bytes = archives['raw_bytes'] or 0
+        stored_bytes = archives['stored_bytes'] or 0
+        self.stdout.write(f"Archived conversations: {archives['conversations']}")
+        self.stdout.write(f"Archived messages:      {archives['messages'] or 0}")
+        self.stdout.write(f"  text before:          {_size(raw_bytes)}")
+        self.stdout.write(f"  stored compressed:    {_size(stored_bytes)}")
+        if raw_bytes:
+            self.stdout.write(
+                f"  reclaimed:            {_size(raw_bytes - stored_bytes)} "
+                f"(stored at {stored_bytes / raw_bytes:.1%} of original)"
+            )
+        self.stdout.write(f"Live messages:          {live['messages']} ({_size(live['text_bytes'] or 0)} of text)")
+
+        if connection.vendor != 'sqlite':
+            return
+        file_bytes, free_bytes = self._pages()
+        self.stdout.write(f"Database file:          {_size(file_bytes)}, {_size(free_bytes)} free for reuse")
+
+        if options['vacuum']:
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+            after, _ = self._pages()
+            self.stdout.write(self.style.SUCCESS(
+                f"VACUUM returned {_size(file_bytes - after)} to the OS ({_size(after)} now)."
+            ))
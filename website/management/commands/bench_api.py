@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from website import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and measure query counts and p50/p95 "
+        "latency for every API view, with Ollama stubbed out."
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmarks.DEFAULT_SCALE.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f"Default {default}.")
+        parser.add_argument('--iterations', type=int, default=20, help="Measured calls per scenario (default 20).")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        scale = {name: options[name] for name in benchmarks.DEFAULT_SCALE}
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(**benchmarks.BENCHMARK_SETTINGS):
+                benchmarks.reset_caches()
+                fixtures = benchmarks.seed(**scale)
+                results = benchmarks.run(fixtures, options['iterations'])
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        self.stdout.write(", ".join(f"{count} {name}" for name, count in scale.items()) + "\n")
+        self.stdout.write(f"{'scenario':<46} {'queries':>7} {'budget':>6} {'p50 ms':>9} {'p95 ms':>9}")
+        for result in results:
+            flag = "" if result['within_budget'] else "  OVER"
+            self.stdout.write(
+                f"{result['name']:<46} {result['queries']:>7} {result['budget']:>6} "
+                f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}{flag}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(benchmarks.report(results, scale), f, indent=2)
+            self.stdout.write(f"\nWrote {options['output']}")
+
+        over = [result['name'] for result in results if not result['within_budget']]
+        if over:
+            raise CommandError(f"Over query budget: {', '.join(over)}")
@@ -0,0 +1,91 @@
+import copy
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure hashes/sec per core for the configured PASSWORD_HASHERS, to pick "
+        "iteration counts and PASSWORD_HASH_WORKERS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=2.0,
+            help="Seconds to run each measurement (default 2).",
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            nargs='+',
+            help="Also try these iteration counts for hashers that have one (PBKDF2).",
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.PASSWORD_HASH_WORKERS,
+            help="Threads for the parallel run (default PASSWORD_HASH_WORKERS).",
+        )
+
+    def _rate(self, hasher, duration, threads=1):
+        """Hashes per second across ``threads`` threads hashing for ``duration``."""
+        salt = hasher.salt()
+
+        def worker():
+            count = 0
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                hasher.encode('correct horse battery staple', salt)
+                count += 1
+            return count
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            total = sum(pool.map(lambda _: worker(), range(threads)))
+        return total / (time.perf_counter() - started)
+
+    def _variants(self, hasher, iterations):
+        yield hasher
+        if iterations and hasattr(hasher, 'iterations'):
+            for count in iterations:
+                if count != hasher.iterations:
+                    variant = copy.copy(hasher)
+                    variant.iterations = count
+                    yield variant
+
+    def handle(self, *args, **options):
+        duration = options['duration']
+        threads = options['threads']
+        self.stdout.write(f"{os.cpu_count()} CPUs, {threads} thread(s) for the parallel run\n")
+        self.stdout.write(
+            f"{'hasher':<32} {'iterations':>11} {'ms/hash':>9} {'hashes/s/core':>14} "
+            f"{f'hashes/s x{threads}':>14}"
+        )
+
+        for hasher in get_hashers():
+            try:
+                hasher.encode('probe', hasher.salt())
+            except ValueError as e:
+                # argon2/bcrypt hashers without their library installed
+                self.stdout.write(f"{hasher.algorithm:<32} skipped: {e}")
+                continue
+
+            for variant in self._variants(hasher, options['iterations']):
+                single = self._rate(variant, duration)
+                parallel = self._rate(variant, duration, threads) if threads > 1 else single
+                self.stdout.write(
+                    f"{variant.algorithm:<32} {getattr(variant, 'iterations', '-'):>11} "
+                    f"{1000 / single:>9.1f} {single:>14.1f} {parallel:>14.1f}"
+                )
+
+        self.stdout.write(
+            "\nLogins/sec the pool can absorb is roughly the last column for the "
+            "first (default) hasher."
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from website import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed one long conversation in a throwaway test database and compare "
+        "rows/sec for the model-instance and values_list serialization paths."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10000, help="Messages in the conversation (default 10000).")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per path; the best is reported (default 5).")
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(**benchmarks.BENCHMARK_SETTINGS):
+                results = benchmarks.serialization_throughput(options['messages'], options['repeat'])
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        baseline = results[0]['rows_per_second']
+        self.stdout.write(f"{options['messages']} messages, best of {options['repeat']}\n")
+        self.stdout.write(f"{'path':<28} {'ms':>9} {'rows/s':>10} {'speedup':>8} {'bytes':>10}")
+        for result in results:
+            self.stdout.write(
+                f"{result['name']:<28} {result['best_ms']:>9.2f} {result['rows_per_second']:>10} "
+                f"{result['rows_per_second'] / baseline:>7.2f}x {result['bytes']:>10}"
+            )
@@ -0,0 +1,180 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = """
+CREATE TABLE conversations (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL REFERENCES conversations (id),
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX idx_msg_conv_created ON messages (conversation_id, created_at);
+"""
+
+REPLY = "Recursion is when a function calls itself on a smaller input. " * 8
+
+
+class Profile:
+    """How a benchmark thread opens connections and starts write transactions."""
+
+    def __init__(self, name, pragmas, timeout, begin, persistent):
+        self.name = name
+        self.pragmas = pragmas
+        self.timeout = timeout
+        self.begin = begin
+        self.persistent = persistent
+
+    def connect(self, path):
+        conn = sqlite3.connect(path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+
+# Django's defaults before the tuned profile: rollback journal, Python's
+# 5 second busy timeout, deferred transactions and a new connection per request
+STOCK = Profile("stock", {"journal_mode": "DELETE"}, 5.0, "BEGIN", persistent=False)
+
+
+def tuned_profile():
+    options = settings.DATABASES["default"].get("OPTIONS", {})
+    return Profile(
+        "tuned",
+        settings.SQLITE_PRAGMAS,
+        options.get("timeout", 5.0),
+        f"BEGIN {options.get('transaction_mode', '')}".strip(),
+        persistent=bool(settings.DATABASES["default"].get("CONN_MAX_AGE")),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent chat-style reads and writes on a scratch SQLite "
+        "database with stock settings and with the tuned profile from settings.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help="Reader threads (default 8).")
+        parser.add_argument('--writers', type=int, default=4, help="Writer threads (default 4).")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per profile (default 5).")
+        parser.add_argument('--conversations', type=int, default=200, help="Conversations to seed (default 200).")
+        parser.add_argument('--messages', type=int, default=50, help="Messages seeded per conversation (default 50).")
+
+    def _seed(self, path, profile, conversations, messages):
+        conn = profile.connect(path)
+        conn.executescript(SCHEMA)
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO conversations (id, title, updated_at) VALUES (?, ?, ?)",
+            [(i, f"Chat {i}", now) for i in range(1, conversations + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+            [
+                (i, "assistant" if n % 2 else "user", REPLY, now)
+                for i in range(1, conversations + 1)
+                for n in range(messages)
+            ],
+        )
+        conn.execute("COMMIT")
+        conn.close()
+
+    def _run(self, profile, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.sqlite3")
+            self._seed(path, profile, options['conversations'], options['messages'])
+
+            results = {"read": [], "write": []}
+            errors = {"read": 0, "write": 0}
+            lock = threading.Lock()
+            stop = time.perf_counter() + options['duration']
+
+            def read(conn, conversation_id):
+                conn.execute(
+                    "SELECT id, role, content, created_at FROM messages WHERE conversation_id = ? "
+                    "ORDER BY created_at DESC, id DESC LIMIT 50",
+                    (conversation_id,),
+                ).fetchall()
+
+            def write(conn, conversation_id):
+                # One chat turn: save the message and touch the conversation
+                now = time.strftime("%Y-%m-%d %H:%M:%S")
+                conn.execute(profile.begin)
+                try:
+                    conn.execute(
+                        "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                        (conversation_id, "assistant", REPLY, now),
+                    )
+                    conn.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+            def worker(kind, operation):
+                latencies, failed = [], 0
+                conn = profile.connect(path) if profile.persistent else None
+                while time.perf_counter() < stop:
+                    conversation_id = random.randint(1, options['conversations'])
+                    started = time.perf_counter()
+                    try:
+                        if profile.persistent:
+                            operation(conn, conversation_id)
+                        else:
+                            request_conn = profile.connect(path)
+                            try:
+                                operation(request_conn, conversation_id)
+                            finally:
+                                request_conn.close()
+                    except sqlite3.OperationalError:
+                        failed += 1
+                        continue
+                    latencies.append(time.perf_counter() - started)
+                if conn is not None:
+                    conn.close()
+                with lock:
+                    results[kind].extend(latencies)
+                    errors[kind] += failed
+
+            threads = [
+                threading.Thread(target=worker, args=("read", read)) for _ in range(options['readers'])
+            ] + [
+                threading.Thread(target=worker, args=("write", write)) for _ in range(options['writers'])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        for kind in ("read", "write"):
+            latencies = sorted(results[kind])
+            p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0
+            median = statistics.median(latencies) * 1000 if latencies else 0.0
+            self.stdout.write(
+                f"{profile.name:<6} {kind:<5} {len(latencies) / options['duration']:>10.1f} "
+                f"{median:>9.2f} {p95:>9.2f} {errors[kind]:>7}"
+            )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['readers']} readers, {options['writers']} writers, "
+            f"{options['duration']:g}s per profile\n"
+        )
+        self.stdout.write(f"{'':<6} {'op':<5} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+        for profile in (STOCK, tuned_profile()):
+            self._run(profile, options)
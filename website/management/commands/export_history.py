@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from website import export
+from website.models import User
+
+
+class Command(BaseCommand):
+    help = "Stream chat history (one row per message) as NDJSON or CSV, for one user or everyone."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Email of the user to export (default: all users).")
+        parser.add_argument('--since', help="Only messages on or after this ISO date/datetime.")
+        parser.add_argument('--until', help="Only messages on or before this ISO date/datetime.")
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help="gzip-compress the output.")
+        parser.add_argument('--output', '-o', help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user with email {options['user']}")
+        try:
+            since = export.parse_bound(options['since'])
+            until = export.parse_bound(options['until'], end=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = export.message_rows(user=user, since=since, until=until)
+        chunks = export.stream(rows, options['format'], options['gzip'])
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            written = 0
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+        if options['output']:
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
@@ -0,0 +1,78 @@
+from django.contrib.auth.hashers import get_hashers_by_algorithm
+from django.core.management.base import BaseCommand, CommandError
+
+from website import bulk_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load users, sessions or subjects from CSV or NDJSON (optionally .gz). "
+        "Users need email plus password or password_hash (name, created_at optional); "
+        "sessions need email, title, subject (started_at optional); subjects need slug, title."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['users', 'sessions', 'subjects'])
+        parser.add_argument('path', help="File to import, or - for stdin.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Default: from the file extension.")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows per bulk insert (default 2000).")
+        parser.add_argument(
+            '--on-conflict',
+            choices=bulk_import.ON_CONFLICT,
+            default='skip',
+            help="Existing email/slug: skip the row (default), update it, or stop.",
+        )
+        parser.add_argument(
+            '--passwords',
+            choices=bulk_import.PASSWORD_MODES,
+            default='auto',
+            help="Users: use password_hash as is, hash password, or set no usable password "
+                 "(default auto: per row, whichever column is filled).",
+        )
+        parser.add_argument(
+            '--hasher',
+            default='default',
+            help="Algorithm for hashing plaintext passwords, one of PASSWORD_HASHERS "
+                 "(default: the first). Logins upgrade hashes to the default hasher.",
+        )
+        parser.add_argument('--hash-workers', type=int, help="Threads for hashing (default: CPU count + 4).")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and count without writing.")
+
+    def _progress(self, stats):
+        self.stdout.write(str(stats))
+
+    def handle(self, *args, **options):
+        if options['hasher'] != 'default' and options['hasher'] not in get_hashers_by_algorithm():
+            raise CommandError(f"Unknown hasher {options['hasher']!r}; see PASSWORD_HASHERS.")
+
+        rows = bulk_import.read_rows(options['path'], options['format'])
+        common = {
+            'batch_size': options['batch_size'],
+            'dry_run': options['dry_run'],
+            'progress': self._progress,
+        }
+        try:
+            if options['kind'] == 'users':
+                stats = bulk_import.import_users(
+                    rows,
+                    on_conflict=options['on_conflict'],
+                    password_mode=options['passwords'],
+                    hasher=options['hasher'],
+                    hash_workers=options['hash_workers'],
+                    **common
+                )
+            elif options['kind'] == 'subjects':
+                stats = bulk_import.import_subjects(rows, on_conflict=options['on_conflict'], **common)
+            else:
+                stats = bulk_import.import_sessions(rows, **common)
+        except bulk_import.Conflict as e:
+            raise CommandError(f"{e} (batches before this one were imported; use --on-conflict)")
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in stats.errors:
+            self.stderr.write(error)
+        if stats.invalid > len(stats.errors):
+            self.stderr.write(f"... and {stats.invalid - len(stats.errors)} more invalid row(s)")
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{stats}"))
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from website import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Run simulated student sessions (login, list conversations, open one, "
+        "chat a few turns) against a running server and report throughput, "
+        "latency percentiles and errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server to test (default http://127.0.0.1:8000).")
+        parser.add_argument('--students', type=int, default=10, help="Concurrent students (default 10).")
+        parser.add_argument('--duration', type=float, default=60.0, help="Seconds to run (default 60).")
+        parser.add_argument('--turns', type=int, default=3, help="Chat turns per session (default 3).")
+        parser.add_argument('--think-time', type=float, default=1.0, help="Mean seconds between turns (default 1).")
+        parser.add_argument('--repeat-ratio', type=float, default=0.2, help="Fraction of opening prompts reused verbatim (default 0.2).")
+        parser.add_argument('--stream', action='store_true', help="Chat through /api/chatbot/stream/.")
+        parser.add_argument('--seed', type=int, help="Seed the students' random choices.")
+        parser.add_argument('--output', help="Also write the report as JSON to this file.")
+
+    def handle(self, *args, **options):
+        config = loadtest.LoadConfig(
+            options['url'],
+            students=options['students'],
+            duration=options['duration'],
+            turns=options['turns'],
+            think_time=options['think_time'],
+            repeat_ratio=options['repeat_ratio'],
+            stream=options['stream'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f"{config.students} students for {config.duration:g}s against {config.base_url}\n")
+        result = loadtest.report(loadtest.run(config), config)
+
+        self.stdout.write(
+            f"{'step':<20} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+            f"{'p99 ms':>9} {'errors':>7} {'rejected':>8}"
+        )
+        for step, entry in result['steps'].items():
+            self.stdout.write(
+                f"{step:<20} {entry['requests']:>8} {entry['rps']:>8.2f} {entry['p50_ms']:>9.1f} "
+                f"{entry['p95_ms']:>9.1f} {entry['p99_ms']:>9.1f} {entry['error']:>7} {entry['rejected']:>8}"
+            )
+            for reason, count in entry['reasons'].items():
+                self.stdout.write(f"    {count:>6} x {reason}")
+        self.stdout.write(
+            f"\n{result['sessions']} sessions ({result['sessions_per_second']:.2f}/s), "
+            f"{result['requests']} requests ({result['requests_per_second']:.2f}/s), "
+            f"{result['errors']} errors, {result['rejected']} rejected"
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
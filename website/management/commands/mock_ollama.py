@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from website import mock_ollama
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a stand-in for Ollama's /api/generate with a configurable "
+        "time-to-first-token, token rate and error rates, for load tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=11434, help="Default 11434, Ollama's port.")
+        parser.add_argument('--ttft', type=float, default=0.2, help="Seconds to the first token (default 0.2).")
+        parser.add_argument('--tokens-per-second', type=float, default=30.0, help="Default 30.")
+        parser.add_argument('--tokens', type=int, default=60, help="Tokens per answer (default 60).")
+        parser.add_argument('--jitter', type=float, default=0.2, help="Random +/- fraction on ttft and tokens (default 0.2).")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction answered with HTTP 500.")
+        parser.add_argument('--stream-error-rate', type=float, default=0.0, help="Fraction of streams cut off halfway.")
+        parser.add_argument('--seed', type=int, help="Seed the random choices.")
+        parser.add_argument('--verbose', action='store_true', help="Log every request.")
+
+    def handle(self, *args, **options):
+        config = mock_ollama.MockConfig(
+            ttft=options['ttft'],
+            tokens_per_second=options['tokens_per_second'],
+            tokens=options['tokens'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            stream_error_rate=options['stream_error_rate'],
+            seed=options['seed'],
+        )
+        server = mock_ollama.start(config, options['host'], options['port'], options['verbose'])
+        self.stdout.write(
+            f"Mock Ollama on http://{options['host']}:{server.server_port} "
+            f"(ttft {config.ttft}s, {config.tokens_per_second:g} tokens/s, {config.tokens} tokens). "
+            "Ctrl-C to stop."
+        )
+        try:
+            while True:
+                time.sleep(10)
+                self.stdout.write(str(server.stats.snapshot()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
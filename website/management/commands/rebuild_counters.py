@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from website import api_cache, counters, routers, tasks
+from website.models import DashboardCounter
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard counters from the users and sessions tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only compare stored counters with fresh COUNT(*) results; exit 1 on drift.",
+        )
+
+    def handle(self, *args, **options):
+        with routers.use_primary():
+            self._handle(options)
+
+    def _handle(self, options):
+        if options['check']:
+            # Apply queued adjustments first so they don't read as drift
+            tasks.run_pending()
+            expected = counters.expected()
+            stored = dict(
+                DashboardCounter.objects.exclude(key__startswith='version:').values_list('key', 'value')
+            )
+            drift = {
+                key: (stored.get(key, 0), expected.get(key, 0))
+                for key in sorted(set(stored) | set(expected))
+                if stored.get(key, 0) != expected.get(key, 0)
+            }
+            if not drift:
+                self.stdout.write(self.style.SUCCESS(f"All {len(expected)} counters match."))
+                return
+            for key, (have, want) in drift.items():
+                self.stdout.write(f"{key}: stored {have}, actual {want}")
+            self.stderr.write(self.style.ERROR(f"{len(drift)} counter(s) out of date."))
+            raise SystemExit(1)
+
+        totals = counters.rebuild()
+        api_cache.bump('users')
+        api_cache.bump('sessions')
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(totals)} counters."))
@@ -0,0 +1,54 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from website import tasks
+from website.models import Task
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the write-behind task queue: apply queued chat turns and counter "
+        "updates in batched transactions until stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.TASK_QUEUE_BATCH_SIZE,
+            help="Tasks per transaction (default TASK_QUEUE_BATCH_SIZE)."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.TASK_QUEUE_POLL_INTERVAL,
+            help="Seconds to sleep when the queue is empty (default TASK_QUEUE_POLL_INTERVAL)."
+        )
+        parser.add_argument('--once', action='store_true', help="Drain what is due, then exit.")
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help="Requeue tasks that ran out of attempts before starting."
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            count = Task.objects.filter(failed=True).update(failed=False, attempts=0)
+            self.stdout.write(f"Requeued {count} failed task(s).")
+
+        if options['once']:
+            ran = tasks.run_pending(options['batch_size'])
+            self._summary(ran)
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        self.stdout.write(f"Running tasks in batches of {options['batch_size']}. Ctrl-C to stop.")
+        tasks.work(stop, options['batch_size'], options['poll_interval'])
+        self._summary(tasks.stats()['completed'])
+
+    def _summary(self, ran):
+        stats = tasks.stats()
+        self.stdout.write(
+            f"{ran} task(s) in {stats['batches']} batch(es): {stats['completed']} completed, "
+            f"{stats['retried']} to retry, {stats['failed']} failed."
+        )
@@ -0,0 +1,381 @@
+"""
+Per-request timings and Prometheus metrics.
+
+MetricsMiddleware gives each request a RequestTimings (held in a context
+variable, so sync_to_async threads and async views share it). Queries
+are timed by a database execute wrapper installed on every connection,
+and Flight.follow() adds the LLM work the request waited for: wall time,
+plus the prefill (prompt_eval_duration) and decode (eval_duration) times
+and token counts Ollama reports in its final chunk. The totals go out in
+a ``Server-Timing`` header and into the histograms below.
+
+For streaming responses the header is sent with the first byte, so it
+only covers the work done before the stream started. The histograms wait
+for the body instead: timed_stream() keeps charging the request while the
+body is produced and records it once the stream ends or is closed.
+
+LLMCall, used by the llm module, records every generation once, however
+many requests follow it: time to first token, prefill and decode time,
+and tokens per second.
+
+render() produces the Prometheus text format from in-memory state without
+touching the database, so scraping /metrics is cheap. Each process keeps
+its own numbers; with several workers, scrape each one or aggregate in
+Prometheus.
+"""
+import contextvars
+import threading
+import time
+
+from django.db.backends.signals import connection_created
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 400)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+REQUEST_SECONDS = Histogram(
+    "edutech_http_request_duration_seconds",
+    "Time to build the response, by view.", ("view", "method", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "edutech_http_request_queries", "Database queries per request, by view.", ("view",), QUERY_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram(
+    "edutech_http_request_db_seconds", "Time spent in database queries per request, by view.", ("view",)
+)
+REQUEST_LLM_SECONDS = Histogram(
+    "edutech_http_request_llm_seconds", "Time a request spent waiting on the LLM, by view.", ("view",)
+)
+COMPRESSED_BYTES = Counter(
+    "edutech_http_compressed_response_bytes_total",
+    "Bytes of compressed API responses before compression and as sent.", ("encoding", "stage")
+)
+LLM_SECONDS = Histogram(
+    "edutech_llm_generation_seconds", "Wall time of each Ollama generation.", ("outcome",)
+)
+LLM_TTFT_SECONDS = Histogram(
+    "edutech_llm_time_to_first_token_seconds", "Time from sending a generation to its first token."
+)
+LLM_PREFILL_SECONDS = Histogram(
+    "edutech_llm_prefill_seconds", "Ollama's prompt_eval_duration per generation."
+)
+LLM_DECODE_SECONDS = Histogram(
+    "edutech_llm_decode_seconds", "Ollama's eval_duration per generation."
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "edutech_llm_decode_tokens_per_second", "eval_count / eval_duration per generation.",
+    buckets=TOKENS_PER_SECOND_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "edutech_llm_tokens_total", "Tokens processed by Ollama.", ("kind",)
+)
+
+
+def _seconds(nanoseconds):
+    return (nanoseconds or 0) / 1e9
+
+
+class RequestTimings:
+    __slots__ = ('started', 'db_queries', 'db_seconds', 'llm_seconds', 'llm_prefill_seconds',
+                 'llm_decode_seconds', 'llm_tokens')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.llm_seconds = 0.0
+        self.llm_prefill_seconds = 0.0
+        self.llm_decode_seconds = 0.0
+        self.llm_tokens = 0
+
+    def header(self, total):
+        parts = [
+            f'app;dur={total * 1000:.1f}',
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"',
+        ]
+        if self.llm_seconds:
+            parts.append(f'llm;dur={self.llm_seconds * 1000:.1f}')
+        if self.llm_prefill_seconds or self.llm_decode_seconds:
+            rate = self.llm_tokens / self.llm_decode_seconds if self.llm_decode_seconds else 0.0
+            parts.append(f'llm-prefill;dur={self.llm_prefill_seconds * 1000:.1f}')
+            parts.append(
+                f'llm-decode;dur={self.llm_decode_seconds * 1000:.1f};'
+                f'desc="{self.llm_tokens} tokens, {rate:.1f} tok/s"'
+            )
+        return ", ".join(parts)
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+_END = object()
+
+
+def begin_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def finish_request(view, method, status, timings):
+    """Record a finished request in the histograms; returns its duration."""
+    total = elapsed(timings)
+    REQUEST_SECONDS.observe(total, view=view, method=method, status=status)
+    REQUEST_QUERIES.observe(timings.db_queries, view=view)
+    REQUEST_DB_SECONDS.observe(timings.db_seconds, view=view)
+    if timings.llm_seconds:
+        REQUEST_LLM_SECONDS.observe(timings.llm_seconds, view=view)
+    return total
+
+
+def elapsed(timings):
+    return time.perf_counter() - timings.started
+
+
+def timed_stream(content, timings, done):
+    """
+    Wrap a streaming body so work done while producing it is charged to
+    ``timings``, and ``done()`` is called when it ends or is closed. An
+    async body gets an async wrapper, a sync one a sync wrapper.
+    """
+    if hasattr(content, '__aiter__'):
+        return _atimed(content, timings, done)
+    return _timed(content, timings, done)
+
+
+def _timed(content, timings, done):
+    iterator = iter(content)
+    try:
+        while True:
+            token = _current.set(timings)
+            try:
+                chunk = next(iterator, _END)
+            finally:
+                _current.reset(token)
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        done()
+
+
+async def _atimed(content, timings, done):
+    iterator = aiter(content)
+    try:
+        while True:
+            token = _current.set(timings)
+            try:
+                chunk = await anext(iterator, _END)
+            finally:
+                _current.reset(token)
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        done()
+
+
+def note_llm(waited, final_chunk):
+    """Charge the current request for an LLM answer it followed."""
+    timings = _current.get()
+    if timings is None:
+        return
+    timings.llm_seconds += waited
+    if final_chunk:
+        timings.llm_prefill_seconds += _seconds(final_chunk.get("prompt_eval_duration"))
+        timings.llm_decode_seconds += _seconds(final_chunk.get("eval_duration"))
+        timings.llm_tokens += final_chunk.get("eval_count") or 0
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_queries += 1
+        timings.db_seconds += time.perf_counter() - started
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_install_query_timer, dispatch_uid="website.metrics.query_timer")
+
+
+class LLMCall:
+    """Times one Ollama generation; feed it every chunk, then call finish()."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.final = None
+
+    def observe(self, chunk):
+        if self.first_token is None and chunk.get("response"):
+            self.first_token = time.perf_counter() - self.started
+        if chunk.get("done"):
+            self.final = chunk
+
+    def finish(self):
+        LLM_SECONDS.observe(time.perf_counter() - self.started, outcome="ok" if self.final else "error")
+        if self.first_token is not None:
+            LLM_TTFT_SECONDS.observe(self.first_token)
+        if not self.final:
+            return
+        prefill = _seconds(self.final.get("prompt_eval_duration"))
+        decode = _seconds(self.final.get("eval_duration"))
+        tokens = self.final.get("eval_count") or 0
+        LLM_PREFILL_SECONDS.observe(prefill)
+        LLM_DECODE_SECONDS.observe(decode)
+        if decode:
+            LLM_TOKENS_PER_SECOND.observe(tokens / decode)
+        LLM_TOKENS.inc(self.final.get("prompt_eval_count") or 0, kind="prompt")
+        LLM_TOKENS.inc(tokens, kind="completion")
+
+
+def _series(name, kind, help, samples):
+    """Lines for a metric whose values are read at scrape time."""
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} {kind}"
+    for labels, value in samples:
+        yield f"{name}{_format_labels([label for label, _ in labels], [v for _, v in labels])} {_format_value(value)}"
+
+
+def _component_lines():
+    """Current state of the API cache, LLM scheduler, task queue and password hashing pool."""
+    from . import api_cache, hashing, scheduler, tasks
+
+    stats = api_cache.stats()
+    yield from _series(
+        "edutech_api_cache_requests_total", "counter", "Cached API lookups, by API and result.",
+        [((("api", name), ("result", result)), entry[result]) for name, entry in stats.items() for result in ('hits', 'misses')]
+    )
+
+    stats = scheduler.get_scheduler().stats()
+    yield from _series(
+        "edutech_llm_scheduler_active", "gauge", "Generations holding a scheduler slot.", [((), stats['active'])]
+    )
+    yield from _series(
+        "edutech_llm_scheduler_queue_depth", "gauge", "Requests waiting for a scheduler slot.",
+        [((("priority", priority),), depth) for priority, depth in sorted(stats['queue_depth_by_priority'].items())]
+    )
+    yield from _series(
+        "edutech_llm_scheduler_requests_total", "counter", "Scheduler decisions, by outcome.",
+        [((("outcome", outcome),), stats[outcome]) for outcome in ('admitted', 'rejected', 'timed_out')]
+    )
+
+    stats = tasks.stats()
+    yield from _series(
+        "edutech_task_queue_tasks_total", "counter", "Write-behind tasks handled by this process, by outcome.",
+        [((("outcome", outcome),), stats[outcome]) for outcome in ('enqueued', 'completed', 'retried', 'failed')]
+    )
+    yield from _series(
+        "edutech_task_queue_batches_total", "counter", "Write-behind batches committed by this process.",
+        [((), stats['batches'])]
+    )
+
+    stats = hashing.stats()
+    yield from _series(
+        "edutech_password_hash_in_flight", "gauge", "Password hashes queued or running.", [((), stats['in_flight'])]
+    )
+    yield from _series(
+        "edutech_password_hash_total", "counter", "Password hash jobs, by outcome.",
+        [((("outcome", outcome),), stats[outcome]) for outcome in ('completed', 'failed', 'rejected', 'timed_out')]
+    )
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_component_lines())
+    return "\n".join(lines) + "\n"
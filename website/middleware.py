@@ -0,0 +1,219 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import assets, auth_tokens, compression, metrics, routers
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI.
+
+    Under ASGI the handler chain is async, and a sync-only middleware makes
+    Django adapt everything below it with sync_to_async. The async chat
+    views would then hold a thread for the whole generation. Subclasses
+    implement ``__call__`` for the sync chain and ``__acall__`` for the
+    async one. Django picks the mode from ``get_response``, as it does for
+    its own MiddlewareMixin.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+
+class TokenAuthMiddleware(HybridMiddleware):
+    """
+    Sets ``request.app_user`` to the website User named by an
+    ``Authorization: Bearer <token>`` header, or None when the header is
+    missing, tampered with or expired.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request.app_user = None
+        user_id = self._user_id(request)
+        if user_id is not None:
+            request.app_user = auth_tokens.get_user(user_id)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.app_user = None
+        user_id = self._user_id(request)
+        if user_id is not None:
+            request.app_user = await auth_tokens.aget_user(user_id)
+        return await self.get_response(request)
+
+    def _user_id(self, request):
+        token = auth_tokens.token_from_request(request)
+        return auth_tokens.user_id_for(token) if token else None
+
+
+class ReplicaPinMiddleware(HybridMiddleware):
+    """
+    Keeps a client's reads on the primary database for
+    DATABASE_STICKY_SECONDS after a request of theirs wrote to it, using a
+    short-lived cookie, and every other read of a request on one replica
+    (see routers.py). Does nothing without replicas. Sits above the
+    session and token middleware so their reads are routed the same way.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        state, token = routers.begin_request(settings.DATABASE_STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_request(token)
+        return self._pin(response, state)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        state, token = routers.begin_request(settings.DATABASE_STICKY_COOKIE in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.end_request(token)
+        return self._pin(response, state)
+
+    def _pin(self, response, state):
+        if state['wrote']:
+            response.set_cookie(
+                settings.DATABASE_STICKY_COOKIE,
+                '1',
+                max_age=settings.DATABASE_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Times each request, its database queries and the LLM work it waited
+    for, records them in the /metrics histograms and, with
+    SERVER_TIMING_ENABLED, adds a ``Server-Timing`` header (see metrics.py).
+    Streaming responses are recorded once their body has been sent.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        timings, token = metrics.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._record(request, response, timings)
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        timings, token = metrics.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._record(request, response, timings)
+
+    def _record(self, request, response, timings):
+        match = request.resolver_match
+        # The view, never the raw path, so label values stay bounded
+        view = getattr(match.func, '__name__', 'unknown') if match else 'unmatched'
+        labels = (view, request.method, str(response.status_code), timings)
+
+        if settings.SERVER_TIMING_ENABLED:
+            response['Server-Timing'] = timings.header(metrics.elapsed(timings))
+        if response.streaming:
+            # Async bodies stay async, so ASGI doesn't iterate them in a thread
+            response.streaming_content = metrics.timed_stream(
+                response.streaming_content, timings, lambda: metrics.finish_request(*labels)
+            )
+        else:
+            metrics.finish_request(*labels)
+        return response
+
+
+class StaticAssetMiddleware(HybridMiddleware):
+    """
+    Serves files collected into STATIC_ROOT, precompressed and with
+    long-lived cache headers for content-hashed names (see assets.py).
+    Requests for anything not collected fall through to the rest of the
+    stack, so ``runserver``'s own static handling still works in development.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # Only a local prefix; a CDN STATIC_URL never reaches this server
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # A stat() and an open(); the file is streamed by the handler
+        return self._serve(request) or await self.get_response(request)
+
+    def _serve(self, request):
+        if self.prefix and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            return assets.serve(request, request.path[len(self.prefix):])
+        return None
+
+
+class ApiCompressionMiddleware(HybridMiddleware):
+    """
+    Compresses large buffered /api/ responses with brotli or gzip, at a
+    level that drops when the machine is busy (see compression.py).
+    Streaming responses, sync or async, pass through as they are produced.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._compress(request, await self.get_response(request))
+
+    def _compress(self, request, response):
+        if not compression.should_compress(request, response):
+            return response
+
+        # Even when this client gets it uncompressed, so caches keep variants apart
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        original = response.content
+        compressed = compression.compress(original, encoding)
+        if len(compressed) >= len(original):
+            return response
+        metrics.COMPRESSED_BYTES.inc(len(original), encoding=encoding, stage='original')
+        metrics.COMPRESSED_BYTES.inc(len(compressed), encoding=encoding, stage='sent')
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The bytes differ from what a strong ETag promised (as GZipMiddleware does)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
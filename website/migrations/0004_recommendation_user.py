@@ -4,6 +4,26 @@ import django.db.models.deletion
 from django.db import migrations, models
 
 
+def assign_owner(apps, schema_editor):
+    """
+    Give the recommendations that already exist an owner. (This used to be
+    a default of user 5, which only existed in one developer's database and
+    broke fresh installs and the test database.)
+    """
+    User = apps.get_model("website", "User")
+    Recommendation = apps.get_model("website", "Recommendation")
+
+    owner = (
+        User.objects.filter(email="test@edutech.com").first()
+        or User.objects.order_by("id").first()
+    )
+    orphans = Recommendation.objects.filter(user__isnull=True)
+    if owner is None:
+        orphans.delete()
+    else:
+        orphans.update(user=owner)
+
+
 class Migration(migrations.Migration):
 
     dependencies = [
@@ -15,11 +35,20 @@ class Migration(migrations.Migration):
             model_name="recommendation",
             name="user",
             field=models.ForeignKey(
-                default=5,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="recommendations",
+                to="website.user",
+            ),
+        ),
+        migrations.RunPython(assign_owner, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="recommendation",
+            name="user",
+            field=models.ForeignKey(
                 on_delete=django.db.models.deletion.CASCADE,
                 related_name="recommendations",
                 to="website.user",
             ),
-            preserve_default=False,
         ),
     ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("website", "0005_conversation_message_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedResponse",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("model", models.CharField(max_length=100)),
+                ("prompt", models.TextField()),
+                ("response", models.TextField()),
+                ("hits", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "db_table": "llm_response_cache",
+                "indexes": [
+                    models.Index(fields=["created_at"], name="idx_llmcache_created"),
+                    models.Index(
+                        fields=["last_used_at"], name="idx_llmcache_last_used"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("website", "0006_llm_response_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="llm_context",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="llm_context_model",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+    ]
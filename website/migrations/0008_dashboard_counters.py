@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:25
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def fill_counters(apps, schema_editor):
+    """Seed the counters from the rows that already exist (what counters.rebuild() computed here)."""
+    DashboardCounter = apps.get_model("website", "DashboardCounter")
+    User = apps.get_model("website", "User")
+    Session = apps.get_model("website", "Session")
+
+    totals = {"students": User.objects.count()}
+    per_day = Session.objects.annotate(
+        day=TruncDate("started_at", tzinfo=timezone.get_current_timezone())
+    ).values("day").annotate(total=Count("id")).order_by()
+    for row in per_day:
+        totals[f"sessions:{row['day'].isoformat()}"] = row["total"]
+    DashboardCounter.objects.bulk_create(DashboardCounter(key=key, value=value) for key, value in totals.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("website", "0007_conversation_llm_context"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=100, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "db_table": "dashboard_counters",
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("website", "0010_conversation_archive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Task",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50)),
+                ("payload", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("run_after", models.DateTimeField(default=django.utils.timezone.now)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("failed", models.BooleanField(default=False)),
+                ("last_error", models.TextField(blank=True, default="")),
+            ],
+            options={
+                "db_table": "tasks",
+                "indexes": [
+                    models.Index(fields=["failed", "run_after"], name="idx_task_due")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:11
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The search index as of this migration, copied rather than imported from
+# website.search so this migration keeps doing what it did
+INDEX_SQL = [
+    """
+    CREATE VIEW message_search_source AS
+    SELECT m.id AS id, m.content AS content, 'u' || c.user_id AS owner
+    FROM messages m JOIN conversations c ON c.id = m.conversation_id
+    """,
+    """
+    CREATE VIRTUAL TABLE message_search USING fts5(
+        content, owner,
+        content='message_search_source', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER message_search_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO message_search (rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations WHERE id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER message_search_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO message_search (message_search, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversations WHERE id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER message_search_update AFTER UPDATE OF content, conversation_id ON messages BEGIN
+        INSERT INTO message_search (message_search, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversations WHERE id = old.conversation_id;
+        INSERT INTO message_search (rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations WHERE id = new.conversation_id;
+    END
+    """,
+    # Index the messages that already exist
+    "INSERT INTO message_search (message_search) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS message_search_update",
+    "DROP TRIGGER IF EXISTS message_search_delete",
+    "DROP TRIGGER IF EXISTS message_search_insert",
+    "DROP TABLE IF EXISTS message_search",
+    "DROP VIEW IF EXISTS message_search_source",
+]
+
+INDEX_ARCHIVED_SQL = "INSERT INTO message_search (rowid, content, owner) VALUES (%s, %s, %s)"
+
+
+def decode(data, zdict):
+    """An archive blob's ``[id, role, content, created_at]`` rows, as archive.py wrote them here."""
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return json.loads(decompressor.decompress(bytes(data)) + decompressor.flush())
+
+
+def rebuild_index(schema_editor):
+    for statement in DROP_SQL + INDEX_SQL:
+        schema_editor.execute(statement)
+
+
+def map_archived_messages(apps, schema_editor):
+    ConversationArchive = apps.get_model("website", "ConversationArchive")
+    ArchivedMessage = apps.get_model("website", "ArchivedMessage")
+    entries = []
+    for entry in ConversationArchive.objects.select_related("dictionary", "conversation"):
+        rows = decode(entry.data, bytes(entry.dictionary.data) if entry.dictionary else None)
+        ArchivedMessage.objects.bulk_create(ArchivedMessage(id=row[0], archive=entry) for row in rows)
+        owner = f"u{entry.conversation.user_id}"
+        entries.extend((pk, content, owner) for pk, _, content, _ in rows)
+
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    # 'rebuild' only sees live rows; the archived ones are added back after it
+    rebuild_index(schema_editor)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(INDEX_ARCHIVED_SQL, entries)
+
+
+def unindex_archived_messages(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        rebuild_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("website", "0011_task_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedMessage",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "archive",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="messages",
+                        to="website.conversationarchive",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "archived_messages",
+            },
+        ),
+        migrations.RunPython(map_archived_messages, unindex_archived_messages),
+    ]
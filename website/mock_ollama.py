@@ -0,0 +1,212 @@
+"""
+Stand-in for Ollama's /api/generate, for load tests and CI.
+
+It answers like Ollama does, streamed (NDJSON) or not, but waits
+``ttft`` seconds before the first token and then produces
+``tokens_per_second``, instead of running a model. ``error_rate`` of the
+requests fail with HTTP 500 before anything is sent, and
+``stream_error_rate`` of the streamed ones break off halfway with an
+``{"error": ...}`` chunk, which is how Ollama reports a failed generation.
+The last few request bodies are kept in ``server.stats.received`` so
+tests can check what the app sent.
+
+    server = mock_ollama.start(MockConfig(ttft=0.3, tokens_per_second=40))
+    # point OLLAMA_URL at f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+``manage.py mock_ollama`` runs it in the foreground.
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "a function that calls itself on a smaller input until it reaches a base "
+    "case which it can answer directly and then combines the partial results "
+    "on the way back up the call stack so every step stays simple"
+).split()
+
+
+class MockConfig:
+    """How the mock model behaves. Times are in seconds."""
+
+    def __init__(self, ttft=0.2, tokens_per_second=30.0, tokens=60, jitter=0.2,
+                 error_rate=0.0, stream_error_rate=0.0, seed=None):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stream_error_rate = stream_error_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def roll(self, rate):
+        with self._lock:
+            return self.random.random() < rate
+
+    def vary(self, value):
+        """``value`` give or take ``jitter`` (a fraction of it)."""
+        with self._lock:
+            return value * (1 + self.random.uniform(-self.jitter, self.jitter))
+
+
+class MockOllamaStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.errors = 0
+        # Newest last; bounded so a long load test doesn't grow without end
+        self.received = deque(maxlen=100)
+
+    def start(self, body):
+        with self._lock:
+            self.received.append(body)
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finish(self, failed=False):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += int(failed)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'errors': self.errors,
+            }
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Set on the server by start()
+    @property
+    def config(self):
+        return self.server.config
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, content_type="application/json"):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        data = (json.dumps(payload) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        # Health checks, as answered by a real Ollama
+        if self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-mock"})
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "mock"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        stats = self.server.stats
+        stats.start(body)
+        failed = True
+        try:
+            if self.config.roll(self.config.error_rate):
+                self._send_json(500, {"error": "mock: injected failure"})
+                return
+            failed = self._generate(body)
+        finally:
+            stats.finish(failed)
+
+    def _generate(self, body):
+        """Answer one /api/generate request; returns True if it failed."""
+        config = self.config
+        started = time.perf_counter()
+        tokens = max(1, round(config.vary(config.tokens)))
+        num_predict = (body.get("options") or {}).get("num_predict")
+        if num_predict and num_predict > 0:
+            tokens = min(tokens, num_predict)
+        delay = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+        words = [WORDS[n % len(WORDS)] + " " for n in range(tokens)]
+        context = list(body.get("context") or []) + list(range(len(words)))
+        prompt_tokens = len(body.get("prompt", "")) // 4
+
+        time.sleep(max(0.0, config.vary(config.ttft)))
+
+        if not body.get("stream", True):
+            time.sleep(delay * tokens)
+            self._send_json(200, self._final(body, "".join(words), context, prompt_tokens, tokens, started))
+            return False
+
+        break_at = tokens // 2 if config.roll(config.stream_error_rate) else None
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for n, word in enumerate(words):
+                if n == break_at:
+                    self._write_chunk({"error": "mock: generation interrupted"})
+                    break
+                if n:
+                    time.sleep(delay)
+                self._write_chunk({"model": body.get("model"), "response": word, "done": False})
+            else:
+                self._write_chunk(self._final(body, "", context, prompt_tokens, tokens, started))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away mid-stream
+            return True
+        return break_at is not None
+
+    def _final(self, body, response, context, prompt_tokens, tokens, started):
+        total = int((time.perf_counter() - started) * 1e9)
+        eval_duration = int(tokens / self.config.tokens_per_second * 1e9) if self.config.tokens_per_second > 0 else 0
+        return {
+            "model": body.get("model"),
+            "response": response,
+            "done": True,
+            "context": context,
+            "total_duration": total,
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": max(0, total - eval_duration),
+            "eval_count": tokens,
+            "eval_duration": eval_duration,
+        }
+
+
+def start(config=None, host="127.0.0.1", port=0, verbose=False):
+    """Serve in a background thread; port 0 picks a free port (see server_port)."""
+    server = ThreadingHTTPServer((host, port), MockOllamaHandler)
+    server.daemon_threads = True
+    server.config = config or MockConfig()
+    server.stats = MockOllamaStats()
+    server.verbose = verbose
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -63,6 +63,11 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Ollama's context token array after the last reply (see llm_context.py)
+    llm_context = models.BinaryField(null=True, blank=True, editable=False)
+    llm_context_model = models.CharField(max_length=100, blank=True, default='')
+    # Messages moved into a ConversationArchive blob (see archive.py)
+    is_archived = models.BooleanField(default=False)
 
     class Meta:
         db_table = 'conversations'
@@ -97,3 +102,97 @@ class Message(models.Model):
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
+
+
+class CachedResponse(models.Model):
+    """Persistent tier of the LLM response cache (see website/llm_cache.py)"""
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    prompt = models.TextField()
+    response = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'llm_response_cache'
+        indexes = [
+            models.Index(fields=['created_at'], name='idx_llmcache_created'),
+            models.Index(fields=['last_used_at'], name='idx_llmcache_last_used'),
+        ]
+
+    def __str__(self):
+        return f"{self.model}: {self.prompt[:50]}..."
+
+
+class DashboardCounter(models.Model):
+    """Running totals for the dashboard, kept current by signals (see counters.py)"""
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'dashboard_counters'
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class ArchiveDictionary(models.Model):
+    """Shared zlib dictionary for compressing archived conversations"""
+    data = models.BinaryField()
+    sample_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'archive_dictionaries'
+
+    def __str__(self):
+        return f"Dictionary {self.id} ({len(self.data)} bytes)"
+
+
+class ConversationArchive(models.Model):
+    """All messages of an idle conversation, compressed into one blob"""
+    conversation = models.OneToOneField(Conversation, on_delete=models.CASCADE, related_name='archive')
+    dictionary = models.ForeignKey(ArchiveDictionary, on_delete=models.PROTECT, null=True, blank=True)
+    data = models.BinaryField()
+    message_count = models.PositiveIntegerField()
+    raw_bytes = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'conversation_archives'
+
+    def __str__(self):
+        return f"{self.conversation_id}: {self.message_count} messages, {len(self.data)} bytes"
+
+
+class ArchivedMessage(models.Model):
+    """Archive holding a message id, so search can place archived matches (see archive.py)"""
+    id = models.BigIntegerField(primary_key=True)
+    archive = models.ForeignKey(ConversationArchive, on_delete=models.CASCADE, related_name='messages')
+
+    class Meta:
+        db_table = 'archived_messages'
+
+    def __str__(self):
+        return f"Message {self.id} in archive {self.archive_id}"
+
+
+class Task(models.Model):
+    """Deferred write for the write-behind queue, run by the task worker (see tasks.py)"""
+    name = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        db_table = 'tasks'
+        indexes = [
+            models.Index(fields=['failed', 'run_after'], name='idx_task_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.attempts} attempts)"
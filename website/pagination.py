@@ -0,0 +1,120 @@
+"""
+Keyset (cursor) pagination for the list APIs.
+
+Pages are cut on ``(<timestamp field>, id)`` so every page is an index
+seek on the existing (conversation, created_at) / (user, -updated_at)
+indexes instead of an OFFSET scan. Cursors are opaque strings naming a
+row: ``before=<cursor>`` returns rows older than it and ``after=<cursor>``
+rows newer than it. With neither, the newest page is returned.
+"""
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import serialization
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_limit(value):
+    if value in (None, ""):
+        return settings.API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, settings.API_MAX_PAGE_SIZE)
+
+
+def paginate(queryset, params, field, newest_first, columns=None):
+    """
+    Cut one page from ``queryset`` using the ``limit``/``before``/``after``
+    query parameters in ``params``.
+
+    With ``columns`` (see serialization.rows) the rows are plain dicts
+    instead of model instances; they must include ``field`` and ``id``.
+
+    Rows come back in display order: newest first if ``newest_first``,
+    otherwise oldest first. Returns ``(rows, page)`` where ``page`` holds
+    ``has_more`` (more rows beyond this page in the direction requested)
+    and the ``before``/``after`` cursors for the neighbouring pages.
+    """
+    limit = parse_limit(params.get("limit"))
+    before = decode_cursor(params.get("before"))
+    after = decode_cursor(params.get("after"))
+
+    if after:
+        timestamp, pk = after
+        queryset = queryset.filter(
+            Q(**{f"{field}__gt": timestamp}) | Q(**{field: timestamp, "id__gt": pk})
+        ).order_by(field, "id")
+    else:
+        if before:
+            timestamp, pk = before
+            queryset = queryset.filter(
+                Q(**{f"{field}__lt": timestamp}) | Q(**{field: timestamp, "id__lt": pk})
+            )
+        queryset = queryset.order_by(f"-{field}", "-id")
+
+    if columns:
+        rows = serialization.rows(queryset[:limit + 1], columns)
+    else:
+        rows = list(queryset[:limit + 1])
+    return _page(rows, limit, after, field, newest_first, columns)
+
+
+def paginate_list(rows, params, field, newest_first):
+    """
+    paginate() over ``rows``, an in-memory list of dicts sorted oldest
+    first by ``(field, id)``, with the same parameters and cursors.
+    """
+    limit = parse_limit(params.get("limit"))
+    before = decode_cursor(params.get("before"))
+    after = decode_cursor(params.get("after"))
+
+    if after:
+        rows = [row for row in rows if (row[field], row["id"]) > after][:limit + 1]
+    else:
+        if before:
+            rows = [row for row in rows if (row[field], row["id"]) < before]
+        rows = rows[-(limit + 1):][::-1]
+    return _page(rows, limit, after, field, newest_first, True)
+
+
+def _page(rows, limit, after, field, newest_first, as_dicts):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Rows were fetched walking away from the cursor; flip into display order
+    fetched_newest_first = not after
+    if fetched_newest_first != newest_first:
+        rows.reverse()
+
+    page = {"has_more": has_more, "before": None, "after": None}
+    if rows:
+        oldest, newest = (rows[-1], rows[0]) if newest_first else (rows[0], rows[-1])
+        if as_dicts:
+            page["before"] = encode_cursor(oldest[field], oldest["id"])
+            page["after"] = encode_cursor(newest[field], newest["id"])
+        else:
+            page["before"] = encode_cursor(getattr(oldest, field), oldest.id)
+            page["after"] = encode_cursor(getattr(newest, field), newest.id)
+    return rows, page
@@ -0,0 +1,88 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the "default" (primary) database. Reads go to one of
+settings.DATABASE_REPLICAS, except when they must see the latest data.
+Within a request every read uses the same replica, picked at random when
+the request first reads, so one response never mixes data from replicas
+at different lag. Reads must see the latest data in these cases:
+
+- inside a transaction on the primary;
+- inside ``use_primary()``, e.g. when filling the API cache, so that a
+  lagging replica can't be cached under a newer version;
+- for the rest of a request that wrote, and for DATABASE_STICKY_SECONDS
+  after it through a cookie set by ReplicaPinMiddleware, so a client always
+  reads its own writes.
+
+With no replicas configured every query goes to "default".
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Per-request {'pinned': bool, 'wrote': bool, 'replica': alias or None};
+# mutated in place so writes made in sync_to_async threads are seen by the
+# middleware
+_request_state = contextvars.ContextVar('db_request_state', default=None)
+_use_primary = contextvars.ContextVar('db_use_primary', default=False)
+
+
+def begin_request(pinned):
+    state = {'pinned': pinned, 'wrote': False, 'replica': None}
+    return state, _request_state.set(state)
+
+
+def end_request(token):
+    _request_state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Send every read in this block to the primary."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def _primary_only():
+    if _use_primary.get():
+        return True
+    state = _request_state.get()
+    if state is not None and (state['pinned'] or state['wrote']):
+        return True
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or _primary_only():
+            return DEFAULT_DB_ALIAS
+        state = _request_state.get()
+        if state is None:
+            return random.choice(settings.DATABASE_REPLICAS)
+        if state['replica'] is None:
+            state['replica'] = random.choice(settings.DATABASE_REPLICAS)
+        return state['replica']
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and get its schema that way
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,217 @@
+"""
+Bounded-concurrency scheduler for calls to the LLM backend.
+
+At most LLM_MAX_CONCURRENT generations run at once. Further requests wait
+in a priority queue of at most LLM_MAX_QUEUE entries; each waits until its
+own deadline (LLM_QUEUE_TIMEOUT seconds after it was queued). When the
+queue is full new requests are rejected straight away with QueueFull so
+the view can answer 429 + Retry-After instead of piling more work on
+Ollama.
+
+Sync views wait on a threading.Event and async views on a Future, but
+both share the same queue, so one process has one limit.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+
+PRIORITY_NAMES = {HIGH: 'high', NORMAL: 'normal', LOW: 'low'}
+
+
+class SchedulerBusy(Exception):
+    status = 503
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(SchedulerBusy):
+    status = 429
+
+
+class QueueTimeout(SchedulerBusy):
+    status = 503
+
+
+class _Waiter:
+    def __init__(self, priority, loop=None):
+        self.priority = priority
+        self.queued_at = time.monotonic()
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class Scheduler:
+    def __init__(self, max_concurrent, max_queue, queue_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._waits = deque(maxlen=1000)
+        self._service_times = deque(maxlen=100)
+
+    def _retry_after(self):
+        """Rough seconds until a queued request would get a slot."""
+        if self._service_times:
+            service = sum(self._service_times) / len(self._service_times)
+        else:
+            service = 1.0
+        rounds = (len(self._queue) + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(service * rounds))
+
+    def _enqueue(self, priority, loop=None):
+        """Take a free slot (returns None) or queue a waiter."""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queue:
+                self._active += 1
+                self._admitted += 1
+                self._waits.append(0.0)
+                return None
+            if len(self._queue) >= self.max_queue:
+                self._rejected += 1
+                raise QueueFull("The AI tutor is busy, please try again shortly",
+                                self._retry_after())
+            waiter = _Waiter(priority, loop)
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            return waiter
+
+    def _granted(self, waiter):
+        self._waits.append(time.monotonic() - waiter.queued_at)
+
+    def _remove(self, waiter):
+        """Take a waiter out of the queue; returns False if it already got a slot."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+            heapq.heapify(self._queue)
+            return True
+
+    def _give_up(self, waiter):
+        """Deadline passed: leave the queue unless the slot arrived meanwhile."""
+        if self._remove(waiter):
+            with self._lock:
+                self._timed_out += 1
+                retry_after = self._retry_after()
+            raise QueueTimeout("Timed out waiting for the AI tutor", retry_after)
+
+    def acquire(self, priority=NORMAL):
+        """Block until a slot is free. Pair every acquire with release()."""
+        waiter = self._enqueue(priority)
+        if waiter is None:
+            return
+        if not waiter.event.wait(self.queue_timeout):
+            self._give_up(waiter)
+        self._granted(waiter)
+
+    async def aacquire(self, priority=NORMAL):
+        waiter = self._enqueue(priority, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._give_up(waiter)
+        except asyncio.CancelledError:
+            # Client went away while queued; don't leak a slot we never use
+            if not self._remove(waiter):
+                self.release()
+            raise
+        self._granted(waiter)
+
+    def release(self, service_time=None):
+        """Free a slot, handing it straight to the next waiter if any."""
+        with self._lock:
+            if service_time is not None:
+                self._service_times.append(service_time)
+            if self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                waiter.granted = True
+                self._admitted += 1
+                waiter.wake()
+            else:
+                self._active -= 1
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, _ in self._queue:
+                queued[PRIORITY_NAMES[priority]] += 1
+            return {
+                'active': self._active,
+                'max_concurrent': self.max_concurrent,
+                'queue_depth': len(self._queue),
+                'queue_depth_by_priority': queued,
+                'max_queue': self.max_queue,
+                'admitted': self._admitted,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+                'wait_ms': {
+                    'p50': _percentile_ms(waits, 0.50),
+                    'p95': _percentile_ms(waits, 0.95),
+                    'max': _percentile_ms(waits, 1.0),
+                },
+            }
+
+
+def _percentile_ms(values, q):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(q * len(values)))
+    return round(values[index] * 1000, 1)
+
+
+def priority_for(user_message):
+    """Short prompts are cheap to answer, so they jump ahead of long ones."""
+    if len(user_message) <= settings.LLM_SHORT_PROMPT_CHARS:
+        return HIGH
+    return NORMAL
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler(
+                    settings.LLM_MAX_CONCURRENT,
+                    settings.LLM_MAX_QUEUE,
+                    settings.LLM_QUEUE_TIMEOUT
+                )
+    return _scheduler
@@ -0,0 +1,154 @@
+"""
+Full-text search over chat messages (SQLite FTS5).
+
+``message_search`` is an FTS5 index over the ``messages`` table, kept in
+sync by triggers, so bulk inserts and deletes outside the ORM are
+indexed too. Its content is read through the ``message_search_source``
+view, which adds an ``owner`` column holding the token ``u<user id>``.
+Every query is scoped as ``content : (...) AND owner : "u<id>"``. FTS5
+then only intersects the search terms with that student's posting list
+and ranks those rows, however many messages other users have.
+
+Results are ordered by bm25 on the content column. Snippets are HTML-escaped, with the matched
+terms wrapped in <mark>.
+
+The index, its view and triggers are created by migration 0009. The
+triggers look the owner up through the message's conversation, so
+a conversation's messages must be deleted before the conversation row
+(Django's cascade already does this). Migrations that make SQLite rebuild
+the ``conversations`` or ``messages`` table (most AlterField/AddField
+operations) must drop the index first and create it again afterwards,
+with their own copy of the SQL, as 0010 does; otherwise SQLite rejects
+the rename.
+
+Archived conversations (see archive.py) keep their index entries even
+though their rows have left ``messages``. Matches are placed through
+``archived_messages`` and decoded from the archive for their snippet.
+FTS5's 'rebuild' only sees live rows, so a migration rebuilding the
+index must add the archived entries again afterwards, as 0012 does.
+"""
+import html
+import re
+
+from django.db import connection
+
+from .models import Message
+
+# Archived matches have no row in messages (and snippet() would fail on
+# them); their role, date and snippet are filled in from the archive
+SEARCH_SQL = """
+    SELECT message_search.rowid AS id,
+           COALESCE(m.conversation_id, ca.conversation_id) AS conversation_id,
+           m.role, m.created_at,
+           c.title AS conversation_title,
+           CASE WHEN m.id IS NOT NULL
+                THEN snippet(message_search, 0, char(2), char(3), '…', 16) END AS snippet,
+           bm25(message_search, 1.0, 0.0) AS score
+    FROM message_search
+    LEFT JOIN messages m ON m.id = message_search.rowid
+    LEFT JOIN archived_messages am ON m.id IS NULL AND am.id = message_search.rowid
+    LEFT JOIN conversation_archives ca ON ca.id = am.archive_id
+    JOIN conversations c ON c.id = COALESCE(m.conversation_id, ca.conversation_id)
+    WHERE message_search MATCH %s AND c.is_active
+    ORDER BY score, message_search.rowid
+    LIMIT %s OFFSET %s
+"""
+
+INDEX_ARCHIVED_SQL = "INSERT INTO message_search (rowid, content, owner) VALUES (%s, %s, %s)"
+
+# External-content FTS5 entries are removed by replaying their original values
+UNINDEX_ARCHIVED_SQL = (
+    "INSERT INTO message_search (message_search, rowid, content, owner) VALUES ('delete', %s, %s, %s)"
+)
+
+SNIPPET_WORDS = 16
+
+# Cap on how many matches can be paged through with offset
+MAX_OFFSET = 1000
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def _entries(user_id, messages):
+    return [(pk, content, f'u{user_id}') for pk, content in messages]
+
+
+def index_archived(user_id, messages):
+    """Index ``(id, content)`` pairs of messages whose rows were just archived."""
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.executemany(INDEX_ARCHIVED_SQL, _entries(user_id, messages))
+
+
+def unindex_archived(user_id, messages):
+    """Drop the entries index_archived() added, before the rows are restored."""
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.executemany(UNINDEX_ARCHIVED_SQL, _entries(user_id, messages))
+
+
+def match_expression(query, user_id):
+    """
+    FTS5 query for ``query`` limited to ``user_id``'s messages, or None if
+    the query has no searchable words. Words are quoted so FTS5 operators
+    typed by the user are searched literally; a trailing ``*`` on a word
+    matches it as a prefix.
+    """
+    terms = []
+    for word, star in re.findall(r'(\w+)(\*?)', query):
+        terms.append(f'"{word}"' + ('*' if star else ''))
+    if not terms:
+        return None
+    return f'content : ({" ".join(terms)}) AND owner : "u{user_id}"'
+
+
+def highlight(snippet):
+    return html.escape(snippet).replace('\x02', '<mark>').replace('\x03', '</mark>')
+
+
+def archived_snippet(content, query):
+    """
+    An approximation of FTS5's snippet() for a message decoded from an
+    archive: SNIPPET_WORDS words from the first one starting with a query
+    word, with the matching words marked.
+    """
+    prefixes = tuple(word.casefold() for word in re.findall(r'\w+', query))
+    words = list(re.finditer(r'\w+', content))
+    if not words:
+        return html.escape(content)
+    matches = [i for i, word in enumerate(words) if word.group().casefold().startswith(prefixes)]
+    start = max(0, min(matches[0] - SNIPPET_WORDS // 4, len(words) - SNIPPET_WORDS)) if matches else 0
+    end = min(len(words), start + SNIPPET_WORDS)
+
+    parts = ['…'] if start else []
+    position = words[start].start()
+    for word in words[start:end]:
+        parts.append(content[position:word.start()])
+        parts.append('\x02' + word.group() + '\x03' if word.group().casefold().startswith(prefixes) else word.group())
+        position = word.end()
+    parts.append('…' if end < len(words) else content[position:])
+    return highlight(''.join(parts))
+
+
+def search(user, query, limit, offset=0):
+    """
+    One page of ``user``'s messages matching ``query``, best match first.
+    Returns ``(messages, has_more)``; each message has ``snippet``,
+    ``score`` and ``conversation_title`` attributes.
+    """
+    expression = match_expression(query, user.id)
+    if expression is None:
+        return [], False
+    from . import archive
+
+    rows = list(Message.objects.raw(SEARCH_SQL, [expression, limit + 1, offset]))
+    archived = archive.messages_by_id({row.conversation_id for row in rows if row.snippet is None})
+    for row in rows:
+        if row.snippet is None:
+            row.role, content, row.created_at = archived.get(row.id, ('', '', None))
+            row.snippet = archived_snippet(content, query)
+        else:
+            row.snippet = highlight(row.snippet)
+    return rows[:limit], len(rows) > limit
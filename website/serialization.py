@@ -0,0 +1,74 @@
+"""
+Lean JSON serialization for the list APIs.
+
+The list views used to load full model instances, copy their fields into
+dicts one row at a time (calling ``.isoformat()`` on each timestamp) and
+then encode the result with JsonResponse's stdlib encoder. For a page of
+messages, most of the time went into building model objects nobody kept.
+
+rows() fetches only the columns a payload needs with ``values_list``, so
+no model is ever instantiated and related columns (``user__name``) come
+from the same query's join. The tuples are zipped straight into the
+payload's dicts. Timestamps stay datetimes until encoding.
+
+dumps() uses orjson when it is installed and otherwise falls back to the
+stdlib encoder with the same output: compact, UTF-8, and timestamps the
+way JsonResponse's DjangoJSONEncoder writes them (milliseconds, ``Z`` for
+UTC). orjson's own datetime format keeps microseconds, so datetimes are
+passed through to the same encoder. success() wraps a list in the shared
+envelope, ``{"success": true, "data": [...], ...}``.
+
+``manage.py bench_serialization`` compares the old and new paths in
+rows per second.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+BACKEND = 'orjson' if orjson else 'json'
+
+
+_default = DjangoJSONEncoder().default
+
+
+def _stdlib_dumps(data):
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dumps(data):
+    """Encode ``data`` as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return _stdlib_dumps(data)
+
+
+def rows(queryset, columns):
+    """
+    ``queryset`` as a list of dicts, one per row, without instantiating
+    models. ``columns`` maps each payload key to the field (or ``__``
+    lookup) it is read from; a plain sequence of field names keeps them
+    as keys.
+    """
+    if not isinstance(columns, dict):
+        columns = {name: name for name in columns}
+    keys = tuple(columns)
+    return [dict(zip(keys, row)) for row in queryset.values_list(*columns.values())]
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse encoded with dumps()."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def success(data, **fields):
+    """The list APIs' envelope: ``{"success": true, "data": data, **fields}``."""
+    return FastJsonResponse({'success': True, 'data': data, **fields})
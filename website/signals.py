@@ -0,0 +1,91 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import api_cache, auth_tokens, counters
+from .models import Conversation, Message, Recommendation, Session, User
+
+
+@receiver(post_save, sender=User)
+def count_new_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add_later(counters.STUDENTS, 1)
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    counters.add_later(counters.STUDENTS, -1)
+
+
+@receiver([post_save, post_delete], sender=User)
+def bump_users_version(sender, **kwargs):
+    counters.bump('users')
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    auth_tokens.forget_user(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Session)
+def bump_sessions_version(sender, **kwargs):
+    counters.bump('sessions')
+
+
+@receiver([post_save, post_delete], sender=Recommendation)
+def bump_recommendations_version(sender, **kwargs):
+    counters.bump('recommendations')
+
+
+@receiver(pre_save, sender=Session)
+def remember_session_day(sender, instance, raw=False, **kwargs):
+    # Needed to move the session between days if started_at changes
+    instance._counted_day = None
+    if instance.pk and not raw:
+        old = Session.objects.using(kwargs.get('using')).filter(pk=instance.pk).values_list('started_at', flat=True).first()
+        if old is not None:
+            instance._counted_day = counters.session_day(old)
+
+
+@receiver(post_save, sender=Session)
+def count_session(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    day = counters.session_day(instance.started_at)
+    old_day = getattr(instance, '_counted_day', None)
+    if created:
+        counters.add_later(counters.sessions_key(day), 1)
+    elif old_day is not None and old_day != day:
+        counters.add_later(counters.sessions_key(old_day), -1)
+        counters.add_later(counters.sessions_key(day), 1)
+
+
+@receiver(post_delete, sender=Session)
+def uncount_session(sender, instance, **kwargs):
+    counters.add_later(counters.sessions_key(counters.session_day(instance.started_at)), -1)
+
+
+# Versioned API cache namespaces (see api_cache.py)
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_users(sender, **kwargs):
+    api_cache.bump('users')
+
+
+@receiver([post_save, post_delete], sender=Session)
+def invalidate_sessions(sender, **kwargs):
+    api_cache.bump('sessions')
+
+
+@receiver([post_save, post_delete], sender=Recommendation)
+def invalidate_recommendations(sender, **kwargs):
+    api_cache.bump('recommendations')
+
+
+@receiver([post_save, post_delete], sender=Conversation)
+def invalidate_conversation(sender, instance, **kwargs):
+    api_cache.bump(f'conversations:{instance.user_id}')
+
+
+@receiver([post_save, post_delete], sender=Message)
+def invalidate_messages(sender, instance, **kwargs):
+    api_cache.bump(f'messages:{instance.conversation_id}')
@@ -0,0 +1,218 @@
+"""
+Single-flight coalescing of identical chat generations.
+
+While a generation for a prompt key (see llm_cache.make_key) is running,
+every other request for the same key attaches to it instead of starting
+its own. The generation is driven by a background thread (or asyncio task
+for the async views) that publishes Ollama's chunks to a Flight; each
+request follows the Flight from the first chunk, so late joiners get the
+full answer and streaming requests see the same stream. A request that
+disconnects early only stops following, it never cancels the others.
+
+Callers still save their own Message rows. Only the leader (the request
+that started the flight) takes a scheduler slot, and only it stores the
+answer in the response cache.
+"""
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+
+from . import llm, llm_cache, metrics, scheduler
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+_async_flights = {}
+
+
+def _final_chunk(chunks):
+    return chunks[-1] if chunks and chunks[-1].get("done") else None
+
+
+class Flight:
+    """One in-progress generation that any number of requests can follow."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def follow(self):
+        """Yield every chunk from the start, blocking until more arrive."""
+        started = time.monotonic()
+        position = 0
+        while True:
+            with self._cond:
+                while position >= len(self.chunks) and not self.done:
+                    if not self._cond.wait(settings.OLLAMA_TIMEOUT):
+                        raise TimeoutError("Timed out waiting for the model")
+                pending = self.chunks[position:]
+                done, error = self.done, self.error
+            yield from pending
+            position += len(pending)
+            if done:
+                metrics.note_llm(time.monotonic() - started, _final_chunk(self.chunks))
+                if error is not None:
+                    raise error
+                return
+
+
+class AsyncFlight:
+    """asyncio counterpart of Flight, driven by a task on the running loop."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.loop = asyncio.get_running_loop()
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error=None):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def follow(self):
+        started = time.monotonic()
+        position = 0
+        while True:
+            changed = self._changed
+            pending = self.chunks[position:]
+            done, error = self.done, self.error
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if done:
+                metrics.note_llm(time.monotonic() - started, _final_chunk(self.chunks))
+                if error is not None:
+                    raise error
+                return
+            if position >= len(self.chunks) and not self.done:
+                try:
+                    await asyncio.wait_for(changed.wait(), settings.OLLAMA_TIMEOUT)
+                except asyncio.TimeoutError:
+                    raise TimeoutError("Timed out waiting for the model")
+
+
+def _run(key, flight, user_message, context, history):
+    started = time.monotonic()
+    try:
+        for chunk in llm.stream_generate(user_message, context, history):
+            flight.publish(chunk)
+        flight.finish()
+    except Exception as e:
+        flight.finish(e)
+    finally:
+        scheduler.get_scheduler().release(time.monotonic() - started)
+        with _flights_lock:
+            if _flights.get(key) is flight:
+                del _flights[key]
+
+
+async def _arun(key, flight, user_message, context, history):
+    started = time.monotonic()
+    try:
+        async for chunk in llm.astream_generate(user_message, context, history):
+            flight.publish(chunk)
+        flight.finish()
+    except Exception as e:
+        flight.finish(e)
+    finally:
+        scheduler.get_scheduler().release(time.monotonic() - started)
+        if _async_flights.get(key) is flight:
+            del _async_flights[key]
+
+
+def _flight_key(user_message, context, history):
+    # Follow-up turns depend on their conversation, so they are never shared
+    if context or history:
+        return None
+    return llm_cache.make_key(user_message)
+
+
+def join(user_message, priority=scheduler.NORMAL, context=None, history=None):
+    """Attach to the flight for this prompt, starting one if needed.
+
+    Returns ``(flight, leader)`` where ``leader`` is True for the request
+    that started the generation. A leader first waits for a scheduler
+    slot and raises scheduler.SchedulerBusy if it can't get one; requests
+    that attached meanwhile get the same error from follow().
+    """
+    key = _flight_key(user_message, context, history)
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = Flight()
+        if key is not None:
+            _flights[key] = flight
+
+    try:
+        scheduler.get_scheduler().acquire(priority)
+    except scheduler.SchedulerBusy as e:
+        flight.finish(e)
+        with _flights_lock:
+            _flights.pop(key, None)
+        raise
+
+    threading.Thread(
+        target=_run,
+        args=(key, flight, user_message, context, history),
+        name="llm-flight",
+        daemon=True
+    ).start()
+    return flight, True
+
+
+async def ajoin(user_message, priority=scheduler.NORMAL, context=None, history=None):
+    """Async version of join()."""
+    key = _flight_key(user_message, context, history)
+    flight = _async_flights.get(key)
+    if flight is not None and flight.loop is asyncio.get_running_loop():
+        return flight, False
+
+    flight = AsyncFlight()
+    if key is not None:
+        _async_flights[key] = flight
+    try:
+        await scheduler.get_scheduler().aacquire(priority)
+    except BaseException as e:
+        flight.finish(e if isinstance(e, Exception) else RuntimeError("Request cancelled"))
+        if _async_flights.get(key) is flight:
+            del _async_flights[key]
+        raise
+
+    flight.task = asyncio.create_task(_arun(key, flight, user_message, context, history))
+    return flight, True
+
+
+def response_text(chunks):
+    return "".join(chunk.get("response", "") for chunk in chunks)
+
+
+def final_context(chunks):
+    """The context token array from a finished generation, if any."""
+    return chunks[-1].get("context") if chunks else None
@@ -142,6 +142,9 @@ if (signinForm) {
                     
                     // Store email in localStorage for chat persistence
                     localStorage.setItem('userEmail', email);
+
+                    // Signed login token for the chat APIs
+                    localStorage.setItem('authToken', data.token);
                     
                     // Redirect to dashboard
                     window.location.href = '/dashboard/';
@@ -4,10 +4,17 @@ let isTyping = false;
 let attachedFiles = [];
 let currentConversationId = null;
 let userEmail = null;
+let authToken = localStorage.getItem('authToken');
+
+// Paging state for the open conversation (older messages load on scroll up)
+let olderMessagesCursor = null;
+let hasOlderMessages = false;
+let isLoadingOlder = false;
 
 // Initialize
 document.addEventListener('DOMContentLoaded', function() {
     setupInputHandlers();
+    setupHistoryScroll();
     loadUserEmail();
     loadConversations();
     checkForTopicParam();
@@ -39,6 +46,15 @@ function loadUserEmail() {
     }
 }
 
+// Headers for API calls; the login token lets the server skip the email lookup
+function apiHeaders(extra = {}) {
+    const headers = { ...extra };
+    if (authToken) {
+        headers['Authorization'] = `Bearer ${authToken}`;
+    }
+    return headers;
+}
+
 // Check if there's a topic or subject from URL parameters
 function checkForTopicParam() {
     const urlParams = new URLSearchParams(window.location.search);
@@ -83,7 +99,9 @@ async function loadConversations() {
     }
 
     try {
-        const res = await fetch(`/api/conversations/?email=${encodeURIComponent(userEmail)}`);
+        const res = await fetch(`/api/conversations/?email=${encodeURIComponent(userEmail)}`, {
+            headers: apiHeaders()
+        });
         const data = await res.json();
 
         if (data.success && data.data.length > 0) {
@@ -122,6 +140,21 @@ function renderConversationsList(conversations) {
     });
 }
 
+// Show a conversation's new title and move it to the top of the sidebar
+function showConversationTitle(id, title) {
+    const item = document.querySelector(`.conversation-item[data-id="${id}"]`);
+    if (!item) {
+        loadConversations();
+        return;
+    }
+    if (title) {
+        const titleEl = item.querySelector('.conversation-title');
+        titleEl.textContent = title;
+        titleEl.title = title;
+    }
+    item.parentElement.prepend(item);
+}
+
 // Show "no conversations" message
 function showNoConversations() {
     const container = document.getElementById('conversationsList');
@@ -138,7 +171,7 @@ async function createConversation(title = 'New Chat') {
     try {
         const res = await fetch('/api/conversations/', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: apiHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({ email: userEmail, title: title })
         });
 
@@ -160,7 +193,9 @@ async function loadConversation(conversationId) {
     if (!userEmail) return;
 
     try {
-        const res = await fetch(`/api/messages/?email=${encodeURIComponent(userEmail)}&conversation_id=${conversationId}`);
+        const res = await fetch(`/api/messages/?email=${encodeURIComponent(userEmail)}&conversation_id=${conversationId}`, {
+            headers: apiHeaders()
+        });
         const data = await res.json();
 
         if (data.success) {
@@ -171,6 +206,9 @@ async function loadConversation(conversationId) {
             const messagesContainer = document.getElementById('chatMessages');
             messagesContainer.innerHTML = '';
 
+            olderMessagesCursor = data.before;
+            hasOlderMessages = data.has_more;
+
             if (data.data.length === 0) {
                 // Show empty state if no messages
                 showEmptyChat();
@@ -195,6 +233,57 @@ async function loadConversation(conversationId) {
     }
 }
 
+// Load older messages when the user scrolls to the top of the chat
+function setupHistoryScroll() {
+    const messagesContainer = document.getElementById('chatMessages');
+    messagesContainer.addEventListener('scroll', function() {
+        if (this.scrollTop < 80) {
+            loadOlderMessages();
+        }
+    });
+}
+
+async function loadOlderMessages() {
+    if (!userEmail || !currentConversationId || !hasOlderMessages || isLoadingOlder) return;
+
+    isLoadingOlder = true;
+    const conversationId = currentConversationId;
+
+    try {
+        const res = await fetch(`/api/messages/?email=${encodeURIComponent(userEmail)}&conversation_id=${conversationId}&before=${encodeURIComponent(olderMessagesCursor)}`, {
+            headers: apiHeaders()
+        });
+        const data = await res.json();
+
+        // Ignore the page if the user switched conversations meanwhile
+        if (data.success && conversationId === currentConversationId) {
+            olderMessagesCursor = data.before;
+            hasOlderMessages = data.has_more;
+
+            const messagesContainer = document.getElementById('chatMessages');
+            const previousHeight = messagesContainer.scrollHeight;
+            const firstMessage = messagesContainer.firstChild;
+
+            data.data.forEach(msg => {
+                const sender = msg.role === 'user' ? 'user' : 'ai';
+                messagesContainer.insertBefore(buildMessageElement(msg.content, sender), firstMessage);
+            });
+            chatHistory.unshift(...data.data.map(msg => ({
+                sender: msg.role === 'user' ? 'user' : 'ai',
+                text: msg.content,
+                timestamp: new Date(msg.created_at)
+            })));
+
+            // Keep the viewport on the message the user was reading
+            messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+        }
+    } catch (error) {
+        console.error('Error loading older messages:', error);
+    }
+
+    isLoadingOlder = false;
+}
+
 // Delete a conversation
 async function deleteConversation(event, conversationId) {
     event.stopPropagation();
@@ -205,7 +294,7 @@ async function deleteConversation(event, conversationId) {
     try {
         const res = await fetch('/api/conversations/', {
             method: 'DELETE',
-            headers: { 'Content-Type': 'application/json' },
+            headers: apiHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({ email: userEmail, conversation_id: conversationId })
         });
 
@@ -257,38 +346,81 @@ async function sendMessage(messageText = null) {
     isTyping = true;
 
     try {
-        const res = await fetch("/api/chatbot/", {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json"
-            },
-            body: JSON.stringify({ 
-                message: message,
-                email: userEmail,
-                conversation_id: currentConversationId
-            })
-        });
+        await streamBotResponse(message);
+    } catch (error) {
+        addMessageToUI("⚠️ AI service unavailable.", "ai");
+    }
 
+    isTyping = false;
+}
+
+// Stream the AI reply token by token (Server-Sent Events over fetch)
+async function streamBotResponse(message) {
+    const res = await fetch("/api/chatbot/stream/", {
+        method: "POST",
+        headers: apiHeaders({
+            "Content-Type": "application/json"
+        }),
+        body: JSON.stringify({
+            message: message,
+            email: userEmail,
+            conversation_id: currentConversationId
+        })
+    });
+
+    // Validation errors come back as plain JSON, not as a stream
+    if (!res.headers.get("Content-Type")?.startsWith("text/event-stream")) {
         const data = await res.json();
+        addMessageToUI("⚠️ " + data.message, "ai");
+        return;
+    }
 
-        if (data.success) {
-            addMessageToUI(data.bot_response, "ai");
-            
-            // Update conversation ID if returned
-            if (data.conversation_id) {
-                currentConversationId = data.conversation_id;
+    const textEl = addMessageToUI("", "ai");
+    const entry = chatHistory[chatHistory.length - 1];
+    const messagesContainer = document.getElementById('chatMessages');
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let text = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split("\n\n");
+        buffer = frames.pop();
+
+        for (const frame of frames) {
+            let event = "message";
+            let payload = "";
+            frame.split("\n").forEach(line => {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) payload += line.slice(6);
+            });
+            if (!payload) continue;
+            const data = JSON.parse(payload);
+
+            if (event === "message") {
+                text += data.token;
+                textEl.textContent = text;
+                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            } else if (event === "done") {
+                // Update conversation ID if returned
+                if (data.conversation_id) {
+                    currentConversationId = data.conversation_id;
+                }
+                // The turn is saved behind the response, so a reloaded list
+                // could still show the old title; use the one it will get
+                showConversationTitle(currentConversationId, data.title);
+            } else if (event === "error") {
+                text += (text ? "\n\n" : "") + "⚠️ " + data.message;
+                textEl.textContent = text;
             }
-            
-            // Refresh conversations list to show updated title
-            await loadConversations();
-        } else {
-            addMessageToUI("⚠️ " + data.message, "ai");
         }
-    } catch (error) {
-        addMessageToUI("⚠️ AI service unavailable.", "ai");
     }
 
-    isTyping = false;
+    entry.text = text;
 }
 
 // Send suggestion
@@ -296,10 +428,8 @@ function sendSuggestion(text) {
     sendMessage(text);
 }
 
-// Add message to UI only (without storing)
-function addMessageToUI(text, sender) {
-    const messagesContainer = document.getElementById('chatMessages');
-    
+// Build the DOM for one chat message
+function buildMessageElement(text, sender) {
     const messageDiv = document.createElement('div');
     messageDiv.className = 'message ' + sender;
     
@@ -317,7 +447,16 @@ function addMessageToUI(text, sender) {
     content.appendChild(messageText);
     messageDiv.appendChild(avatar);
     messageDiv.appendChild(content);
-    
+
+    return messageDiv;
+}
+
+// Add message to UI only (without storing)
+function addMessageToUI(text, sender) {
+    const messagesContainer = document.getElementById('chatMessages');
+    const messageDiv = buildMessageElement(text, sender);
+    const messageText = messageDiv.querySelector('.message-text');
+
     messagesContainer.appendChild(messageDiv);
     
     // Scroll to bottom
@@ -325,6 +464,8 @@ function addMessageToUI(text, sender) {
     
     // Store in local history
     chatHistory.push({ sender, text, timestamp: new Date() });
+
+    return messageText;
 }
 
 // Show empty chat state
@@ -369,6 +510,8 @@ function showEmptyChat() {
 function newChat() {
     currentConversationId = null;
     chatHistory = [];
+    olderMessagesCursor = null;
+    hasOlderMessages = false;
     showEmptyChat();
     
     // Remove active state from all conversations
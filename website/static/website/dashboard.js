@@ -35,6 +35,7 @@ function logout() {
     if (confirm('Are you sure you want to logout?')) {
         // Clear user data from sessionStorage
         sessionStorage.removeItem('user');
+        localStorage.removeItem('authToken');
         
         // Redirect to home page
         window.location.href = '/';
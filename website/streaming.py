@@ -0,0 +1,38 @@
+"""
+Streaming bodies for sync views that also run under ASGI.
+
+Under WSGI a StreamingHttpResponse over a sync generator is sent chunk by
+chunk as the generator yields. Under ASGI, Django consumes a sync
+iterator with ``sync_to_async(list)`` before sending anything, so an
+export would be buffered whole in memory and a chat stream would show no
+token until the answer was finished.
+
+body() hands ASGI an async iterator instead. It pulls one chunk at a
+time from the sync generator with sync_to_async. The calls are
+thread-sensitive, so the generator keeps running in the request's sync
+thread, next to its database connection and open cursors.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_END = object()
+
+
+def body(request, chunks):
+    """``chunks`` as the request's handler wants it: as is under WSGI, async under ASGI."""
+    if isinstance(request, ASGIRequest):
+        return _async_chunks(chunks)
+    return chunks
+
+
+async def _async_chunks(chunks):
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(iterator, _END)) is not _END:
+            yield chunk
+    finally:
+        # A client that went away closes this; let the generator clean up too
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
@@ -0,0 +1,271 @@
+"""
+Write-behind task queue backed by the ``tasks`` table.
+
+Chat requests used to make several writes after the model answered (the
+user message, the reply, the conversation's title and context). Each one
+waited for SQLite's single writer lock. Now a request makes one INSERT
+into ``tasks`` with enqueue() and returns. A worker later applies the
+queued work in batches: up to TASK_QUEUE_BATCH_SIZE tasks per
+transaction, with tasks of the same kind handed to their handler
+together. So 50 queued counter updates become one UPDATE, and 20 chat
+turns become one bulk insert of messages.
+
+Tasks are rows, so nothing queued is lost if the process dies. A handler
+that raises is retried on its own, with backoff. After
+TASK_QUEUE_MAX_ATTEMPTS it is kept with ``failed=True`` and the error,
+for ``manage.py run_tasks --retry-failed``.
+
+The worker is ``manage.py run_tasks``. With TASK_QUEUE_THREAD, each web
+process also drains the queue in a background thread that wakes as soon
+as a task is committed, so a dev server needs nothing extra. With
+TASK_QUEUE_ENABLED off, enqueue() runs the handler inline, which is the
+old synchronous behaviour.
+
+Queued writes become visible after the worker's next batch, usually
+within TASK_QUEUE_POLL_INTERVAL. Until then a conversation's newest turn
+is missing from messages_api and from the next turn's history; the chat
+stream's ``done`` event carries the title the turn will set, so the page
+doesn't have to wait for it.
+
+Handlers bump the API cache versions of what they change. A worker in
+its own process (TASK_QUEUE_THREAD off) only reaches the web processes
+through a shared cache backend, which settings.py switches to and
+checks.py requires.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import api_cache, counters, llm_context, routers
+from .models import Conversation, Message, Task
+
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_stats = {'enqueued': 0, 'completed': 0, 'retried': 0, 'failed': 0, 'batches': 0}
+
+_wakeup = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _count(name, delta=1):
+    with _stats_lock:
+        _stats[name] += delta
+
+
+def stats():
+    """Counts for this process since it started."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def turn_title(conversation, user_message):
+    """The title ``conversation`` has once a turn starting with ``user_message`` is saved."""
+    # From the first message, like the old synchronous path
+    if conversation.title == 'New Chat' and user_message:
+        return user_message[:50] + ('...' if len(user_message) > 50 else '')
+    return conversation.title
+
+
+# Handlers take the payloads of every task of their kind in a batch,
+# oldest first.
+
+def save_chat_turns(payloads):
+    """Store chat turns: the user's message and, if there was one, the reply."""
+    conversations = Conversation.objects.in_bulk({payload['conversation_id'] for payload in payloads})
+    messages, touched = [], {}
+    for payload in payloads:
+        conversation = conversations.get(payload['conversation_id'])
+        if conversation is None:
+            # Deleted while the turn was queued
+            continue
+        messages.append(Message(
+            conversation=conversation,
+            role='user',
+            content=payload['user_message'],
+            created_at=datetime.fromisoformat(payload['asked_at'])
+        ))
+        if payload.get('bot_response') is None:
+            continue
+        messages.append(Message(
+            conversation=conversation,
+            role='assistant',
+            content=payload['bot_response'],
+            created_at=datetime.fromisoformat(payload['answered_at'])
+        ))
+        conversation.title = turn_title(conversation, payload['user_message'])
+        llm_context.remember(conversation, payload.get('context'))
+        touched[conversation.id] = conversation
+
+    Message.objects.bulk_create(messages)
+    # bulk_create skips the post_save signal that invalidates the cache
+    for conversation_id in {message.conversation_id for message in messages}:
+        api_cache.bump(f'messages:{conversation_id}')
+    for conversation in touched.values():
+        conversation.save()
+
+
+def add_counters(payloads):
+    """Apply dashboard counter deltas, summed per counter."""
+    totals = {}
+    for payload in payloads:
+        totals[payload['key']] = totals.get(payload['key'], 0) + payload['delta']
+    for key, delta in totals.items():
+        counters.add(key, delta)
+    # The cached stats were rebuilt from the old counts in the meantime
+    if counters.STUDENTS in totals:
+        api_cache.bump('users')
+    if any(key.startswith('sessions:') for key in totals):
+        api_cache.bump('sessions')
+
+
+HANDLERS = {
+    'chat_turn': save_chat_turns,
+    'counter': add_counters,
+}
+
+
+def enqueue(name, **payload):
+    """
+    Queue ``name`` with a JSON-serializable ``payload``. The row commits
+    with the caller's transaction; the worker thread (if any) is woken
+    once it has.
+    """
+    if not settings.TASK_QUEUE_ENABLED:
+        with transaction.atomic():
+            HANDLERS[name]([payload])
+        return
+    Task.objects.create(name=name, payload=payload)
+    _count('enqueued')
+    transaction.on_commit(_wake)
+
+
+aenqueue = sync_to_async(enqueue)
+
+
+def _retry(task, error):
+    attempts = task.attempts + 1
+    failed = attempts >= settings.TASK_QUEUE_MAX_ATTEMPTS
+    Task.objects.filter(pk=task.pk).update(
+        attempts=attempts,
+        failed=failed,
+        last_error=error,
+        run_after=timezone.now() + timedelta(seconds=min(300, 2 ** attempts))
+    )
+    _count('failed' if failed else 'retried')
+    logger.warning("Task %s #%s failed (attempt %s): %s", task.name, task.pk, attempts, error)
+
+
+def _run_group(handler, group):
+    """Run ``group`` as one handler call; on error, one task at a time. Returns the tasks that succeeded."""
+    try:
+        with transaction.atomic():
+            handler([task.payload for task in group])
+        return group
+    except Exception:
+        if len(group) == 1:
+            raise
+    done = []
+    for task in group:
+        try:
+            with transaction.atomic():
+                handler([task.payload])
+            done.append(task)
+        except Exception as e:
+            _retry(task, f"{type(e).__name__}: {e}")
+    return done
+
+
+def run_batch(limit=None):
+    """Run up to ``limit`` due tasks in one transaction; returns how many were claimed."""
+    limit = limit or settings.TASK_QUEUE_BATCH_SIZE
+    with routers.use_primary():
+        # A plain read first: the transaction below is IMMEDIATE on SQLite
+        # and would take the write lock on every idle poll
+        if not _due().exists():
+            return 0
+        with transaction.atomic():
+            claimed, done = _claim_and_run(limit)
+    if claimed:
+        _count('completed', done)
+        _count('batches')
+    return claimed
+
+
+def _due():
+    return Task.objects.filter(failed=False, run_after__lte=timezone.now())
+
+
+def _claim_and_run(limit):
+    """Returns how many tasks were claimed and how many of them succeeded."""
+    # Row locks keep concurrent workers apart where the database has
+    # them; SQLite's IMMEDIATE transactions already serialize batches
+    due = list(_due().select_for_update(skip_locked=True).order_by('id')[:limit])
+    if not due:
+        # Another worker claimed them between the read and the lock
+        return 0, 0
+
+    groups = {}
+    for task in due:
+        groups.setdefault(task.name, []).append(task)
+
+    done = []
+    for name, group in groups.items():
+        handler = HANDLERS.get(name)
+        if handler is None:
+            for task in group:
+                _retry(task, f"Unknown task {name!r}")
+            continue
+        try:
+            done.extend(_run_group(handler, group))
+        except Exception as e:
+            _retry(group[0], f"{type(e).__name__}: {e}")
+
+    Task.objects.filter(pk__in=[task.pk for task in done]).delete()
+    return len(due), len(done)
+
+
+def run_pending(limit=None):
+    """Run batches until nothing is due; returns how many tasks were claimed."""
+    total = 0
+    while True:
+        ran = run_batch(limit)
+        if not ran:
+            return total
+        total += ran
+
+
+def work(stop=None, limit=None, poll_interval=None):
+    """
+    Run batches until ``stop`` (a threading.Event) is set, sleeping
+    ``poll_interval`` seconds (or until woken by an enqueue in this
+    process) whenever the queue is empty.
+    """
+    poll_interval = settings.TASK_QUEUE_POLL_INTERVAL if poll_interval is None else poll_interval
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        try:
+            if run_batch(limit):
+                continue
+        except DatabaseError:
+            logger.exception("Task batch failed")
+            time.sleep(poll_interval)
+        _wakeup.wait(poll_interval)
+        _wakeup.clear()
+
+
+def _wake():
+    global _thread
+    if settings.TASK_QUEUE_THREAD:
+        with _thread_lock:
+            if _thread is None or not _thread.is_alive():
+                _thread = threading.Thread(target=work, name="task-queue", daemon=True)
+                _thread.start()
+    _wakeup.set()
@@ -1,3 +1,1207 @@
-from django.test import TestCase
+import csv
+import gc
+import gzip
+import io
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.templatetags.static import static
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.utils import timezone
+
+from . import (
+    archive, assets, auth_tokens, benchmarks, bulk_import, compression, counters, hashing, llm, llm_cache, llm_context, mock_ollama, scheduler, serialization,
+    routers, singleflight, tasks
+)
+from .middleware import TokenAuthMiddleware
+from .models import CachedResponse, Conversation, DashboardCounter, Message, Session, Task, User
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class ApiQueryBudgetTests(TransactionTestCase):
+    """
+    Every view in views.py stays within its query budget (see
+    benchmarks.py). TransactionTestCase so on_commit cache invalidation
+    runs as it does in production.
+    """
+
+    def setUp(self):
+        benchmarks.reset_caches()
+        self.fixtures = benchmarks.seed(**benchmarks.DEFAULT_SCALE)
+
+    def test_every_view_within_query_budget(self):
+        results = benchmarks.run(self.fixtures, iterations=3)
+        self.assertEqual(len(results), len(benchmarks.SCENARIOS))
+        for result in results:
+            with self.subTest(result['name']):
+                self.assertLessEqual(
+                    result['queries'], result['budget'],
+                    f"{result['name']} made {result['queries']} queries (budget {result['budget']})"
+                )
+
+    def test_budgets_do_not_grow_with_data(self):
+        # An N+1 shows up as more queries once there are more rows
+        small = {r['name']: r['queries'] for r in benchmarks.run(self.fixtures, iterations=1)}
+        benchmarks.seed(users=10, conversations=5, messages=30, sessions=100, label='extra')
+        benchmarks.reset_caches()
+        large = {r['name']: r['queries'] for r in benchmarks.run(self.fixtures, iterations=1)}
+        self.assertEqual(small, large)
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class SessionAdminTests(TransactionTestCase):
+    def test_changelist_does_not_query_per_session(self):
+        from django.contrib.auth.models import User as AdminUser
+
+        fixtures = benchmarks.seed(users=5, conversations=0, messages=0, sessions=5)
+        admin = AdminUser.objects.create_superuser('admin', 'admin@bench.test', 'pw')
+        self.client.force_login(admin)
+
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get('/admin/website/session/').status_code, 200)
+            return len(queries.captured_queries)
+
+        before = count()
+        Session.objects.bulk_create(
+            Session(user=fixtures['user'], title=f'Extra {n}', subject='math') for n in range(20)
+        )
+        self.assertEqual(count(), before)
+
+
+@override_settings(LLM_CACHE_ENABLED=False, **benchmarks.BENCHMARK_SETTINGS)
+class MockOllamaTests(TransactionTestCase):
+    def serve(self, **config):
+        server = mock_ollama.start(mock_ollama.MockConfig(**{
+            'ttft': 0, 'tokens_per_second': 0, 'tokens': 5, 'jitter': 0, **config
+        }))
+        self.addCleanup(server.shutdown)
+        self.received = server.stats.received
+        return override_settings(OLLAMA_URL=f"http://127.0.0.1:{server.server_port}")
+
+    def chat(self, fixtures, conversation, message):
+        response = self.client.post(
+            '/api/chatbot/', {'message': message, 'conversation_id': conversation.id},
+            content_type='application/json', headers={'Authorization': f"Bearer {fixtures['token']}"}
+        )
+        self.assertTrue(response.json()['success'])
+        tasks.run_pending()
+        return self.received[-1]
+
+    def test_streams_like_ollama(self):
+        with self.serve():
+            chunks = list(llm.stream_generate('explain recursion', context=[7]))
+        self.assertEqual(len(chunks), 6)
+        self.assertTrue(chunks[-1]['done'])
+        self.assertEqual(chunks[-1]['eval_count'], 5)
+        self.assertEqual(chunks[-1]['context'][0], 7)
+
+    def test_llm_time_in_server_timing_and_metrics(self):
+        with self.serve():
+            response = self.client.post(
+                '/api/chatbot/', {'message': 'what is a vector space'}, content_type='application/json'
+            )
+        self.assertTrue(response.json()['success'])
+        self.assertIn('llm-decode;dur=', response['Server-Timing'])
+        self.assertIn('desc="5 tokens', response['Server-Timing'])
+
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        text = self.client.get('/metrics', headers=benchmarks.OPS_HEADERS).content.decode()
+        self.assertIn('edutech_http_request_duration_seconds_count{view="chatbot_api",method="POST",status="200"}', text)
+        self.assertIn('edutech_llm_tokens_total{kind="completion"}', text)
+
+    def test_streams_recorded_when_their_body_ends(self):
+        def count(view):
+            text = self.client.get('/metrics', headers=benchmarks.OPS_HEADERS).content.decode()
+            line = f'edutech_http_request_duration_seconds_count{{view="{view}",method="POST",status="200"}} '
+            return next((float(row[len(line):]) for row in text.splitlines() if row.startswith(line)), 0)
+
+        with self.serve():
+            before = count('chatbot_stream_api')
+            response = self.client.post('/api/chatbot/stream/', {'message': 'sync'}, content_type='application/json')
+            self.assertEqual(count('chatbot_stream_api'), before)
+            self.assertIn(b'event: done', b''.join(response.streaming_content))
+            self.assertEqual(count('chatbot_stream_api'), before + 1)
+
+            # Under ASGI the body stays an async iterator all the way down
+            async def stream():
+                response = await self.async_client.post(
+                    '/api/chatbot/async/stream/', {'message': 'async'}, content_type='application/json'
+                )
+                started = count('chatbot_stream_async_api')
+                body = b''.join([chunk async for chunk in response.streaming_content])
+                return started, body
+
+            before = count('chatbot_stream_async_api')
+            started, body = async_to_sync(stream)()
+            self.assertEqual(started, before)
+            self.assertIn(b'event: done', body)
+            self.assertEqual(count('chatbot_stream_async_api'), before + 1)
+
+    def test_sync_stream_sends_tokens_as_generated_under_asgi(self):
+        async def first_event():
+            started = time.monotonic()
+            response = await self.async_client.post(
+                '/api/chatbot/stream/', {'message': 'explain recursion slowly'}, content_type='application/json'
+            )
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            waited = time.monotonic() - started
+            rest = b''.join([chunk async for chunk in chunks])
+            return response, first, waited, rest, time.monotonic() - started
+
+        # 10 tokens at 10/s: about a second to generate the whole answer
+        with self.serve(tokens=10, tokens_per_second=10):
+            response, first, waited, rest, total = async_to_sync(first_event)()
+        self.assertTrue(response.is_async)
+        self.assertTrue(first.startswith(b'data: {"token"'))
+        self.assertNotIn(b'event: done', first)
+        self.assertIn(b'event: done', rest)
+        self.assertLess(waited, total / 2)
+
+    def test_second_turn_sends_back_the_stored_context(self):
+        fixtures = benchmarks.seed(users=1, conversations=0, messages=0, sessions=0)
+        conversation = Conversation.objects.create(user=fixtures['user'])
+        with self.serve():
+            first = self.chat(fixtures, conversation, 'explain recursion')
+            second = self.chat(fixtures, conversation, 'show an example')
+        self.assertNotIn('context', first)
+        # The mock's context is the prompt's context plus one id per generated token
+        self.assertEqual(second['context'], [0, 1, 2, 3, 4])
+        self.assertEqual(second['prompt'], 'Explain clearly:\nshow an example')
+
+    @override_settings(LLM_HISTORY_TOKEN_BUDGET=25, LLM_CONTEXT_MAX_TOKENS=8)
+    def test_history_replaces_a_missing_or_stale_context(self):
+        fixtures = benchmarks.seed(users=1, conversations=0, messages=0, sessions=0)
+        stale = {
+            'missing': {},
+            'other model': {'llm_context': llm_context.encode([1, 2]), 'llm_context_model': 'other'},
+            'too long': {'llm_context': llm_context.encode(range(9)), 'llm_context_model': settings.OLLAMA_MODEL},
+        }
+        with self.serve():
+            for name, fields in stale.items():
+                with self.subTest(name):
+                    conversation = Conversation.objects.create(user=fixtures['user'], **fields)
+                    now = timezone.now()
+                    # 40 characters (~10 tokens) each: the 25 token budget fits the newest two
+                    Message.objects.bulk_create(
+                        Message(conversation=conversation, role=('user', 'assistant')[n % 2],
+                                content=f'message {n}'.ljust(40, '.'), created_at=now - timedelta(minutes=4 - n))
+                        for n in range(4)
+                    )
+                    payload = self.chat(fixtures, conversation, 'and then?')
+                    self.assertNotIn('context', payload)
+                    transcript = payload['prompt'].split('\n\n')[0]
+                    self.assertNotIn('message 0', transcript)
+                    self.assertNotIn('message 1', transcript)
+                    self.assertLess(transcript.index('Student: message 2'), transcript.index('Tutor: message 3'))
+
+    def test_async_client_is_closed_with_its_event_loop(self):
+        async def generate():
+            client = llm.get_async_client()
+            self.assertIs(llm.get_async_client(), client)
+            await llm.agenerate('explain recursion')
+            return client
+
+        with self.serve(), warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', ResourceWarning)
+            # Each async_to_sync call runs (and closes) its own loop
+            first = async_to_sync(generate)()
+            second = async_to_sync(generate)()
+            gc.collect()
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed and second.is_closed)
+        self.assertEqual([str(w.message) for w in caught if w.category is ResourceWarning], [])
+
+    def test_injected_stream_error(self):
+        with self.serve(stream_error_rate=1.0):
+            with self.assertRaisesMessage(RuntimeError, 'interrupted'):
+                list(llm.stream_generate('explain recursion'))
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class TaskQueueTests(TransactionTestCase):
+    def test_chat_turn_is_written_behind(self):
+        fixtures = benchmarks.seed(users=1, conversations=0, messages=0, sessions=0)
+        conversation = Conversation.objects.create(user=fixtures['user'])
+        with benchmarks.stub_ollama():
+            response = self.client.post(
+                '/api/chatbot/', {'message': 'explain recursion', 'conversation_id': conversation.id},
+                content_type='application/json', headers={'Authorization': f"Bearer {fixtures['token']}"}
+            )
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(Message.objects.exists())
+
+        tasks.run_pending()
+        self.assertEqual(
+            list(Message.objects.filter(conversation=conversation).values_list('role', flat=True)),
+            ['user', 'assistant']
+        )
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.title, 'explain recursion')
+        self.assertIsNotNone(conversation.llm_context)
+
+    def test_counter_updates_are_summed_per_batch(self):
+        User.objects.bulk_create(User(name='x', email=f'{n}@queue.test', password_hash='!') for n in range(3))
+        counters.rebuild()
+        for n in range(3, 8):
+            User.objects.create(name='x', email=f'{n}@queue.test', password_hash='!')
+        self.assertEqual(Task.objects.filter(name='counter').count(), 5)
+
+        tasks.run_pending()
+        self.assertEqual(counters.read(counters.STUDENTS), [8])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(API_CACHE_ENABLED=True)
+    def test_counter_updates_invalidate_cached_stats(self):
+        benchmarks.reset_caches()
+        User.objects.create(name='x', email='first@queue.test', password_hash='!')
+        tasks.run_pending()
+        before = self.client.get('/api/dashboard/stats/').json()['data']
+
+        User.objects.create(name='x', email='second@queue.test', password_hash='!')
+        # The signal's bump landed before the counter did; the page cached in between is stale
+        self.assertEqual(self.client.get('/api/dashboard/stats/').json()['data'], before)
+        tasks.run_pending()
+        after = self.client.get('/api/dashboard/stats/').json()['data']
+        self.assertEqual(after['total_students'], before['total_students'] + 1)
+
+    def test_stream_done_event_carries_the_new_title(self):
+        fixtures = benchmarks.seed(users=1, conversations=0, messages=0, sessions=0)
+        conversation = Conversation.objects.create(user=fixtures['user'])
+        with benchmarks.stub_ollama():
+            response = self.client.post(
+                '/api/chatbot/stream/', {'message': 'explain recursion', 'conversation_id': conversation.id},
+                content_type='application/json', headers={'Authorization': f"Bearer {fixtures['token']}"}
+            )
+            body = b''.join(response.streaming_content).decode()
+        done = json.loads(body.split('event: done\ndata: ')[1])
+        self.assertEqual(done['title'], 'explain recursion')
+        self.assertEqual(Conversation.objects.get(pk=conversation.pk).title, 'New Chat')
+
+    def test_follow_up_before_the_worker_sees_the_queued_turn(self):
+        fixtures = benchmarks.seed(users=1, conversations=0, messages=0, sessions=0)
+        conversation = Conversation.objects.create(user=fixtures['user'])
+        sent = []
+
+        def recording_stream(user_message, context=None, history=None):
+            sent.append((context, history))
+            yield from benchmarks._stub_stream(user_message)
+
+        with benchmarks.stub_ollama(), mock.patch.object(llm, 'stream_generate', recording_stream):
+            for message in ('explain recursion', 'show an example'):
+                self.client.post(
+                    '/api/chatbot/', {'message': message, 'conversation_id': conversation.id},
+                    content_type='application/json', headers={'Authorization': f"Bearer {fixtures['token']}"}
+                )
+        self.assertFalse(Message.objects.exists())
+        self.assertEqual(sent[1], (benchmarks.STUB_CHUNKS[-1]['context'], None))
+
+    def test_queued_turns_without_context_are_replayed_as_history(self):
+        fixtures = benchmarks.seed(users=1, conversations=1, messages=2, sessions=0)
+        conversation = fixtures['conversation']
+        tasks.enqueue(
+            'chat_turn', conversation_id=conversation.id, user_message='queued question',
+            asked_at=timezone.now().isoformat(), bot_response='queued answer',
+            answered_at=timezone.now().isoformat(), context=None
+        )
+        context, history = llm_context.for_turn(conversation)
+        self.assertIsNone(context)
+        self.assertEqual(history[-2:], [('user', 'queued question'), ('assistant', 'queued answer')])
+        self.assertEqual(len(history), 4)
+
+    def test_idle_poll_does_not_take_the_write_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(tasks.run_batch(), 0)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('SELECT'))
+
+    def test_worker_process_needs_a_shared_cache(self):
+        from .checks import check_task_worker_cache
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        files = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+        with override_settings(TASK_QUEUE_THREAD=True, CACHES=locmem):
+            self.assertEqual(check_task_worker_cache(None), [])
+        with override_settings(TASK_QUEUE_THREAD=False, CACHES=locmem):
+            self.assertEqual([e.id for e in check_task_worker_cache(None)], ['website.E001'])
+        with override_settings(TASK_QUEUE_THREAD=False, CACHES=files):
+            self.assertEqual(check_task_worker_cache(None), [])
+
+    def test_failing_task_is_retried_then_kept(self):
+        Task.objects.create(name='counter', payload={'key': 'students'})
+        with override_settings(TASK_QUEUE_MAX_ATTEMPTS=1), self.assertLogs('website.tasks', 'WARNING'):
+            tasks.run_batch()
+        task = Task.objects.get()
+        self.assertTrue(task.failed)
+        self.assertIn('KeyError', task.last_error)
+        self.assertFalse(DashboardCounter.objects.filter(key='students', value__gt=0).exists())
+
+
+class StaticAssetTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(STATIC_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_hashed_asset_is_precompressed_and_immutable(self):
+        url = static('website/chatbot.js')
+        self.assertRegex(url, r'^/static/website/chatbot\.[0-9a-f]{12}\.js$')
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        body = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        plain = self.client.get(url, headers={'Accept-Encoding': 'identity'})
+        self.assertEqual(gzip.decompress(body), b''.join(plain.streaming_content))
+        self.assertNotIn('Content-Encoding', plain)
+
+    def test_unhashed_asset_revalidates(self):
+        response = self.client.get('/static/website/styles.css')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        again = self.client.get('/static/website/styles.css', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_if_none_match_compares_whole_etags(self):
+        etag = self.client.get('/static/website/styles.css')['ETag']
+        for header, status in (
+            (f'"other", W/{etag}', 304),
+            ('*', 304),
+            (etag[:-2] + '"', 200),
+            (f'"x{etag[1:]}', 200),
+        ):
+            with self.subTest(header):
+                response = self.client.get('/static/website/styles.css', headers={'If-None-Match': header})
+                self.assertEqual(response.status_code, status)
+
+    def test_served_natively_under_asgi(self):
+        response = async_to_sync(self.async_client.get)(static('website/chatbot.js'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(b''.join(response.streaming_content))
+
+    def test_missing_manifest_is_logged_once(self):
+        with tempfile.TemporaryDirectory() as location:
+            storage = assets.CompressedManifestStaticFilesStorage(location=location)
+            with self.assertLogs('website.assets', 'WARNING') as logs:
+                self.assertEqual(storage.stored_name('website/chatbot.js'), 'website/chatbot.js')
+                storage.stored_name('website/styles.css')
+        self.assertEqual(len(logs.records), 1)
+        self.assertNotIn(storage.stored_name('website/chatbot.js'), assets.immutable_names())
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class ApiCompressionTests(TransactionTestCase):
+    def setUp(self):
+        self.fixtures = benchmarks.seed(users=1, conversations=1, messages=40, sessions=0)
+        self.auth = {'Authorization': f"Bearer {self.fixtures['token']}"}
+
+    def get_messages(self, **headers):
+        return self.client.get(
+            '/api/messages/', {'conversation_id': self.fixtures['conversation'].id}, headers={**self.auth, **headers}
+        )
+
+    def test_large_json_is_gzipped(self):
+        plain = self.get_messages()
+        compressed = self.get_messages(**{'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(compressed.content)), plain.json())
+        self.assertLess(len(compressed.content) * 5, len(plain.content))
+
+    def test_small_and_streaming_responses_pass_through(self):
+        small = self.client.get('/api/llm/scheduler/', headers={**benchmarks.OPS_HEADERS, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(small.status_code, 200)
+        self.assertNotIn('Content-Encoding', small)
+        with benchmarks.stub_ollama():
+            stream = self.client.post(
+                '/api/chatbot/stream/', {'message': 'explain recursion'},
+                content_type='application/json', headers={'Accept-Encoding': 'gzip'}
+            )
+        self.assertTrue(stream.streaming)
+        self.assertNotIn('Content-Encoding', stream)
+        b''.join(stream.streaming_content)
+
+    def test_async_stack_compresses_and_streams(self):
+        async def requests():
+            compressed = await self.async_client.get(
+                '/api/messages/', {'conversation_id': self.fixtures['conversation'].id},
+                headers={**self.auth, 'Accept-Encoding': 'gzip'}
+            )
+            with benchmarks.stub_ollama():
+                stream = await self.async_client.post(
+                    '/api/chatbot/async/stream/', {'message': 'explain recursion'},
+                    content_type='application/json', headers={'Accept-Encoding': 'gzip'}
+                )
+                body = b''.join([chunk async for chunk in stream.streaming_content])
+            return compressed, stream, body
+
+        compressed, stream, body = async_to_sync(requests)()
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertTrue(json.loads(gzip.decompress(compressed.content))['success'])
+        self.assertTrue(stream.is_async)
+        self.assertNotIn('Content-Encoding', stream)
+        self.assertIn(b'event: done', body)
+
+    def test_busy_machine_uses_fast_level(self):
+        with mock.patch.object(compression, 'busy', return_value=True):
+            self.assertEqual(compression.level('gzip'), 1)
+        with mock.patch.object(compression, 'busy', return_value=False):
+            self.assertEqual(compression.level('gzip'), 6)
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class SerializationTests(TransactionTestCase):
+    def setUp(self):
+        benchmarks.reset_caches()
+        self.fixtures = benchmarks.seed(users=1, conversations=1, messages=30, sessions=3)
+        self.auth = {'Authorization': f"Bearer {self.fixtures['token']}"}
+
+    def test_messages_pages_match_the_models(self):
+        conversation = self.fixtures['conversation']
+        first = self.client.get(
+            '/api/messages/', {'conversation_id': conversation.id, 'limit': 20}, headers=self.auth
+        ).json()
+        older = self.client.get(
+            '/api/messages/', {'conversation_id': conversation.id, 'limit': 20, 'before': first['before']},
+            headers=self.auth
+        ).json()
+        self.assertTrue(first['success'])
+        self.assertEqual(first['conversation_id'], conversation.id)
+        self.assertFalse(older['has_more'])
+        expected = [
+            {'id': msg.id, 'role': msg.role, 'content': msg.content,
+             'created_at': DjangoJSONEncoder().default(msg.created_at)}
+            for msg in Message.objects.filter(conversation=conversation).order_by('created_at', 'id')
+        ]
+        self.assertEqual(older['data'] + first['data'], expected)
+
+    def test_stdlib_fallback_encodes_like_the_fast_backend(self):
+        sessions = self.client.get('/api/sessions/recent/').json()['data']
+        self.assertEqual(len(sessions), 3)
+        self.assertEqual(sessions[0]['user_name'], self.fixtures['user'].name)
+
+        data = {'data': serialization.rows(Message.objects.order_by('id'), benchmarks.MESSAGE_COLUMNS), 'title': 'é'}
+        with mock.patch.object(serialization, 'orjson', None):
+            fallback = serialization.dumps(data)
+        self.assertEqual(json.loads(fallback), json.loads(serialization.dumps(data)))
+        if serialization.orjson is not None:
+            self.assertEqual(fallback, serialization.dumps(data))
+
+    def test_timestamps_are_written_like_json_response(self):
+        moment = datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc)
+        data = {'at': moment, 'day': moment.date(), 'score': Decimal('0.5')}
+        expected = JsonResponse(data, json_dumps_params={'separators': (',', ':')}).content
+        self.assertEqual(expected, b'{"at":"2024-01-02T03:04:05.678Z","day":"2024-01-02","score":"0.5"}')
+        self.assertEqual(serialization.dumps(data), expected)
+        with mock.patch.object(serialization, 'orjson', None):
+            self.assertEqual(serialization.dumps(data), expected)
+
+    def test_throughput_benchmark_runs(self):
+        results = benchmarks.serialization_throughput(messages=50, repeat=1)
+        self.assertEqual([result['name'] for result in results], [name for name, _ in benchmarks.SERIALIZERS])
+        self.assertEqual(results[1]['bytes'], results[2]['bytes'])
+
+
+class LLMCacheTests(TransactionTestCase):
+    def setUp(self):
+        llm_cache.clear()
+
+    def test_normalized_prompts_share_an_answer(self):
+        llm_cache.store('Explain  recursion?', 'It calls itself.')
+        llm_cache._memory_tier().clear()
+        self.assertEqual(llm_cache.lookup('explain recursion'), 'It calls itself.')
+        self.assertIsNone(llm_cache.lookup('explain iteration'))
+
+    def test_hits_and_prunes_are_throttled(self):
+        llm_cache.store('explain recursion', 'It calls itself.')
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                llm_cache._memory_tier().clear()
+                self.assertEqual(llm_cache.lookup('explain recursion'), 'It calls itself.')
+            llm_cache.store('what is a vector', 'An arrow.')
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(('UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+
+        # The next prune flushes the hits counted in memory
+        with override_settings(LLM_CACHE_PRUNE_INTERVAL=0):
+            llm_cache.store('what is a matrix', 'A grid of numbers.')
+        self.assertEqual(CachedResponse.objects.get(prompt='explain recursion').hits, 3)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.calls = []
+        patcher = mock.patch.object(llm, 'stream_generate', self._generate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(scheduler, '_scheduler', scheduler.Scheduler(4, 8, 5))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _generate(self, user_message, context=None, history=None):
+        self.calls.append(user_message)
+        self.release.wait(5)
+        yield {'response': 'It calls '}
+        yield {'response': 'itself.', 'done': True}
+
+    def test_identical_prompts_share_one_generation(self):
+        leader, started = singleflight.join('explain recursion')
+        follower, joined = singleflight.join('Explain  recursion?')
+        self.assertTrue(started)
+        self.assertFalse(joined)
+        self.assertIs(leader, follower)
+
+        answers = []
+        threads = [
+            threading.Thread(target=lambda: answers.append(singleflight.response_text(list(leader.follow()))))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(answers, ['It calls itself.'] * 3)
+        self.assertEqual(self.calls, ['explain recursion'])
+
+    def test_follow_ups_are_never_shared(self):
+        self.release.set()
+        first, _ = singleflight.join('why?', context=[1, 2])
+        second, started = singleflight.join('why?', context=[3, 4])
+        self.assertIsNot(first, second)
+        self.assertTrue(started)
+        list(first.follow())
+        list(second.follow())
+        self.assertEqual(len(self.calls), 2)
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class SchedulerTests(TransactionTestCase):
+    def setUp(self):
+        llm_cache.clear()
+        self.scheduler = scheduler.Scheduler(1, 1, 0.05)
+        patcher = mock.patch.object(scheduler, '_scheduler', self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ask(self, message):
+        with benchmarks.stub_ollama():
+            return self.client.post('/api/chatbot/', {'message': message}, content_type='application/json')
+
+    def test_full_queue_is_rejected_with_retry_after(self):
+        self.scheduler.acquire()
+        outcomes = []
+
+        def wait():
+            try:
+                self.scheduler.acquire()
+            except scheduler.QueueTimeout as e:
+                outcomes.append(e.status)
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        while not self.scheduler.stats()['queue_depth']:
+            waiter.join(0.001)
+
+        response = self.ask('explain recursion')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertFalse(response.json()['success'])
+        waiter.join()
+        self.assertEqual(outcomes, [503])
+
+    def test_queue_timeout_answers_503(self):
+        self.scheduler.acquire()
+        response = self.ask('explain recursion')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.scheduler.stats()['timed_out'], 1)
+
+        self.scheduler.release()
+        self.assertEqual(self.ask('explain recursion').status_code, 200)
+
+    def test_short_prompts_are_served_first(self):
+        queue = scheduler.Scheduler(1, 8, 5)
+        queue.acquire()
+        order = []
+
+        def wait(priority):
+            queue.acquire(priority)
+            order.append(priority)
+            queue.release()
+
+        threads = [threading.Thread(target=wait, args=(priority,)) for priority in (scheduler.NORMAL, scheduler.HIGH)]
+        for thread in threads:
+            thread.start()
+            while queue.stats()['queue_depth'] < threads.index(thread) + 1:
+                thread.join(0.001)
+        queue.release()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, [scheduler.HIGH, scheduler.NORMAL])
+
+    def test_stats_endpoint_needs_staff_or_ops_token(self):
+        from django.contrib.auth.models import User as AdminUser
+
+        self.assertEqual(self.client.get('/api/llm/scheduler/').status_code, 403)
+        wrong = self.client.get('/api/llm/scheduler/', headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(wrong.status_code, 403)
+        response = self.client.get('/api/llm/scheduler/', headers=benchmarks.OPS_HEADERS)
+        self.assertEqual(response.json()['data']['max_concurrent'], 1)
+
+        self.client.force_login(AdminUser.objects.create_user('ops', 'ops@bench.test', 'pw', is_staff=True))
+        self.assertEqual(self.client.get('/api/llm/scheduler/').status_code, 200)
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class PaginationTests(TransactionTestCase):
+    def setUp(self):
+        self.fixtures = benchmarks.seed(users=1, conversations=3, messages=25, sessions=0)
+        self.auth = {'Authorization': f"Bearer {self.fixtures['token']}"}
+
+    def get(self, path, **params):
+        return self.client.get(path, params, headers=self.auth).json()
+
+    def get_messages(self, **params):
+        return self.get('/api/messages/', conversation_id=self.fixtures['conversation'].id, **params)
+
+    def test_before_and_after_cursors_walk_the_conversation(self):
+        newest = self.get_messages(limit=10)
+        self.assertTrue(newest['has_more'])
+        self.assertEqual([m['id'] for m in newest['data']], self.fixtures['message_ids'][-10:])
+
+        older = self.get_messages(limit=10, before=newest['before'])
+        self.assertEqual([m['id'] for m in older['data']], self.fixtures['message_ids'][-20:-10])
+        oldest = self.get_messages(limit=10, before=older['before'])
+        self.assertFalse(oldest['has_more'])
+        self.assertEqual([m['id'] for m in oldest['data']], self.fixtures['message_ids'][:5])
+
+        newer = self.get_messages(limit=10, after=oldest['after'])
+        self.assertEqual(newer['data'], older['data'])
+
+    def test_conversations_newest_first(self):
+        page = self.get('/api/conversations/', limit=2)
+        rest = self.get('/api/conversations/', limit=2, before=page['before'])
+        self.assertTrue(page['has_more'])
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(len(page['data'] + rest['data']), 3)
+        stamps = [c['updated_at'] for c in page['data'] + rest['data']]
+        self.assertEqual(stamps, sorted(stamps, reverse=True))
+
+    def test_bad_parameters_get_fixed_errors(self):
+        self.assertEqual(self.get_messages(limit='ten')['message'], 'limit must be an integer')
+        self.assertEqual(self.get_messages(limit=0)['message'], 'limit must be positive')
+        self.assertEqual(self.get_messages(before='not-a-cursor')['message'], 'Invalid cursor')
+        self.assertEqual(len(self.get_messages(limit=10 ** 6)['data']), 25)
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class ArchiveTests(TransactionTestCase):
+    def setUp(self):
+        benchmarks.reset_caches()
+        self.fixtures = benchmarks.seed(users=2, conversations=1, messages=25, sessions=0)
+        self.conversation = self.fixtures['conversation']
+        self.auth = {'Authorization': f"Bearer {self.fixtures['token']}"}
+
+    def get(self, path, **params):
+        return self.client.get(path, params, headers=self.auth).json()
+
+    def live_messages(self):
+        return list(
+            Message.objects.filter(conversation=self.conversation).order_by('id').values_list(
+                'id', 'role', 'content', 'created_at'
+            )
+        )
+
+    def test_restore_puts_back_the_same_rows(self):
+        before = self.live_messages()
+        archive.archive(self.conversation)
+        self.assertEqual(self.live_messages(), [])
+        self.assertTrue(archive.restore(Conversation.objects.get(pk=self.conversation.pk)))
+        self.assertEqual(self.live_messages(), before)
+        self.assertFalse(Conversation.objects.get(pk=self.conversation.pk).is_archived)
+
+    def test_reading_pages_through_the_archive_without_restoring(self):
+        live = self.get('/api/messages/', conversation_id=self.conversation.id, limit=10)
+        archive.archive(self.conversation)
+
+        newest = self.get('/api/messages/', conversation_id=self.conversation.id, limit=10)
+        self.assertEqual(newest['data'], live['data'])
+        self.assertEqual(newest['before'], live['before'])
+        older = self.get('/api/messages/', conversation_id=self.conversation.id, limit=10, before=newest['before'])
+        self.assertEqual([m['id'] for m in older['data']], self.fixtures['message_ids'][-20:-10])
+        self.assertTrue(Conversation.objects.get(pk=self.conversation.pk).is_archived)
+        self.assertEqual(self.live_messages(), [])
+
+    def test_archived_messages_stay_searchable_by_their_owner_only(self):
+        archive.archive(self.conversation)
+        found = self.get('/api/messages/search/', q='eigenvalues')['data']
+        self.assertEqual(
+            sorted(m['id'] for m in found), sorted(self.fixtures['message_ids'][::len(benchmarks.TOPICS)])
+        )
+        self.assertTrue(all('<mark>eigenvalues</mark>' in m['snippet'] and m['role'] == 'user' for m in found))
+
+        other = User.objects.get(email='student1@bench.test')
+        theirs = self.client.get(
+            '/api/messages/search/', {'q': 'eigenvalues'},
+            headers={'Authorization': f'Bearer {auth_tokens.issue(other)}'}
+        ).json()['data']
+        self.assertTrue(theirs)
+        self.assertFalse({m['id'] for m in theirs} & set(self.fixtures['message_ids']))
+
+        archive.restore(Conversation.objects.get(pk=self.conversation.pk))
+        self.assertEqual(len(self.get('/api/messages/search/', q='eigenvalues')['data']), len(found))
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class SearchTests(TransactionTestCase):
+    def setUp(self):
+        benchmarks.reset_caches()
+        self.fixtures = benchmarks.seed(users=2, conversations=2, messages=12, sessions=0)
+        self.auth = {'Authorization': f"Bearer {self.fixtures['token']}"}
+
+    def search(self, **params):
+        return self.client.get('/api/messages/search/', params, headers=self.auth).json()
+
+    def test_only_the_callers_messages_match(self):
+        own = set(Message.objects.filter(conversation__user=self.fixtures['user']).values_list('id', flat=True))
+        found = self.search(q='recursion', limit=50)
+        # Two matching messages in each of the caller's two conversations
+        self.assertEqual(len(found['data']), 4)
+        self.assertTrue({m['id'] for m in found['data']} <= own)
+
+    def test_snippets_mark_matches_and_escape_content(self):
+        conversation = self.fixtures['conversation']
+        Message.objects.create(conversation=conversation, role='user', content='<b>Recursion</b> & base cases')
+        hit = self.search(q='recursion base')['data'][0]
+        self.assertIn('&lt;b&gt;<mark>Recursion</mark>&lt;/b&gt; &amp; <mark>base</mark>', hit['snippet'])
+        self.assertEqual(hit['conversation_title'], conversation.title)
+
+    def test_offset_pages_through_results(self):
+        first = self.search(q='lorem', limit=15)
+        self.assertTrue(first['has_more'])
+        rest = self.search(q='lorem', limit=15, offset=first['next_offset'])
+        self.assertFalse(rest['has_more'])
+        ids = [m['id'] for m in first['data'] + rest['data']]
+        self.assertEqual(len(set(ids)), 24)
+
+    def test_needs_a_login_token(self):
+        response = self.client.get(
+            '/api/messages/search/', {'q': 'recursion', 'email': self.fixtures['user'].email}
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(response.json()['success'])
+
+    def test_bad_parameters_get_fixed_errors(self):
+        self.assertEqual(self.search(q='  ')['message'], 'Search query required')
+        self.assertEqual(self.search(q='lorem', offset='x')['message'], 'Invalid offset')
+        self.assertEqual(self.search(q='lorem', offset=-1)['message'], 'Invalid offset')
+        self.assertEqual(self.search(q='lorem', limit='x')['message'], 'limit must be an integer')
+        self.assertEqual(self.search(q='"')['data'], [])
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS, EXPORT_CHUNK_SIZE=7)
+class ExportTests(TransactionTestCase):
+    def setUp(self):
+        self.fixtures = benchmarks.seed(users=2, conversations=2, messages=10, sessions=0)
+        self.auth = {'Authorization': f"Bearer {self.fixtures['token']}"}
+        self.own = set(Message.objects.filter(conversation__user=self.fixtures['user']).values_list('id', flat=True))
+        # One of the two conversations is in cold storage
+        archive.archive(self.fixtures['conversation'])
+
+    def export(self, **params):
+        response = self.client.get('/api/export/', params, headers=self.auth)
+        body = b''.join(response.streaming_content)
+        return gzip.decompress(body) if params.get('gzip') else body
+
+    def test_ndjson_has_every_message_including_archived_ones(self):
+        rows = [json.loads(line) for line in self.export().decode().splitlines()]
+        self.assertEqual({row['message_id'] for row in rows}, self.own)
+        self.assertEqual(len(rows), len(self.own))
+        archived = [row for row in rows if row['conversation_id'] == self.fixtures['conversation'].id]
+        self.assertEqual([row['message_id'] for row in archived], self.fixtures['message_ids'])
+        self.assertEqual({row['user_email'] for row in rows}, {self.fixtures['user'].email})
+
+    def test_gzipped_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(format='csv', gzip=1).decode())))
+        self.assertEqual({int(row['message_id']) for row in rows}, self.own)
+        self.assertTrue(all(row['content'].startswith('Message ') for row in rows))
+
+    def test_date_range_applies_to_archived_messages(self):
+        cutoff = Message.objects.filter(conversation__user=self.fixtures['user']).order_by('created_at')[4].created_at
+        rows = [json.loads(line) for line in self.export(since=cutoff.isoformat()).decode().splitlines()]
+        self.assertTrue(rows)
+        self.assertTrue(all(row['created_at'] >= cutoff.isoformat() for row in rows))
+        self.assertIn(self.fixtures['message_ids'][-1], {row['message_id'] for row in rows})
+        self.assertNotIn(self.fixtures['message_ids'][0], {row['message_id'] for row in rows})
+
+    def test_deleted_conversations_are_left_out(self):
+        live = Conversation.objects.filter(user=self.fixtures['user'], is_archived=False).get()
+        Conversation.objects.filter(pk=live.pk).update(is_active=False)
+        rows = [json.loads(line) for line in self.export().decode().splitlines()]
+        self.assertEqual({row['conversation_id'] for row in rows}, {self.fixtures['conversation'].id})
+
+        Conversation.objects.filter(pk=self.fixtures['conversation'].pk).update(is_active=False)
+        self.assertEqual(self.export(), b'')
+
+    def test_needs_a_login_token(self):
+        response = self.client.get('/api/export/', {'email': self.fixtures['user'].email})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(response.json()['success'])
+
+    def test_streamed_chunk_by_chunk_under_asgi(self):
+        async def export():
+            response = await self.async_client.get('/api/export/', {'format': 'csv'}, headers=self.auth)
+            return response, [chunk async for chunk in response.streaming_content]
+
+        with mock.patch('website.export.BUFFER_SIZE', 1024):
+            response, chunks = async_to_sync(export)()
+        # An async body, sent as read rather than collected with sync_to_async(list)
+        self.assertTrue(response.is_async)
+        self.assertGreater(len(chunks), 2)
+        rows = list(csv.DictReader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual({int(row['message_id']) for row in rows}, self.own)
+
+    def test_bad_parameters(self):
+        self.assertEqual(
+            self.client.get('/api/export/', {'format': 'xml'}, headers=self.auth).json()['message'],
+            'format must be ndjson or csv'
+        )
+        self.assertEqual(
+            self.client.get('/api/export/', {'since': 'soon'}, headers=self.auth).json()['message'],
+            'Invalid date: soon'
+        )
+
+    def test_command_exports_everyone(self):
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as output:
+            call_command('export_history', output=output.name, stdout=io.StringIO(), stderr=io.StringIO())
+            rows = [json.loads(line) for line in open(output.name, encoding='utf-8')]
+        self.assertEqual(len(rows), Message.objects.count() + len(self.fixtures['message_ids']))
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class BulkImportTests(TransactionTestCase):
+    def setUp(self):
+        benchmarks.reset_caches()
+        self.fixtures = benchmarks.seed(users=1, conversations=0, messages=0, sessions=0)
+        self.email = self.fixtures['user'].email
+
+    def rows(self, name='Renamed'):
+        return [
+            {'email': self.email, 'name': name, 'password': 'secret'},
+            {'email': 'new@import.test', 'name': 'New', 'password': 'secret'},
+            {'email': 'new@import.test', 'name': 'Repeated', 'password': 'secret'},
+            {'email': '', 'name': 'Nobody', 'password': 'secret'},
+            {'email': 'hash@import.test', 'password_hash': 'not-a-hash'},
+        ]
+
+    def test_skip_leaves_existing_users_alone(self):
+        stats = bulk_import.import_users(self.rows())
+        self.assertEqual((stats.read, stats.written, stats.skipped, stats.invalid), (5, 1, 2, 2))
+        self.assertEqual(User.objects.get(email=self.email).name, self.fixtures['user'].name)
+        self.assertTrue(check_password('secret', User.objects.get(email='new@import.test').password_hash))
+
+    def test_update_rewrites_existing_users(self):
+        stats = bulk_import.import_users(self.rows(), on_conflict='update')
+        self.assertEqual((stats.written, stats.skipped, stats.invalid), (2, 1, 2))
+        self.assertEqual(User.objects.get(email=self.email).name, 'Renamed')
+        self.assertEqual(User.objects.get(email='new@import.test').name, 'Repeated')
+
+    def test_rows_added_during_the_import_count_as_skipped(self):
+        existing = bulk_import._existing
+        checks = []
+
+        def first_check_misses(*args):
+            # As if the user signed up between the batch's check and its insert
+            checks.append(args)
+            return set() if len(checks) == 1 else existing(*args)
+
+        with mock.patch.object(bulk_import, '_existing', first_check_misses):
+            stats = bulk_import.import_users(self.rows())
+        self.assertEqual((stats.read, stats.written, stats.skipped, stats.invalid), (5, 1, 2, 2))
+        self.assertEqual(User.objects.get(email=self.email).name, self.fixtures['user'].name)
+
+    def test_update_reaches_users_cached_for_login_tokens(self):
+        auth_tokens.forget_all()
+        user = self.fixtures['user']
+        self.assertEqual(auth_tokens.get_user(user.id).name, user.name)
+        bulk_import.import_users(self.rows(), on_conflict='update')
+        self.assertEqual(auth_tokens.get_user(user.id).name, 'Renamed')
+
+    def test_error_stops_on_existing_users(self):
+        with self.assertRaises(bulk_import.Conflict):
+            bulk_import.import_users(self.rows(), on_conflict='error')
+        self.assertFalse(User.objects.filter(email='new@import.test').exists())
+
+    def test_counters_and_dashboard_etag_follow_the_import(self):
+        etag = self.client.get('/api/dashboard/bootstrap/')['ETag']
+        bulk_import.import_users(self.rows())
+        self.assertEqual(DashboardCounter.objects.get(key=counters.STUDENTS).value, User.objects.count())
+
+        # An in-place update changes no count, only the version stamp
+        updated = self.client.get('/api/dashboard/bootstrap/')['ETag']
+        bulk_import.import_users(self.rows(name='Renamed again'), on_conflict='update')
+        self.assertEqual(len({etag, updated, self.client.get('/api/dashboard/bootstrap/')['ETag']}), 3)
+
+        stats = bulk_import.import_sessions([
+            {'email': self.email, 'title': 'Imported', 'subject': 'vectors'},
+            {'email': 'missing@import.test', 'title': 'Orphan', 'subject': 'vectors'},
+        ])
+        self.assertEqual((stats.written, stats.invalid), (1, 1))
+        recent = self.client.get('/api/sessions/recent/').json()['data']
+        self.assertIn('Imported', [s['title'] for s in recent])
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class ApiCacheTests(TransactionTestCase):
+    def setUp(self):
+        benchmarks.reset_caches()
+        self.fixtures = benchmarks.seed(users=2, conversations=1, messages=2, sessions=2)
+
+    def test_writes_invalidate_cached_lists(self):
+        self.client.get('/api/sessions/recent/')
+        Session.objects.create(user=self.fixtures['user'], title='Fresh', subject='vectors')
+        titles = [s['title'] for s in self.client.get('/api/sessions/recent/').json()['data']]
+        self.assertIn('Fresh', titles)
+
+    def test_stats_endpoint_needs_staff_or_ops_token(self):
+        self.client.get('/api/sessions/recent/')
+        self.assertEqual(self.client.get('/api/cache/stats/').status_code, 403)
+        stats = self.client.get('/api/cache/stats/', headers=benchmarks.OPS_HEADERS).json()['data']
+        self.assertGreaterEqual(stats['recent_sessions']['misses'], 1)
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class DashboardBootstrapTests(TransactionTestCase):
+    def setUp(self):
+        benchmarks.reset_caches()
+        benchmarks.seed(users=2, conversations=0, messages=0, sessions=2)
+        counters.rebuild()
+
+    def test_matching_etag_gets_an_empty_304(self):
+        first = self.client.get('/api/dashboard/bootstrap/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['data']['stats']['total_students'], User.objects.count())
+
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.get('/api/dashboard/bootstrap/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(again['ETag'], first['ETag'])
+        self.assertEqual(len(queries), 1)
+
+    def test_other_etag_gets_the_body(self):
+        response = self.client.get('/api/dashboard/bootstrap/', headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['data']), {'stats', 'recent_sessions', 'recommendations'})
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class TokenAuthTests(TransactionTestCase):
+    def setUp(self):
+        auth_tokens._user_cache().clear()
+        self.fixtures = benchmarks.seed(users=1, conversations=0, messages=0, sessions=0)
+
+    def test_resolves_tokens_natively_under_asgi(self):
+        seen = []
+
+        async def view(request):
+            seen.append(request.app_user)
+            return HttpResponse()
+
+        middleware = TokenAuthMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = RequestFactory()
+        async_to_sync(middleware)(factory.get('/', headers={'Authorization': f"Bearer {self.fixtures['token']}"}))
+        async_to_sync(middleware)(factory.get('/', headers={'Authorization': 'Bearer forged'}))
+        self.assertEqual(seen, [self.fixtures['user'], None])
+        self.assertFalse(iscoroutinefunction(TokenAuthMiddleware(lambda request: HttpResponse())))
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class PasswordHashingTests(SimpleTestCase):
+    def settled_stats(self):
+        # The pool's done-callback may still be running when result() returns
+        deadline = time.monotonic() + 5
+        while hashing.stats()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return hashing.stats()
+
+    def test_verifies_on_the_pool(self):
+        before = self.settled_stats()
+        encoded = hashing.hash_password('correct horse')
+        self.assertEqual(hashing.verify_password('correct horse', encoded), (True, None))
+        self.assertEqual(hashing.verify_password('wrong', encoded), (False, None))
+        self.assertEqual(self.settled_stats()['completed'], before['completed'] + 3)
+
+    def test_failures_are_not_counted_as_completed(self):
+        before = self.settled_stats()
+        with self.assertRaises(ValueError):
+            hashing._run(int, 'not a number')
+        after = self.settled_stats()
+        self.assertEqual(after['failed'], before['failed'] + 1)
+        self.assertEqual(after['completed'], before['completed'])
+
+
+class MiddlewareStackTests(SimpleTestCase):
+    def test_asgi_stack_needs_no_adapters(self):
+        from django.core.handlers.asgi import ASGIHandler
+
+        adapted = []
+        adapt = ASGIHandler.adapt_method_mode
+
+        def record(handler, is_async, method, method_is_async=None, debug=False, name=None):
+            result = adapt(handler, is_async, method, method_is_async, debug, name)
+            # process_view() and friends of Django's own middleware are adapted
+            # as callbacks; only the handler chain itself matters here
+            if method_is_async is not None and result is not method:
+                adapted.append(name or 'top of the stack')
+            return result
+
+        with mock.patch.object(ASGIHandler, 'adapt_method_mode', record):
+            ASGIHandler()
+        self.assertEqual(adapted, [])
+
+    def test_every_website_middleware_follows_the_chain_mode(self):
+        from django.utils.module_loading import import_string
+
+        async def async_view(request):
+            return HttpResponse()
+
+        paths = [path for path in settings.MIDDLEWARE if path.startswith('website.')]
+        self.assertEqual(len(paths), 5)
+        for path in paths:
+            with self.subTest(path):
+                middleware = import_string(path)
+                self.assertTrue(iscoroutinefunction(middleware(async_view)))
+                self.assertFalse(iscoroutinefunction(middleware(lambda request: HttpResponse())))
+
+
+class SqliteSettingsTests(SimpleTestCase):
+    def test_connections_apply_the_pragmas(self):
+        # The test database lives in memory, which has no WAL; open a file
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': f'{directory}/pragmas.sqlite3'}, alias='pragmas')
+            try:
+                with wrapper.cursor() as cursor:
+                    values = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                        cursor.execute(f'PRAGMA {name}')
+                        values[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertEqual(values, {
+            # synchronous 1 is NORMAL, temp_store 2 is MEMORY
+            'journal_mode': 'wal', 'synchronous': 1, 'temp_store': 2,
+            'busy_timeout': settings.SQLITE_BUSY_TIMEOUT * 1000,
+        })
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2', 'replica3'])
+    def test_a_request_reads_from_one_replica_until_it_writes(self):
+        router = routers.PrimaryReplicaRouter()
+        state, token = routers.begin_request(pinned=False)
+        try:
+            picks = {router.db_for_read(User) for _ in range(30)}
+            router.db_for_write(User)
+            after_write = router.db_for_read(User)
+        finally:
+            routers.end_request(token)
+        self.assertEqual(len(picks), 1)
+        self.assertEqual(after_write, 'default')
+
+        state, token = routers.begin_request(pinned=True)
+        try:
+            self.assertEqual(router.db_for_read(User), 'default')
+        finally:
+            routers.end_request(token)
+
+    def test_pin_scope_covers_session_and_token_lookups(self):
+        middleware = settings.MIDDLEWARE
+        pin = middleware.index('website.middleware.ReplicaPinMiddleware')
+        self.assertLess(pin, middleware.index('website.middleware.TokenAuthMiddleware'))
+        self.assertLess(pin, middleware.index('django.contrib.sessions.middleware.SessionMiddleware'))
+
+
+@override_settings(**benchmarks.BENCHMARK_SETTINGS)
+class ReplicaDatabaseTests(TransactionTestCase):
+    """The router and ReplicaPinMiddleware against a second real database."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test databases were set up, so it stays a plain file
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica_test'] = {
+            **connections.settings['default'], 'NAME': f'{cls.directory.name}/replica.sqlite3'
+        }
+        cls.databases = {*cls.databases, 'replica_test'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica_test'].close()
+        del connections['replica_test']
+        del connections.settings['replica_test']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        benchmarks.reset_caches()
+        benchmarks.seed(users=1, conversations=0, messages=0, sessions=2)
+
+        # What sync_replicas does: snapshot the primary into the replica's file
+        connections['replica_test'].close()
+        connection.ensure_connection()
+        target = sqlite3.connect(connections['replica_test'].settings_dict['NAME'])
+        connection.connection.backup(target)
+        target.close()
+
+        # Only the primary has this one, like a write the replica hasn't caught up with
+        Session.objects.create(user=User.objects.first(), title='Not replicated', subject='vectors')
+
+    def titles(self, client):
+        return [s['title'] for s in client.get('/api/sessions/recent/').json()['data']]
+
+    @override_settings(DATABASE_REPLICAS=['replica_test'], API_CACHE_ENABLED=False)
+    def test_reads_use_the_replica_until_the_client_writes(self):
+        with CaptureQueriesContext(connections['replica_test']) as replica:
+            self.assertNotIn('Not replicated', self.titles(self.client))
+        self.assertTrue(replica.captured_queries)
+
+        response = self.client.post(
+            '/api/signup/', {'email': 'sticky@replica.test', 'password': 'secret'}, content_type='application/json'
+        )
+        self.assertTrue(response.json()['success'])
+        cookie = response.cookies[settings.DATABASE_STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DATABASE_STICKY_SECONDS)
+
+        # The cookie pins this client to the primary; others keep reading the replica
+        with CaptureQueriesContext(connections['replica_test']) as replica:
+            self.assertIn('Not replicated', self.titles(self.client))
+            self.assertNotIn('Not replicated', self.titles(self.client_class()))
+        self.assertTrue(replica.captured_queries)
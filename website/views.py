@@ -1,12 +1,17 @@
+import hashlib
+import hmac
 import json
-import requests
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.contrib.auth.hashers import make_password, check_password
+from django.views.decorators.http import condition
 from django.http import JsonResponse
-from django.utils.timezone import now
-from .models import User
+from django.utils import timezone
+from . import api_cache, archive, auth_tokens, counters, export, hashing, llm_cache, llm_context, metrics, pagination, scheduler, search, serialization, singleflight, streaming, tasks
+from .models import User, Conversation, Message
 
 def chatbot_page(request):
     return render(request, "chatbot.html")
@@ -40,11 +45,13 @@ def signup_api(request):
             new_user = User(
                 name=name,
                 email=email,
-                password_hash=make_password(password) # Never save plain text passwords!
+                password_hash=hashing.hash_password(password) # Never save plain text passwords!
             )
             new_user.save()
 
             return JsonResponse({'success': True, 'message': 'Account created successfully!'})
+        except scheduler.SchedulerBusy as e:
+            return _busy_response(e)
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
@@ -65,11 +72,24 @@ def login_api(request):
             user = User.objects.filter(email=email).first()
 
             # 2. Check if user exists AND password matches the hash
-            if user and check_password(password, user.password_hash):
-                return JsonResponse({'success': True, 'message': 'Login successful!', 'user': user.name})
+            valid, new_hash = hashing.verify_password(password, user.password_hash) if user else (False, None)
+            if valid:
+                # Rehash with the current hasher/iterations when they changed
+                if new_hash:
+                    user.password_hash = new_hash
+                    user.save(update_fields=['password_hash'])
+                return JsonResponse({
+                    'success': True,
+                    'message': 'Login successful!',
+                    'user': user.name,
+                    # Send back as "Authorization: Bearer <token>"
+                    'token': auth_tokens.issue(user)
+                })
             else:
                 return JsonResponse({'success': False, 'message': 'Invalid email or password'})
 
+        except scheduler.SchedulerBusy as e:
+            return _busy_response(e)
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
     
@@ -79,24 +99,52 @@ def login_api(request):
 from django.db.models import Count
 
 from .models import User, Session
-def dashboard_stats_api(request):
-    if request.method == 'GET':
-        try:
-            total_students = User.objects.count()
 
-            today = now().date()
-            active_sessions_today = Session.objects.filter(
-                started_at__date=today
-            ).count()
 
-            stats = {
-                "total_students": total_students,
-                "active_sessions_today": active_sessions_today
-            }
+def _dashboard_stats():
+    today = timezone.localdate()
+
+    def build():
+        # Materialized counters (see counters.py): one indexed read
+        # instead of COUNT(*) over users and sessions
+        total_students, active_sessions_today = counters.read(
+            counters.STUDENTS, counters.sessions_key(today)
+        )
+        return {
+            "total_students": total_students,
+            "active_sessions_today": active_sessions_today
+        }
+
+    return api_cache.cached('dashboard_stats', ['users', 'sessions'], {'day': today}, build)
+
+
+def _recent_sessions():
+    def build():
+        return serialization.rows(Session.objects.order_by('-started_at')[:3], {
+            "session_id": "id",
+            "user_name": "user__name",
+            "email": "user__email",
+            "title": "title",
+            "subject": "subject",
+            "started_at": "started_at"
+        })
+
+    return api_cache.cached('recent_sessions', ['sessions', 'users'], {}, build)
+
+
+def _recommendations():
+    def build():
+        return serialization.rows(Recommendation.objects.all()[:3], ("id", "title", "icon"))
+
+    return api_cache.cached('recommendations', ['recommendations'], {}, build)
 
+
+def dashboard_stats_api(request):
+    if request.method == 'GET':
+        try:
             return JsonResponse({
                 "success": True,
-                "data": stats
+                "data": _dashboard_stats()
             })
 
         except Exception as e:
@@ -109,24 +157,7 @@ def dashboard_stats_api(request):
 def recent_sessions_api(request):
     if request.method == 'GET':
         try:
-            sessions_qs = Session.objects.select_related('user') \
-                .order_by('-started_at')[:3]
-
-            sessions = []
-            for s in sessions_qs:
-                sessions.append({
-                    "session_id": s.id,
-                    "user_name": s.user.name,
-                    "email": s.user.email,
-                    "title": s.title,
-                    "subject": s.subject,
-                    "started_at": s.started_at
-                })
-
-            return JsonResponse({
-                "success": True,
-                "data": sessions
-            })
+            return serialization.success(_recent_sessions())
 
         except Exception as e:
             return JsonResponse({
@@ -139,27 +170,121 @@ from .models import Recommendation
 def recommendations_api(request):
     if request.method == 'GET':
         try:
-            recommendations_qs = Recommendation.objects.all()[:3]
-
-            recommendations = []
-            for r in recommendations_qs:
-                recommendations.append({
-                    "id": r.id,
-                    "title": r.title,
-                    "icon": r.icon
-                })
+            return serialization.success(_recommendations())
 
+        except Exception as e:
             return JsonResponse({
-                "success": True,
-                "data": recommendations
+                "success": False,
+                "message": str(e)
             })
 
+
+def _dashboard_etag(request):
+    """
+    Strong ETag for the dashboard bootstrap payload.
+
+    Built from the version stamps bumped by signals whenever users,
+    sessions or recommendations change (plus the counters and today's
+    date), all read with a single query on dashboard_counters.
+    """
+    today = timezone.localdate()
+    keys = [
+        counters.STUDENTS,
+        counters.sessions_key(today),
+        counters.version_key('users'),
+        counters.version_key('sessions'),
+        counters.version_key('recommendations'),
+    ]
+    values = counters.read(*keys)
+    request.dashboard_counters = dict(zip(keys, values))
+    stamp = f"{today.isoformat()}:" + ":".join(str(value) for value in values)
+    return hashlib.sha1(stamp.encode()).hexdigest()
+
+
+@condition(etag_func=_dashboard_etag)
+def dashboard_bootstrap_api(request):
+    """
+    GET: Everything the dashboard needs in one round trip: the stats,
+    recent sessions and recommendations payloads.
+
+    Sends an ETag; a request with a matching If-None-Match gets an empty
+    304 after a single counters query.
+    """
+    if request.method == 'GET':
+        try:
+            today = timezone.localdate()
+            values = request.dashboard_counters
+            response = serialization.success({
+                "stats": {
+                    "total_students": values[counters.STUDENTS],
+                    "active_sessions_today": values[counters.sessions_key(today)]
+                },
+                "recent_sessions": _recent_sessions(),
+                "recommendations": _recommendations()
+            })
+            # Let browsers keep the body but revalidate it on every load
+            response["Cache-Control"] = "private, no-cache"
+            return response
+
         except Exception as e:
             return JsonResponse({
                 "success": False,
                 "message": str(e)
             })
 
+    return JsonResponse({'success': False, 'message': 'Only GET allowed'})
+
+
+def _request_user(request, email):
+    """
+    The user signed in with a login token (resolved by TokenAuthMiddleware
+    without a query in the common case), else the user named by ``email``
+    for clients that don't send a token yet.
+    """
+    user = getattr(request, 'app_user', None)
+    if user is None and email:
+        user = User.objects.filter(email=email).first()
+    return user
+
+
+def _chat_user_and_conversation(request, email, conversation_id):
+    """Resolve the user and (optionally) the conversation a chat turn belongs to."""
+    conversation = None
+    user = _request_user(request, email)
+    if user and conversation_id:
+        conversation = Conversation.objects.filter(id=conversation_id, user=user).first()
+        if conversation and conversation.is_archived:
+            archive.restore(conversation)
+    return user, conversation
+
+
+def _save_turn(conversation, user_message, asked_at, bot_response=None, context=None):
+    """
+    Queue the turn's messages, the title and Ollama's context (so the next
+    turn only prefills the new message) for the task worker: one INSERT
+    on the request path instead of three writes (see tasks.py).
+    """
+    tasks.enqueue(
+        'chat_turn',
+        conversation_id=conversation.id,
+        user_message=user_message,
+        asked_at=asked_at.isoformat(),
+        bot_response=bot_response,
+        answered_at=timezone.now().isoformat(),
+        context=context
+    )
+
+
+def _busy_response(error):
+    """429/503 with Retry-After when the LLM scheduler or hashing pool is full."""
+    response = JsonResponse({
+        "success": False,
+        "message": str(error)
+    }, status=error.status)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
 @csrf_exempt
 def chatbot_api(request):
     if request.method == "POST":
@@ -176,93 +301,407 @@ def chatbot_api(request):
                 })
 
             # Get user and conversation if provided (for saving history)
-            user = None
-            conversation = None
-            if email:
-                user = User.objects.filter(email=email).first()
-                if user and conversation_id:
-                    conversation = Conversation.objects.filter(id=conversation_id, user=user).first()
-
-            # Save user message to database
-            if conversation:
-                Message.objects.create(
-                    conversation=conversation,
-                    role='user',
-                    content=user_message
+            user, conversation = _chat_user_and_conversation(request, email, conversation_id)
+
+            # Follow-ups continue from the conversation's stored context
+            context, history = llm_context.for_turn(conversation)
+            follow_up = context is not None or history is not None
+
+            bot_response = None if follow_up else llm_cache.lookup(user_message)
+            cached = bot_response is not None
+            if not cached:
+                # Identical prompts already being generated are shared;
+                # otherwise wait for a free scheduler slot
+                flight, leader = singleflight.join(
+                    user_message, scheduler.priority_for(user_message),
+                    context=context, history=history
                 )
 
-            payload = {
-                "model": "gemma3:4b",
-                "prompt": f"Explain clearly:\n{user_message}",
-                "stream": False,
-                "options": {
-                    "num_gpu": 1,
-                    "num_predict": 200  
-                }
-            }
-
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json=payload,
-                timeout=60
+            asked_at = timezone.now()
+            new_context = None
+            if not cached:
+                try:
+                    chunks = list(flight.follow())
+                except Exception:
+                    # Keep the question even though there is no answer
+                    if conversation:
+                        _save_turn(conversation, user_message, asked_at)
+                    raise
+                bot_response = singleflight.response_text(chunks)
+                new_context = singleflight.final_context(chunks)
+                if leader and not follow_up:
+                    llm_cache.store(user_message, bot_response)
+
+            if conversation:
+                _save_turn(conversation, user_message, asked_at, bot_response, new_context)
+
+            return JsonResponse({
+                "success": True,
+                "bot_response": bot_response,
+                "cached": cached,
+                "conversation_id": conversation.id if conversation else None
+            })
+
+        except scheduler.SchedulerBusy as e:
+            return _busy_response(e)
+        except Exception as e:
+            return JsonResponse({
+                "success": False,
+                "message": str(e)
+            })
+
+
+def _sse(data, event=None):
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def _sse_response(event_stream):
+    response = StreamingHttpResponse(event_stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@csrf_exempt
+def chatbot_stream_api(request):
+    """
+    POST: Same input as chatbot_api, but the reply is streamed back as
+    Server-Sent Events while Ollama generates it.
+
+    Frames: ``data: {"token": ...}`` per chunk, then ``event: done`` with
+    the conversation id, its title after this turn and whether the answer
+    came from the response cache, or ``event: error`` if generation fails.
+    The turn is queued for saving once the stream closes. Served under
+    ASGI, the frames still go out one at a time (see streaming.py).
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "message": "Only POST allowed"})
+
+    try:
+        data = json.loads(request.body)
+        user_message = data.get("message")
+        email = data.get("email")
+        conversation_id = data.get("conversation_id")
+
+        if not user_message:
+            return JsonResponse({
+                "success": False,
+                "message": "Message is required"
+            })
+
+        user, conversation = _chat_user_and_conversation(request, email, conversation_id)
+
+        context, history = llm_context.for_turn(conversation)
+        follow_up = context is not None or history is not None
+
+        # Admission happens before the stream starts so a busy scheduler
+        # can still answer with a proper 429
+        cached_response = None if follow_up else llm_cache.lookup(user_message)
+        if cached_response is None:
+            flight, leader = singleflight.join(
+                user_message, scheduler.priority_for(user_message),
+                context=context, history=history
             )
 
-            result = response.json()
-            bot_response = result.get("response", "")
+        asked_at = timezone.now()
+    except scheduler.SchedulerBusy as e:
+        return _busy_response(e)
+    except Exception as e:
+        return JsonResponse({
+            "success": False,
+            "message": str(e)
+        })
+
+    def event_stream():
+        parts = []
+        saved = False
+        new_context = None
+        try:
+            if cached_response is not None:
+                parts.append(cached_response)
+                yield _sse({"token": cached_response})
+            else:
+                for chunk in flight.follow():
+                    token = chunk.get("response", "")
+                    if token:
+                        parts.append(token)
+                        yield _sse({"token": token})
+                    new_context = chunk.get("context", new_context)
+                if leader and not follow_up:
+                    llm_cache.store(user_message, "".join(parts))
 
-            # Save assistant response to database
             if conversation:
-                Message.objects.create(
-                    conversation=conversation,
-                    role='assistant',
-                    content=bot_response
+                _save_turn(conversation, user_message, asked_at, "".join(parts), new_context)
+            saved = True
+            yield _sse({
+                "cached": cached_response is not None,
+                "conversation_id": conversation.id if conversation else None,
+                # The turn is saved behind the stream; this is the title it sets
+                "title": tasks.turn_title(conversation, user_message) if conversation else None
+            }, event="done")
+        except Exception as e:
+            yield _sse({"message": str(e)}, event="error")
+        finally:
+            # Client went away (or Ollama failed) mid-answer: keep what we got
+            if conversation and not saved:
+                _save_turn(conversation, user_message, asked_at, "".join(parts) if parts else None)
+
+    # Under ASGI a sync generator would be collected whole before sending
+    return _sse_response(streaming.body(request, event_stream()))
+
+
+async def _achat_user_and_conversation(request, email, conversation_id):
+    conversation = None
+    user = getattr(request, 'app_user', None)
+    if user is None and email:
+        user = await User.objects.filter(email=email).afirst()
+    if user and conversation_id:
+        conversation = await Conversation.objects.filter(id=conversation_id, user=user).afirst()
+        if conversation and conversation.is_archived:
+            await archive.arestore(conversation)
+    return user, conversation
+
+
+_asave_turn = sync_to_async(_save_turn)
+
+
+@csrf_exempt
+async def chatbot_async_api(request):
+    """
+    POST: Async version of chatbot_api for ASGI deployments.
+
+    Waiting on Ollama doesn't tie up a worker thread, so one worker can
+    hold many generations in flight.
+    """
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+            user_message = data.get("message")
+            email = data.get("email")
+            conversation_id = data.get("conversation_id")
+
+            if not user_message:
+                return JsonResponse({
+                    "success": False,
+                    "message": "Message is required"
+                })
+
+            user, conversation = await _achat_user_and_conversation(request, email, conversation_id)
+
+            context, history = await llm_context.afor_turn(conversation)
+            follow_up = context is not None or history is not None
+
+            bot_response = None if follow_up else await llm_cache.alookup(user_message)
+            cached = bot_response is not None
+            if not cached:
+                flight, leader = await singleflight.ajoin(
+                    user_message, scheduler.priority_for(user_message),
+                    context=context, history=history
                 )
-                # Update conversation title if it's the first message
-                if conversation.title == 'New Chat' and user_message:
-                    conversation.title = user_message[:50] + ('...' if len(user_message) > 50 else '')
-                    conversation.save()
+
+            asked_at = timezone.now()
+            new_context = None
+            if not cached:
+                try:
+                    chunks = [chunk async for chunk in flight.follow()]
+                except Exception:
+                    if conversation:
+                        await _asave_turn(conversation, user_message, asked_at)
+                    raise
+                bot_response = singleflight.response_text(chunks)
+                new_context = singleflight.final_context(chunks)
+                if leader and not follow_up:
+                    await llm_cache.astore(user_message, bot_response)
+
+            if conversation:
+                await _asave_turn(conversation, user_message, asked_at, bot_response, new_context)
 
             return JsonResponse({
                 "success": True,
                 "bot_response": bot_response,
+                "cached": cached,
                 "conversation_id": conversation.id if conversation else None
             })
 
+        except scheduler.SchedulerBusy as e:
+            return _busy_response(e)
         except Exception as e:
             return JsonResponse({
                 "success": False,
                 "message": str(e)
             })
 
-from .models import Conversation, Message
+    return JsonResponse({"success": False, "message": "Only POST allowed"})
+
+
+@csrf_exempt
+async def chatbot_stream_async_api(request):
+    """
+    POST: Async version of chatbot_stream_api for ASGI deployments.
+    Sends the same Server-Sent Events frames.
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "message": "Only POST allowed"})
+
+    try:
+        data = json.loads(request.body)
+        user_message = data.get("message")
+        email = data.get("email")
+        conversation_id = data.get("conversation_id")
+
+        if not user_message:
+            return JsonResponse({
+                "success": False,
+                "message": "Message is required"
+            })
+
+        user, conversation = await _achat_user_and_conversation(request, email, conversation_id)
+
+        context, history = await llm_context.afor_turn(conversation)
+        follow_up = context is not None or history is not None
+
+        cached_response = None if follow_up else await llm_cache.alookup(user_message)
+        if cached_response is None:
+            flight, leader = await singleflight.ajoin(
+                user_message, scheduler.priority_for(user_message),
+                context=context, history=history
+            )
+
+        asked_at = timezone.now()
+    except scheduler.SchedulerBusy as e:
+        return _busy_response(e)
+    except Exception as e:
+        return JsonResponse({
+            "success": False,
+            "message": str(e)
+        })
+
+    async def event_stream():
+        parts = []
+        saved = False
+        new_context = None
+        try:
+            if cached_response is not None:
+                parts.append(cached_response)
+                yield _sse({"token": cached_response})
+            else:
+                async for chunk in flight.follow():
+                    token = chunk.get("response", "")
+                    if token:
+                        parts.append(token)
+                        yield _sse({"token": token})
+                    new_context = chunk.get("context", new_context)
+                if leader and not follow_up:
+                    await llm_cache.astore(user_message, "".join(parts))
+
+            if conversation:
+                await _asave_turn(conversation, user_message, asked_at, "".join(parts), new_context)
+            saved = True
+            yield _sse({
+                "cached": cached_response is not None,
+                "conversation_id": conversation.id if conversation else None,
+                # The turn is saved behind the stream; this is the title it sets
+                "title": tasks.turn_title(conversation, user_message) if conversation else None
+            }, event="done")
+        except Exception as e:
+            yield _sse({"message": str(e)}, event="error")
+        finally:
+            if conversation and not saved:
+                await _asave_turn(conversation, user_message, asked_at, "".join(parts) if parts else None)
+
+    return _sse_response(event_stream())
+
+
+def _ops_allowed(request):
+    token = auth_tokens.token_from_request(request)
+    if token and settings.OPS_TOKEN and hmac.compare_digest(token, settings.OPS_TOKEN):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_active and user.is_staff)
+
+
+def ops_only(view):
+    """Restrict an operational endpoint to staff users or the OPS_TOKEN bearer."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not _ops_allowed(request):
+            return JsonResponse({'success': False, 'message': 'Forbidden'}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapped
+
+
+@ops_only
+def api_cache_stats_api(request):
+    """
+    GET: Hit/miss counts and hit ratio per cached API in this process.
+    """
+    if request.method == 'GET':
+        return JsonResponse({
+            "success": True,
+            "data": api_cache.stats()
+        })
+
+    return JsonResponse({'success': False, 'message': 'Only GET allowed'})
+
+
+@ops_only
+def llm_scheduler_api(request):
+    """
+    GET: Current LLM scheduler load: active generations, queue depth
+    (overall and per priority), admissions/rejections and queue wait times.
+    """
+    if request.method == 'GET':
+        return JsonResponse({
+            "success": True,
+            "data": scheduler.get_scheduler().stats()
+        })
+
+    return JsonResponse({'success': False, 'message': 'Only GET allowed'})
+
+
+@ops_only
+def metrics_api(request):
+    """
+    GET: Request, database and LLM histograms plus scheduler and hashing
+    pool state for this process, in Prometheus text format.
+    """
+    if request.method == 'GET':
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    return JsonResponse({'success': False, 'message': 'Only GET allowed'})
 
 
 @csrf_exempt
 def conversations_api(request):
     """
-    GET: Load all conversations for a user
+    GET: Load a page of a user's conversations, most recently updated first
+         (``limit``, ``before``/``after`` cursors, see pagination.py)
     POST: Create a new conversation
     DELETE: Delete a conversation
     """
     if request.method == 'GET':
         try:
             email = request.GET.get('email')
-            user = User.objects.filter(email=email).first()
+            user = _request_user(request, email)
             if not user:
                 return JsonResponse({'success': False, 'message': 'User not found'})
 
-            conversations = Conversation.objects.filter(user=user, is_active=True)
-            
-            data = []
-            for conv in conversations:
-                data.append({
-                    'id': conv.id,
-                    'title': conv.title,
-                    'created_at': conv.created_at.isoformat(),
-                    'updated_at': conv.updated_at.isoformat()
-                })
+            def build():
+                data, page = pagination.paginate(
+                    Conversation.objects.filter(user=user, is_active=True),
+                    request.GET, 'updated_at', newest_first=True,
+                    columns=('id', 'title', 'created_at', 'updated_at')
+                )
+                return {'data': data, **page}
+
+            payload = api_cache.cached(
+                'conversations', [f'conversations:{user.id}'],
+                {'user': user.id, 'query': request.GET.dict()}, build
+            )
 
-            return JsonResponse({'success': True, 'data': data})
+            return serialization.success(**payload)
 
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
@@ -273,7 +712,7 @@ def conversations_api(request):
             email = data.get('email')
             title = data.get('title', 'New Chat')
 
-            user = User.objects.filter(email=email).first()
+            user = _request_user(request, email)
             if not user:
                 return JsonResponse({'success': False, 'message': 'User not found'})
 
@@ -294,7 +733,7 @@ def conversations_api(request):
             email = data.get('email')
             conversation_id = data.get('conversation_id')
 
-            user = User.objects.filter(email=email).first()
+            user = _request_user(request, email)
             if not user:
                 return JsonResponse({'success': False, 'message': 'User not found'})
 
@@ -316,14 +755,16 @@ def conversations_api(request):
 
 def messages_api(request):
     """
-    GET: Load all messages for a conversation
+    GET: Load a page of messages for a conversation, oldest first. Without
+         a cursor the newest ``limit`` messages are returned; pass the
+         ``before`` cursor from the response to load older ones.
     """
     if request.method == 'GET':
         try:
             email = request.GET.get('email')
             conversation_id = request.GET.get('conversation_id')
 
-            user = User.objects.filter(email=email).first()
+            user = _request_user(request, email)
             if not user:
                 return JsonResponse({'success': False, 'message': 'User not found'})
 
@@ -331,23 +772,121 @@ def messages_api(request):
             if not conversation:
                 return JsonResponse({'success': False, 'message': 'Conversation not found'})
 
-            messages = Message.objects.filter(conversation=conversation)
+            def build():
+                # Archived conversations are read from the archive; they are
+                # only restored when a new turn is written
+                archived = archive.messages(conversation) if conversation.is_archived else None
+                if archived is not None:
+                    data, page = pagination.paginate_list(archived, request.GET, 'created_at', newest_first=False)
+                else:
+                    data, page = pagination.paginate(
+                        Message.objects.filter(conversation=conversation),
+                        request.GET, 'created_at', newest_first=False,
+                        columns=('id', 'role', 'content', 'created_at')
+                    )
+                return {'data': data, **page}
+
+            payload = api_cache.cached(
+                'messages', [f'messages:{conversation.id}'],
+                {'conversation': conversation.id, 'query': request.GET.dict()}, build
+            )
+
+            return serialization.success(
+                conversation_id=conversation.id,
+                title=conversation.title,
+                **payload
+            )
+
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+
+    return JsonResponse({'success': False, 'message': 'Only GET allowed'})
+
+
+def export_api(request):
+    """
+    GET: Download the caller's whole chat history, one row per message.
+         ``format`` is ``ndjson`` (default) or ``csv``; ``since``/``until``
+         (ISO dates or datetimes) limit it to a date range and ``gzip=1``
+         compresses it. The file is streamed as it is read. Needs a login
+         token; an email alone is not enough for a whole history.
+    """
+    if request.method == 'GET':
+        try:
+            fmt = request.GET.get('format', 'ndjson')
+            gzip = request.GET.get('gzip') in ('1', 'true')
+
+            if fmt not in export.FORMATS:
+                return JsonResponse({'success': False, 'message': 'format must be ndjson or csv'})
+            since = export.parse_bound(request.GET.get('since'))
+            until = export.parse_bound(request.GET.get('until'), end=True)
+
+            user = getattr(request, 'app_user', None)
+            if not user:
+                return JsonResponse({'success': False, 'message': 'Login token required'}, status=403)
+
+            rows = export.message_rows(user=user, since=since, until=until)
+            response = StreamingHttpResponse(
+                streaming.body(request, export.stream(rows, fmt, gzip)),
+                content_type='application/gzip' if gzip else export.FORMATS[fmt][0]
+            )
+            response['Content-Disposition'] = f'attachment; filename="{export.filename(fmt, gzip)}"'
+            response['Cache-Control'] = 'no-store'
+            return response
+
+        except Exception as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+
+    return JsonResponse({'success': False, 'message': 'Only GET allowed'})
+
+
+def messages_search_api(request):
+    """
+    GET: Full-text search over the caller's chat history, best match first.
+         ``q`` is the search text; page with ``limit`` and ``offset``
+         (``next_offset`` from the previous response). Needs a login token.
+    """
+    if request.method == 'GET':
+        try:
+            query = request.GET.get('q', '').strip()
+
+            if not search.is_available():
+                return JsonResponse({'success': False, 'message': 'Search is not available'})
+
+            user = getattr(request, 'app_user', None)
+            if not user:
+                return JsonResponse({'success': False, 'message': 'Login token required'}, status=403)
+            if not query:
+                return JsonResponse({'success': False, 'message': 'Search query required'})
+
+            limit = pagination.parse_limit(request.GET.get('limit'))
+            try:
+                offset = int(request.GET.get('offset') or 0)
+            except ValueError:
+                offset = -1
+            if not 0 <= offset <= search.MAX_OFFSET:
+                return JsonResponse({'success': False, 'message': 'Invalid offset'})
+
+            messages, has_more = search.search(user, query, limit, offset)
 
             data = []
             for msg in messages:
                 data.append({
                     'id': msg.id,
+                    'conversation_id': msg.conversation_id,
+                    'conversation_title': msg.conversation_title,
                     'role': msg.role,
-                    'content': msg.content,
-                    'created_at': msg.created_at.isoformat()
+                    'snippet': msg.snippet,
+                    'score': round(msg.score, 4),
+                    'created_at': msg.created_at
                 })
 
-            return JsonResponse({
-                'success': True,
-                'conversation_id': conversation.id,
-                'title': conversation.title,
-                'data': data
-            })
+            return serialization.success(
+                data,
+                query=query,
+                has_more=has_more,
+                next_offset=offset + len(data) if has_more else None
+            )
 
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})